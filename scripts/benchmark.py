@@ -0,0 +1,556 @@
+"""
+Benchmark the system simulator.
+
+Times link budget evaluation, path loss, receiver generation and site
+layout across receiver counts, carriers and environments, and writes a
+machine readable .json report. A previous report can be given as a
+baseline to catch regressions before rerunning the lookup table sweep.
+
+Usage:
+
+    python scripts/benchmark.py --output benchmark.json
+    python scripts/benchmark.py --baseline benchmark.json
+
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import subprocess
+import numpy as np
+
+from cucumber.generate_hex import (produce_sites_and_site_areas,
+    produce_unit_sites_and_site_areas)
+from cucumber.path_loss import (path_loss_calculator,
+    path_loss_calculator_vectorized)
+from cucumber.system_simulator import (SimulationManager,
+    compile_spectral_efficiency_lookups)
+
+from sim import (generate_receivers, generate_receiver_grid,
+    generate_site_template, scale_site_template)
+
+#as in scripts/sim.py
+PARAMETERS = {
+    'seed_value': 42,
+    'seed_value2_urban': 1,
+    'seed_value2_suburban': 2,
+    'seed_value2_rural': 3,
+    'seed_value2_4G': 4,
+    'seed_value2_5G': 6,
+    'seed_value2_free-space': 14,
+    'los_breakpoint_m': 500,
+    'tx_macro_baseline_height': 30,
+    'tx_macro_power': 40,
+    'tx_macro_gain': 16,
+    'tx_macro_losses': 1,
+    'rx_gain': 0,
+    'rx_losses': 4,
+    'rx_misc_losses': 4,
+    'rx_height': 1.5,
+    'network_load': 100,
+    'sectorization': 3,
+    'iterations': 100,
+    'interference_rings': 1,
+    'interference_max_sites': 3,
+    'interference_pruning_dB': None,
+    'path_loss_max_error_dB': None,
+    'shadow_fading_correlated': False,
+    'building_penetration_loss': 0,
+    'grid_resolution': 50,
+}
+
+SPECTRUM_PORTFOLIO = [
+    (0.7, 10, '5G', '4x4'),
+    (0.8, 10, '4G', '2x2'),
+    (1.8, 10, '4G', '2x2'),
+    (2.6, 10, '4G', '2x2'),
+    (3.5, 40, '5G', '4x4'),
+]
+
+MODULATION_AND_CODING_LUT = {
+    '4G': [
+        ('4G', '2x2', 1, 'QPSK', 78, 0.3, -6.7),
+        ('4G', '2x2', 2, 'QPSK', 120, 0.46, -4.7),
+        ('4G', '2x2', 3, 'QPSK', 193, 0.74, -2.3),
+        ('4G', '2x2', 4, 'QPSK', 308, 1.2, 0.2),
+        ('4G', '2x2', 5, 'QPSK', 449, 1.6, 2.4),
+        ('4G', '2x2', 6, 'QPSK', 602, 2.2, 4.3),
+        ('4G', '2x2', 7, '16QAM', 378, 2.8, 5.9),
+        ('4G', '2x2', 8, '16QAM', 490, 3.8, 8.1),
+        ('4G', '2x2', 9, '16QAM', 616, 4.8, 10.3),
+        ('4G', '2x2', 10, '64QAM', 466, 5.4, 11.7),
+        ('4G', '2x2', 11, '64QAM', 567, 6.6, 14.1),
+        ('4G', '2x2', 12, '64QAM', 666, 7.8, 16.3),
+        ('4G', '2x2', 13, '64QAM', 772, 9, 18.7),
+        ('4G', '2x2', 14, '64QAM', 973, 10.2, 21),
+        ('4G', '2x2', 15, '64QAM', 948, 11.4, 22.7),
+    ],
+    '5G': [
+        ('5G', '4x4', 1, 'QPSK', 78, 0.15, -6.7),
+        ('5G', '4x4', 2, 'QPSK', 193, 1.02, -4.7),
+        ('5G', '4x4', 3, 'QPSK', 449, 2.21, -2.3),
+        ('5G', '4x4', 4, '16QAM', 378, 3.20, 0.2),
+        ('5G', '4x4', 5, '16QAM', 490, 4.00, 2.4),
+        ('5G', '4x4', 6, '16QAM', 616, 5.41, 4.3),
+        ('5G', '4x4', 7, '64QAM', 466, 6.20, 5.9),
+        ('5G', '4x4', 8, '64QAM', 567, 8.00, 8.1),
+        ('5G', '4x4', 9, '64QAM', 666, 9.50, 10.3),
+        ('5G', '4x4', 10, '64QAM', 772, 11.00, 11.7),
+        ('5G', '4x4', 11, '64QAM', 873, 14.00, 14.1),
+        ('5G', '4x4', 12, '256QAM', 711, 16.00, 16.3),
+        ('5G', '4x4', 13, '256QAM', 797, 19.00, 18.7),
+        ('5G', '4x4', 14, '256QAM', 885, 22.00, 21),
+        ('5G', '4x4', 15, '256QAM', 948, 25.00, 22.7),
+    ]
+}
+
+RECEIVER_COUNTS = [100, 1000, 10000, 100000]
+
+CARRIER_COUNTS = [1, 5]
+
+ENVIRONMENTS = ['urban', 'suburban', 'rural']
+
+#site radius (m) of the benchmarked site
+SITE_RADIUS = 2000
+
+#approximate share of receiver grid points within the hexagon, which is
+#0.75 of the bounding box less the points on its edges
+HEXAGON_GRID_SHARE = 0.7
+
+
+def time_function(function, repeat, max_seconds=None):
+    """
+    Time repeated calls of a function.
+
+    Parameters
+    ----------
+    function : function
+        Called without arguments.
+    repeat : int
+        Maximum number of timed calls.
+    max_seconds : float
+        Stop repeating once this much time has been spent, after at
+        least one call.
+
+    Output
+    ------
+    timings : list
+        Wall time of each call in seconds.
+
+    """
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+        if max_seconds is not None and sum(timings) > max_seconds:
+            break
+
+    return timings
+
+
+def summarise_timings(name, timings, items=None, **settings):
+    """
+    Summarise the timings of a benchmark as a report entry.
+
+    """
+    best = min(timings)
+
+    entry = {
+        'benchmark': name,
+        'settings': settings,
+        'repeats': len(timings),
+        'min_seconds': best,
+        'median_seconds': float(np.median(timings)),
+        'mean_seconds': float(np.mean(timings)),
+    }
+
+    if items is not None:
+        entry['items'] = int(items)
+        entry['items_per_second'] = items / best if best > 0 else None
+
+    return entry
+
+
+def grid_resolution(receivers, parameters):
+    """
+    Return the smallest receiver grid resolution giving at least
+    `receivers` receivers within a hexagonal site area.
+
+    """
+    _, _, site_area, _ = produce_unit_sites_and_site_areas(SITE_RADIUS)
+
+    resolution = max(2, int(math.sqrt(receivers / HEXAGON_GRID_SHARE)))
+
+    while len(generate_receiver_grid(site_area, parameters,
+        resolution)) < receivers:
+        resolution += 1
+
+    return resolution
+
+
+def build_site(receivers, parameters):
+    """
+    Build the transmitters, receivers and site area of a benchmark site.
+
+    """
+    template = generate_site_template(dict(parameters,
+        grid_resolution=grid_resolution(receivers, parameters)))
+
+    return scale_site_template(template, SITE_RADIUS, 'macro', parameters)
+
+
+def benchmark_link_budget(receiver_counts, carrier_counts, environments,
+    parameters, repeat, max_scalar_receivers, max_seconds):
+    """
+    Time the scalar `estimate_link_budget` (once per carrier) and the
+    array `estimate_link_budget_carriers` (all carriers at once).
+
+    """
+    lookups = compile_spectral_efficiency_lookups(MODULATION_AND_CODING_LUT)
+
+    report = []
+
+    for receivers in receiver_counts:
+
+        transmitter, interfering_transmitters, receiver_set, site_area = \
+            build_site(receivers, parameters)
+
+        for carriers in carrier_counts:
+
+            portfolio = SPECTRUM_PORTFOLIO[:carriers]
+            items = len(receiver_set) * carriers
+
+            for environment in environments:
+
+                settings = {
+                    'receivers': len(receiver_set),
+                    'carriers': carriers,
+                    'environment': environment,
+                }
+
+                manager = SimulationManager(transmitter,
+                    interfering_transmitters, 'macro', receiver_set,
+                    site_area, parameters)
+
+                def run_carriers():
+                    manager.estimate_link_budget_carriers(portfolio, 'macro',
+                        environment, lookups, parameters)
+
+                report.append(summarise_timings(
+                    'estimate_link_budget_carriers',
+                    time_function(run_carriers, repeat, max_seconds),
+                    items, **settings))
+
+                if receivers > max_scalar_receivers:
+                    continue
+
+                manager.receivers
+
+                def run_scalar():
+                    for carrier in portfolio:
+                        frequency, bandwidth, generation, \
+                            transmission_type = carrier
+                        manager.estimate_link_budget(frequency, bandwidth,
+                            generation, 'macro', transmission_type,
+                            environment, MODULATION_AND_CODING_LUT,
+                            parameters)
+
+                report.append(summarise_timings('estimate_link_budget',
+                    time_function(run_scalar, repeat, max_seconds),
+                    items, **settings))
+
+    return report
+
+
+def benchmark_path_loss(receiver_counts, environments, parameters, repeat,
+    max_scalar_receivers, max_seconds):
+    """
+    Time the throughput of `path_loss_calculator` and
+    `path_loss_calculator_vectorized` over random distances.
+
+    """
+    random_state = np.random.RandomState(parameters['seed_value'])
+
+    report = []
+
+    for receivers in receiver_counts:
+
+        distance = random_state.uniform(20, 2 * SITE_RADIUS, receivers)
+
+        for environment in environments:
+
+            settings = {
+                'receivers': receivers,
+                'environment': environment,
+            }
+
+            def run_vectorized():
+                path_loss_calculator_vectorized(distance, 3.5, environment,
+                    parameters)
+
+            report.append(summarise_timings('path_loss_calculator_vectorized',
+                time_function(run_vectorized, repeat, max_seconds),
+                receivers, **settings))
+
+            if receivers > max_scalar_receivers:
+                continue
+
+            def run_scalar():
+                for value in distance:
+                    path_loss_calculator(value, 3.5, environment, parameters,
+                        None)
+
+            report.append(summarise_timings('path_loss_calculator',
+                time_function(run_scalar, repeat, max_seconds),
+                receivers, **settings))
+
+    return report
+
+
+def benchmark_receivers(receiver_counts, parameters, repeat, max_seconds):
+    """
+    Time `generate_receivers` for the grid of each receiver count.
+
+    """
+    _, _, site_area, _ = produce_unit_sites_and_site_areas(SITE_RADIUS)
+
+    report = []
+
+    for receivers in receiver_counts:
+
+        grid_parameters = dict(parameters,
+            grid_resolution=grid_resolution(receivers, parameters))
+
+        count = len(generate_receivers(site_area, grid_parameters, 1))
+
+        def run():
+            generate_receivers(site_area, grid_parameters, 1)
+
+        report.append(summarise_timings('generate_receivers',
+            time_function(run, repeat, max_seconds), count,
+            receivers=count))
+
+    return report
+
+
+def benchmark_sites(parameters, repeat, max_seconds):
+    """
+    Time the projected and analytic site layouts.
+
+    """
+    unprojected_point = {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': (0, 0),
+            },
+        'properties': {
+            'site_id': 'Radio Tower'
+            }
+        }
+
+    rings = parameters['interference_rings']
+
+    def run_projected():
+        produce_sites_and_site_areas(
+            unprojected_point['geometry']['coordinates'], SITE_RADIUS,
+            'epsg:4326', 'epsg:3857', rings)
+
+    def run_analytic():
+        produce_unit_sites_and_site_areas(SITE_RADIUS, rings)
+
+    return [
+        summarise_timings('produce_sites_and_site_areas',
+            time_function(run_projected, repeat, max_seconds), rings=rings),
+        summarise_timings('produce_unit_sites_and_site_areas',
+            time_function(run_analytic, repeat, max_seconds), rings=rings),
+    ]
+
+
+def describe_machine():
+    """
+    Describe the machine and code version a report was produced with.
+
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def benchmark_key(entry):
+    """
+    Return the key matching an entry between reports.
+
+    """
+    return (entry['benchmark'],
+        tuple(sorted(entry['settings'].items())))
+
+
+def compare_reports(report, baseline, threshold):
+    """
+    Compare the best timings of a report with a baseline report.
+
+    Parameters
+    ----------
+    report : dict
+        Report produced by this script.
+    baseline : dict
+        Earlier report.
+    threshold : float
+        Ratio of new to baseline time above which a benchmark is a
+        regression.
+
+    Output
+    ------
+    comparison : list of dicts
+        The benchmark, settings and time ratio of each benchmark in
+        both reports.
+
+    """
+    baseline_entries = {
+        benchmark_key(entry): entry for entry in baseline['results']
+    }
+
+    comparison = []
+
+    for entry in report['results']:
+
+        previous = baseline_entries.get(benchmark_key(entry))
+        if previous is None or previous['min_seconds'] <= 0:
+            continue
+
+        ratio = entry['min_seconds'] / previous['min_seconds']
+
+        comparison.append({
+            'benchmark': entry['benchmark'],
+            'settings': entry['settings'],
+            'baseline_seconds': previous['min_seconds'],
+            'min_seconds': entry['min_seconds'],
+            'ratio': ratio,
+            'regression': ratio > threshold,
+        })
+
+    return comparison
+
+
+def run_benchmarks(receiver_counts=RECEIVER_COUNTS,
+    carrier_counts=CARRIER_COUNTS, environments=ENVIRONMENTS,
+    parameters=PARAMETERS, repeat=5, max_scalar_receivers=1000,
+    max_seconds=10):
+    """
+    Run all benchmarks.
+
+    Parameters
+    ----------
+    receiver_counts : list
+        Approximate receiver counts to benchmark.
+    carrier_counts : list
+        Numbers of carriers (from `SPECTRUM_PORTFOLIO`) to evaluate.
+    environments : list
+        Environments to benchmark.
+    parameters : dict
+        Contains all necessary simulation parameters.
+    repeat : int
+        Maximum timed calls of each benchmark.
+    max_scalar_receivers : int
+        Largest receiver count for the scalar reference functions,
+        which are too slow for the largest counts.
+    max_seconds : float
+        Time after which a benchmark stops repeating.
+
+    Output
+    ------
+    report : dict
+        Contains the `machine` description and a list of `results`.
+
+    """
+    results = []
+
+    results += benchmark_sites(parameters, repeat, max_seconds)
+    results += benchmark_receivers(receiver_counts, parameters, repeat,
+        max_seconds)
+    results += benchmark_path_loss(receiver_counts, environments, parameters,
+        repeat, max_scalar_receivers, max_seconds)
+    results += benchmark_link_budget(receiver_counts, carrier_counts,
+        environments, parameters, repeat, max_scalar_receivers, max_seconds)
+
+    return {
+        'machine': describe_machine(),
+        'settings': {
+            'receiver_counts': list(receiver_counts),
+            'carrier_counts': list(carrier_counts),
+            'environments': list(environments),
+            'repeat': repeat,
+            'max_scalar_receivers': max_scalar_receivers,
+            'site_radius': SITE_RADIUS,
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+        '\n')[0])
+    parser.add_argument('--receivers', type=int, nargs='+',
+        default=RECEIVER_COUNTS, help='approximate receiver counts')
+    parser.add_argument('--carriers', type=int, nargs='+',
+        default=CARRIER_COUNTS, help='numbers of carriers')
+    parser.add_argument('--environments', nargs='+', default=ENVIRONMENTS)
+    parser.add_argument('--repeat', type=int, default=5,
+        help='maximum timed calls of each benchmark')
+    parser.add_argument('--max-scalar-receivers', type=int, default=1000,
+        help='largest receiver count for the scalar reference functions')
+    parser.add_argument('--max-seconds', type=float, default=10,
+        help='time after which a benchmark stops repeating')
+    parser.add_argument('--output', help='path of the .json report')
+    parser.add_argument('--baseline', help='earlier .json report to compare')
+    parser.add_argument('--threshold', type=float, default=1.2,
+        help='slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.receivers, args.carriers, args.environments,
+        PARAMETERS, args.repeat, args.max_scalar_receivers, args.max_seconds)
+
+    for entry in report['results']:
+        print('{:<36} {:<60} {:>10.4f} s'.format(entry['benchmark'],
+            json.dumps(entry['settings']), entry['min_seconds']))
+
+    regressions = []
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        report['comparison'] = compare_reports(report, baseline,
+            args.threshold)
+        regressions = [
+            entry for entry in report['comparison'] if entry['regression']
+        ]
+        for entry in regressions:
+            print('Regression: {} {} {:.2f}x slower'.format(
+                entry['benchmark'], json.dumps(entry['settings']),
+                entry['ratio']))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    sys.exit(1 if regressions else 0)
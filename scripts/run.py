@@ -15,7 +15,8 @@ from collections import OrderedDict
 from tqdm import tqdm
 
 from cucumber.demand import estimate_demand
-from cucumber.supply import estimate_supply
+from cucumber.supply import (estimate_supply, index_capacity_lut,
+    compile_capacity_lut, read_capacity_lut_source, load_capacity_lut)
 from cucumber.energy import assess_energy
 from cucumber.emissions import assess_emissions
 from cucumber.costs import assess_cost
@@ -35,41 +36,25 @@ OUTPUT = os.path.join(BASE_PATH, '..', 'results', 'model_results')
 
 def read_capacity_lut(path):
     """
+    Read the main capacity lookup table (see `index_capacity_lut`).
+
+    The table is compiled to a binary form alongside the .csv on first
+    use, and recompiled when the .csv changes. Later reads memory map
+    the compiled table (see `load_capacity_lut`).
 
     """
-    capacity_lut = {}
+    compiled_path = os.path.splitext(path)[0] + '.json'
 
-    with open(path, 'r') as capacity_lookup_file:
-        reader = csv.DictReader(capacity_lookup_file)
-        for idx, row in enumerate(reader):
+    stat = os.stat(path)
+    source = [stat.st_size, stat.st_mtime_ns]
 
-            if float(row["capacity_mbps_km2"]) <= 0:
-                continue
+    if read_capacity_lut_source(compiled_path) != source:
+        with open(path, 'r') as capacity_lookup_file:
+            reader = csv.DictReader(capacity_lookup_file)
+            capacity_lut = index_capacity_lut(reader)
+        compile_capacity_lut(capacity_lut, compiled_path, source)
 
-            environment = row["environment"].lower()
-            ant_type = row["ant_type"]
-            frequency_GHz = str(int(float(row["frequency_GHz"]) * 1e3))
-            generation = str(row["generation"])
-            ci = str(row['confidence_interval'])
-
-            if (ant_type, frequency_GHz, generation, ci) \
-                not in capacity_lut:
-                capacity_lut[(ant_type, frequency_GHz, generation, ci)
-                    ] = []
-
-            capacity_lut[(
-                ant_type,
-                frequency_GHz,
-                generation,
-                ci)].append((
-                    float(row["sites_per_km2"]),
-                    float(row["capacity_mbps_km2"])
-                ))
-
-        for key, value_list in capacity_lut.items():
-            value_list.sort(key=lambda tup: tup[0])
-
-    return capacity_lut
+    return load_capacity_lut(compiled_path)
 
 
 def read_emissions_lut(path):
@@ -12,13 +12,25 @@ import os
 import sys
 import configparser
 import csv
+import json
+import hashlib
+import shutil
 import math
+import time
+import zlib
 from random import choice
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from shapely.geometry import shape, Point, LineString, mapping
+from scipy.stats import qmc
+from shapely.geometry import shape, Point, LineString, Polygon, box, mapping
 
-from cucumber.generate_hex import produce_sites_and_site_areas
-from cucumber.system_simulator import SimulationManager
+from cucumber.generate_hex import (produce_unit_sites_and_site_areas,
+    points_in_convex_polygon, calculate_hexagon_symmetry_domain)
+from cucumber.system_simulator import (SimulationManager, ReceiverSet,
+    TransmitterSet, CARRIER_FIELDS, compile_spectral_efficiency_lookups,
+    select_carrier, get_instrumentation)
+from cucumber.supply import index_capacity_lut
 
 np.random.seed(42)
 
@@ -27,14 +39,574 @@ CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
 BASE_PATH = CONFIG['file_locations']['base_path']
 DATA_INTERMEDIATE = os.path.join(BASE_PATH, 'intermediate')
 
+LUT_FIELDS = [
+    'confidence_interval',
+    'environment',
+    'inter_site_distance_m',
+    'site_area_km2',
+    'sites_per_km2',
+    'frequency_GHz',
+    'bandwidth_MHz',
+    'number_of_sectors',
+    'generation',
+    'ant_type',
+    'transmission_type',
+    'path_loss_dB',
+    'received_power_dBm',
+    'interference_dBm',
+    'noise_dB',
+    'sinr_dB',
+    'spectral_efficiency_bps_hz',
+    'capacity_mbps',
+    'capacity_mbps_km2',
+    'samples',
+]
+
+
+def generate_receiver_grid(site_area, parameters, resolution=None):
+    """
+    Generate receivers on a regular grid within the site area.
+
+    Grid points are tested against the site area all at once, giving
+    the same receivers and random draws as the original loop over
+    shapely points, as arrays ready for the array-based simulator.
+
+    Parameters
+    ----------
+    site_area : polygon
+        Shape of the site area we want to generate receivers within.
+    parameters : dict
+        Contains all necessary simulation parameters.
+    resolution : int
+        Grid resolution of the site area bounding box. Defaults to the
+        `grid_resolution` parameter, or 50. As in the original loop, the
+        number of points along each axis is computed as
+        `int(sqrt(area) / (sqrt(area) / resolution))`, which rounds down
+        to one point fewer for some areas.
+
+    Output
+    ------
+    receivers : ReceiverSet
+        The receivers within the area boundary.
+
+    """
+    if resolution is None:
+        resolution = parameters.get('grid_resolution', 50)
+
+    polygon = site_area[0]['geometry']['coordinates'][0]
+
+    area = shape(site_area[0]['geometry']).area
+    size = int(math.sqrt(area) / (math.sqrt(area) / resolution))
+
+    minx, miny = np.min(polygon, axis=0)
+    maxx, maxy = np.max(polygon, axis=0)
+
+    x_axis = np.linspace(minx, maxx, num=size)
+    y_axis = np.linspace(miny, maxy, num=size)
+
+    xv, yv = np.meshgrid(x_axis, y_axis, sparse=False, indexing='ij')
+
+    #drawn for every grid point, in the same order as the original loop
+    indoor_outdoor_probability = np.random.rand(size, size)
+
+    inside = points_in_convex_polygon(polygon, xv, yv)
+
+    coordinates = np.column_stack((xv[inside], yv[inside]))
+    indoor = indoor_outdoor_probability[inside] < 0.5
+
+    return ReceiverSet.from_parameters(coordinates, indoor, parameters)
+
+
+def evaluate_receivers(coordinates, transmitter, interfering_transmitters,
+    ant_type, site_area, carriers, environment, modulation_and_coding_lut,
+    parameters):
+    """
+    Evaluate the link budget of all carriers at the given receiver
+    coordinates.
+
+    Parameters
+    ----------
+    coordinates : numpy array
+        Receiver coordinates with shape (receivers, 2).
+    transmitter : list of dicts or TransmitterSet
+        The serving transmitter.
+    interfering_transmitters : list of dicts or TransmitterSet
+        The interfering transmitters.
+    ant_type : string
+        Type of transmitters modelled.
+    site_area : List of dicts
+        Contains a geojson dict for the transmitter site area.
+    carriers : list of tuples
+        Frequency (GHz), bandwidth (MHz), generation and transmission
+        type of each carrier.
+    environment : string
+        Either urban, suburban or rural clutter type.
+    modulation_and_coding_lut : dict
+        A lookup table containing modulation and coding rates,
+        spectral efficiencies and SINR estimates.
+    parameters : dict
+        Contains all necessary simulation parameters.
+
+    Output
+    ------
+    results : dict
+        Multi-carrier results, as returned by
+        `SimulationManager.estimate_link_budget_carriers`.
+
+    """
+    indoor = np.random.rand(len(coordinates)) < 0.5
+
+    receivers = ReceiverSet.from_parameters(coordinates, indoor, parameters)
+
+    manager = SimulationManager(
+        transmitter, interfering_transmitters, ant_type,
+        receivers, site_area, parameters
+        )
+
+    return manager.estimate_link_budget_carriers(carriers, ant_type,
+        environment, modulation_and_coding_lut, parameters)
+
+
+def take_receivers(results, index):
+    """
+    Select receivers from multi-carrier results.
+
+    Parameters
+    ----------
+    results : dict
+        Multi-carrier results.
+    index : numpy array
+        Boolean mask or integer index of the receivers to keep.
+
+    Output
+    ------
+    results : dict
+        Multi-carrier results of the selected receivers.
+
+    """
+    output = {}
+
+    for key, value in results.items():
+        if key in CARRIER_FIELDS or np.ndim(value) == 0:
+            output[key] = value
+        else:
+            output[key] = np.asarray(value)[..., index]
+
+    return output
+
+
+def concatenate_receivers(results):
+    """
+    Join multi-carrier results of different receivers.
+
+    Parameters
+    ----------
+    results : list of dicts
+        Multi-carrier results for the same carriers.
+
+    Output
+    ------
+    results : dict
+        Multi-carrier results of all receivers.
+
+    """
+    output = {}
+
+    for key, value in results[0].items():
+        if key in CARRIER_FIELDS or np.ndim(value) == 0:
+            output[key] = value
+        else:
+            output[key] = np.concatenate(
+                [np.asarray(result[key]) for result in results], axis=-1)
+
+    return output
+
+
+def clip_cells(polygon, centres, sides):
+    """
+    Clip square cells to the site area.
+
+    Cells inside the site area keep their centre and full area. Cells
+    cut by the boundary are represented by the centroid and area of
+    their intersection with the site area, so area weights stay
+    unbiased at the cell edge.
+
+    Parameters
+    ----------
+    polygon : list of tuples
+        The coordinates of the convex site area.
+    centres : numpy array
+        Cell centres with shape (cells, 2).
+    sides : numpy array
+        Cell side lengths.
+
+    Output
+    ------
+    points : numpy array
+        Sample point of each cell with shape (cells, 2).
+    areas : numpy array
+        Area of each cell within the site area (zero for cells outside).
+
+    """
+    points = np.array(centres, dtype=float)
+    areas = np.asarray(sides, dtype=float)**2
+
+    half = np.asarray(sides)[:, np.newaxis] / 2
+    corners = np.stack([
+        centres + half * np.array(offset)
+        for offset in [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+    ])
+    inside = points_in_convex_polygon(polygon,
+        corners[..., 0], corners[..., 1]).all(axis=0)
+
+    geom = Polygon(polygon)
+
+    for idx in np.flatnonzero(~inside):
+        (x, y), side = centres[idx], sides[idx]
+        cell = box(x - side / 2, y - side / 2, x + side / 2, y + side / 2)
+        intersection = cell.intersection(geom)
+        areas[idx] = intersection.area
+        if intersection.area > 0:
+            points[idx] = intersection.centroid.coords[0]
+
+    return points, areas
+
+
+def run_adaptive_sampling(transmitter, interfering_transmitters, ant_type,
+    site_area, carriers, environment, modulation_and_coding_lut, parameters,
+    confidence_interval, metric='sinr', tolerance=0.1, resolution=10,
+    max_depth=6, symmetric=False):
+    """
+    Sample receivers adaptively, refining the site area where the
+    percentile of a metric is decided.
+
+    The site area is covered by a coarse grid of square cells, each
+    evaluated once and weighted by its area within the site area (see
+    `clip_cells`). A cell is split into four when the metric range of
+    its neighbourhood spans the current percentile estimate of any
+    carrier, so samples concentrate where the metric is steep and
+    close to the percentile (typically the cell edge), while flat
+    regions keep their coarse cells. Refinement stops once the
+    percentile of every carrier has moved by no more than `tolerance`
+    between rounds.
+
+    With `symmetric`, only one twelfth of the hexagonal site area is
+    sampled (see `calculate_hexagon_symmetry_domain`). This gives the
+    same area-weighted distribution when the interfering sites form
+    complete rings around the transmitter, as generated by
+    `generate_hex`.
+
+    Parameters
+    ----------
+    transmitter : list of dicts or TransmitterSet
+        The serving transmitter.
+    interfering_transmitters : list of dicts or TransmitterSet
+        The interfering transmitters.
+    ant_type : string
+        Type of transmitters modelled.
+    site_area : List of dicts
+        Contains a geojson dict for the transmitter site area.
+    carriers : list of tuples
+        Frequency (GHz), bandwidth (MHz), generation and transmission
+        type of each carrier.
+    environment : string
+        Either urban, suburban or rural clutter type.
+    modulation_and_coding_lut : dict
+        A lookup table containing modulation and coding rates,
+        spectral efficiencies and SINR estimates.
+    parameters : dict
+        Contains all necessary simulation parameters.
+    confidence_interval : int
+        The confidence interval of the lookup table.
+    metric : string
+        The metric whose percentile controls refinement.
+    tolerance : float
+        Change in the percentile between rounds (in the units of
+        `metric`) below which it is considered stable.
+    resolution : int
+        Number of cells across the site area in the first round.
+    max_depth : int
+        Maximum number of refinement rounds.
+    symmetric : bool
+        Sample only the symmetry domain of the hexagonal site area.
+
+    Output
+    ------
+    results : dict
+        Multi-carrier results of the final cells.
+    weights : numpy array
+        The area (m^2) represented by each result.
+    evaluations : int
+        Number of receivers evaluated, including refined cells.
+
+    """
+    if PERCENTILE_METRICS.get(metric, False):
+        percentile = confidence_interval
+    else:
+        percentile = 100 - confidence_interval
+
+    polygon = site_area[0]['geometry']['coordinates'][0]
+
+    if symmetric:
+        polygon = calculate_hexagon_symmetry_domain(polygon)
+
+    minx, miny = np.min(polygon, axis=0)
+    maxx, maxy = np.max(polygon, axis=0)
+
+    size = max(maxx - minx, maxy - miny) / resolution
+
+    x_axis = minx + (np.arange(int(np.ceil((maxx - minx) / size))) + 0.5) * size
+    y_axis = miny + (np.arange(int(np.ceil((maxy - miny) / size))) + 0.5) * size
+
+    xv, yv = np.meshgrid(x_axis, y_axis, sparse=False, indexing='ij')
+
+    points, areas = clip_cells(polygon,
+        np.column_stack((xv.ravel(), yv.ravel())), np.full(xv.size, size))
+    inside = (areas > 0).reshape(xv.shape)
+
+    arguments = (transmitter, interfering_transmitters, ant_type, site_area,
+        carriers, environment, modulation_and_coding_lut, parameters)
+
+    centres = np.column_stack((xv[inside], yv[inside]))
+    sides = np.full(len(centres), size)
+    weights = areas[inside.ravel()]
+
+    results = evaluate_receivers(points[inside.ravel()], *arguments)
+    evaluations = len(centres)
+
+    #range of the metric over each cell and its grid neighbours
+    values = np.full((len(carriers),) + xv.shape, np.nan)
+    values[:, inside] = results[metric]
+    padded = np.pad(values, ((0, 0), (1, 1), (1, 1)), constant_values=np.nan)
+    neighbours = np.stack([
+        values,
+        padded[:, :-2, 1:-1], padded[:, 2:, 1:-1],
+        padded[:, 1:-1, :-2], padded[:, 1:-1, 2:],
+    ])
+    lower = np.where(np.isnan(neighbours), np.inf, neighbours).min(
+        axis=0)[:, inside]
+    upper = np.where(np.isnan(neighbours), -np.inf, neighbours).max(
+        axis=0)[:, inside]
+
+    previous = None
+    stable = 0
+
+    for depth in range(max_depth + 1):
+
+        estimate = np.zeros(len(carriers))
+        for idx in range(len(carriers)):
+            accumulator = PercentileAccumulator(metrics=[metric])
+            accumulator.push({metric: results[metric][idx]}, weights)
+            estimate[idx] = accumulator.percentile(metric, percentile)
+
+        if previous is not None and np.all(
+            np.abs(estimate - previous) <= tolerance):
+            stable += 1
+        else:
+            stable = 0
+
+        previous = estimate
+
+        #cells whose neighbourhood spans the estimate
+        refine = np.any(
+            (lower < upper) &
+            (lower <= estimate[:, np.newaxis]) &
+            (estimate[:, np.newaxis] <= upper), axis=0)
+
+        if stable == 1 or depth == max_depth or not refine.any():
+            break
+
+        #(parents, children, 2)
+        offsets = np.array([[-1, -1], [-1, 1], [1, -1], [1, 1]]) / 4
+        children = (centres[refine][:, np.newaxis, :] +
+            offsets * sides[refine][:, np.newaxis, np.newaxis])
+        child_sides = np.broadcast_to(
+            sides[refine][:, np.newaxis] / 2, children.shape[:2])
+
+        child_points, child_areas = clip_cells(polygon,
+            children.reshape(-1, 2), child_sides.ravel())
+        child_inside = (child_areas > 0).reshape(child_sides.shape)
+
+        child_results = evaluate_receivers(
+            child_points[child_inside.ravel()], *arguments)
+        evaluations += int(child_inside.sum())
+
+        #range of the metric over each parent and its children
+        child_max = np.full((len(carriers),) + child_inside.shape, -np.inf)
+        child_max[:, child_inside] = child_results[metric]
+        child_min = np.full((len(carriers),) + child_inside.shape, np.inf)
+        child_min[:, child_inside] = child_results[metric]
+        parent_values = results[metric][:, refine]
+        child_upper = np.broadcast_to(
+            np.fmax(child_max.max(axis=2), parent_values)[..., np.newaxis],
+            child_max.shape)[:, child_inside]
+        child_lower = np.broadcast_to(
+            np.fmin(child_min.min(axis=2), parent_values)[..., np.newaxis],
+            child_min.shape)[:, child_inside]
+
+        results = concatenate_receivers([
+            take_receivers(results, ~refine), child_results])
+        centres = np.concatenate([centres[~refine], children[child_inside]])
+        sides = np.concatenate([sides[~refine], child_sides[child_inside]])
+        weights = np.concatenate([weights[~refine],
+            child_areas[child_inside.ravel()]])
+        lower = np.concatenate([lower[:, ~refine], child_lower], axis=1)
+        upper = np.concatenate([upper[:, ~refine], child_upper], axis=1)
+
+    return results, weights, evaluations
+
+
+def run_quasi_random_sampling(transmitter, interfering_transmitters,
+    ant_type, site_area, carriers, environment, modulation_and_coding_lut,
+    parameters, confidence_intervals, method='sobol', metric='sinr',
+    tolerance=0.1, batch_size=256, max_samples=16384, symmetric=False,
+    max_empty_batches=16):
+    """
+    Sample receivers with a low-discrepancy sequence, in batches, until
+    the percentiles converge.
+
+    Points of a scrambled Sobol or Halton sequence within the site area
+    are evaluated a batch at a time and pushed into one
+    `PercentileAccumulator` per carrier. Sampling stops once the
+    percentile of `metric` has moved by no more than `tolerance` for
+    every carrier and confidence interval over two consecutive batches,
+    or after `max_samples`.
+
+    Parameters
+    ----------
+    transmitter : list of dicts or TransmitterSet
+        The serving transmitter.
+    interfering_transmitters : list of dicts or TransmitterSet
+        The interfering transmitters.
+    ant_type : string
+        Type of transmitters modelled.
+    site_area : List of dicts
+        Contains a geojson dict for the transmitter site area.
+    carriers : list of tuples
+        Frequency (GHz), bandwidth (MHz), generation and transmission
+        type of each carrier.
+    environment : string
+        Either urban, suburban or rural clutter type.
+    modulation_and_coding_lut : dict
+        A lookup table containing modulation and coding rates,
+        spectral efficiencies and SINR estimates.
+    parameters : dict
+        Contains all necessary simulation parameters.
+    confidence_intervals: list
+        Integer confidence interval values.
+    method : string
+        Either `sobol` or `halton`.
+    metric : string
+        The metric whose percentiles decide convergence.
+    tolerance : float
+        Change in the percentiles between batches (in the units of
+        `metric`) below which they are considered stable.
+    batch_size : int
+        Number of sequence points drawn per batch (a power of two keeps
+        the balance of the Sobol sequence).
+    max_samples : int
+        Maximum number of receivers evaluated.
+    symmetric : bool
+        Sample only the symmetry domain of the hexagonal site area (see
+        `run_adaptive_sampling`).
+    max_empty_batches : int
+        Number of batches without points within the site area after
+        which sampling fails.
+
+    Output
+    ------
+    percentile_results : list
+        The output of `obtain_percentile_values` for each carrier.
+    samples : int
+        Number of receivers evaluated.
+
+    """
+    if method == 'sobol':
+        sampler = qmc.Sobol(d=2, scramble=True, seed=parameters['seed_value'])
+    elif method == 'halton':
+        sampler = qmc.Halton(d=2, scramble=True, seed=parameters['seed_value'])
+    else:
+        raise ValueError('Did not recognise sampling method: {}'.format(
+            method))
+
+    polygon = site_area[0]['geometry']['coordinates'][0]
+
+    if symmetric:
+        polygon = calculate_hexagon_symmetry_domain(polygon)
+
+    minx, miny = np.min(polygon, axis=0)
+    maxx, maxy = np.max(polygon, axis=0)
+
+    arguments = (transmitter, interfering_transmitters, ant_type, site_area,
+        carriers, environment, modulation_and_coding_lut, parameters)
+
+    accumulators = [PercentileAccumulator() for carrier in carriers]
+
+    percentiles = []
+    for confidence_interval in confidence_intervals:
+        if PERCENTILE_METRICS.get(metric, False):
+            percentiles.append(confidence_interval)
+        else:
+            percentiles.append(100 - confidence_interval)
+
+    samples = 0
+    empty_batches = 0
+    previous = None
+    stable = 0
+
+    while samples < max_samples:
+
+        points = qmc.scale(sampler.random(batch_size), [minx, miny],
+            [maxx, maxy])
+        points = points[points_in_convex_polygon(polygon,
+            points[:, 0], points[:, 1])][:max_samples - samples]
+
+        #a site area without interior points would never be sampled
+        if len(points) == 0:
+            empty_batches += 1
+            if empty_batches == max_empty_batches:
+                raise ValueError('No sample points within the site area '
+                    'after {} batches'.format(empty_batches))
+            continue
+
+        all_results = evaluate_receivers(points, *arguments)
+        samples += len(points)
+
+        for idx, accumulator in enumerate(accumulators):
+            accumulator.push(select_carrier(all_results, idx))
+
+        estimate = np.array([
+            [accumulator.percentile(metric, percentile)
+                for percentile in percentiles]
+            for accumulator in accumulators
+        ])
+
+        if previous is not None and np.all(
+            np.abs(estimate - previous) <= tolerance):
+            stable += 1
+        else:
+            stable = 0
+
+        previous = estimate
+
+        if stable == 2:
+            break
+
+    percentile_results = []
+    for accumulator, carrier in zip(accumulators, carriers):
+        percentile_results.append(accumulator.obtain_percentile_values(
+            carrier[3], confidence_intervals))
+
+    return percentile_results, samples
+
 
 def generate_receivers(site_area, parameters, grid):
     """
     Generate receiver locations as points within the site area.
 
-    Sampling points can either be generated on a grid (grid=1)
-    or more efficiently between the transmitter and the edge
-    of the site (grid=0) area.
+    Sampling points can either be generated on a grid (grid=1, see
+    `generate_receiver_grid`) or more efficiently between the
+    transmitter and the edge of the site (grid=0) area.
 
     Parameters
     ----------
@@ -51,60 +623,14 @@ def generate_receivers(site_area, parameters, grid):
         Contains the quantity of desired receivers within the area boundary.
 
     """
-    receivers = []
-
     if grid == 1:
 
-        geom = shape(site_area[0]['geometry'])
-        geom_box = geom.bounds
-
-        minx = geom_box[0]
-        miny = geom_box[1]
-        maxx = geom_box[2]
-        maxy = geom_box[3]
-
-        id_number = 0
-
-        x_axis = np.linspace(
-            minx, maxx, num=(
-                int(math.sqrt(geom.area) / (math.sqrt(geom.area)/50))
-                )
-            )
-        y_axis = np.linspace(
-            miny, maxy, num=(
-                int(math.sqrt(geom.area) / (math.sqrt(geom.area)/50))
-                )
-            )
-
-        xv, yv = np.meshgrid(x_axis, y_axis, sparse=False, indexing='ij')
-        for i in range(len(x_axis)):
-            for j in range(len(y_axis)):
-                receiver = Point((xv[i,j], yv[i,j]))
-                indoor_outdoor_probability = np.random.rand(1,1)[0][0]
-                if geom.contains(receiver):
-                    receivers.append({
-                        'type': "Feature",
-                        'geometry': {
-                            "type": "Point",
-                            "coordinates": [xv[i,j], yv[i,j]],
-                        },
-                        'properties': {
-                            'ue_id': "id_{}".format(id_number),
-                            "misc_losses": parameters['rx_misc_losses'],
-                            "gain": parameters['rx_gain'],
-                            "losses": parameters['rx_losses'],
-                            "ue_height": float(parameters['rx_height']),
-                            "indoor": (True if float(indoor_outdoor_probability) < \
-                                float(0.5) else False),
-                        }
-                    })
-                    id_number += 1
-
-                else:
-                    pass
+        return generate_receiver_grid(site_area, parameters).to_geojson()
 
     else:
 
+        receivers = []
+
         centroid = shape(site_area[0]['geometry']).centroid
 
         coord = site_area[0]['geometry']['coordinates'][0][0]
@@ -133,403 +659,1902 @@ def generate_receivers(site_area, parameters, grid):
             })
             id_number += 1
 
-    return receivers
+    return receivers
+
+
+def convert_results_to_columns(results):
+    """
+    Convert simulation results to a dict of metric arrays.
+
+    Parameters
+    ----------
+    results : list of dicts or dict
+        Either one dict per receiver (`estimate_link_budget`) or a
+        dict of arrays (`estimate_link_budget_vectorized`).
+
+    Output
+    ------
+    columns : dict
+        Contains one numpy array per metric. Missing (None) values
+        are held as nan.
+
+    """
+    if isinstance(results, dict):
+        return results
+
+    columns = {}
+
+    if len(results) == 0:
+        return columns
+
+    for key in results[0].keys():
+        values = [result[key] for result in results]
+        if isinstance(values[0], str):
+            columns[key] = np.array(values)
+        else:
+            columns[key] = np.array(values, dtype=float)
+
+    return columns
+
+
+def convert_results_to_records(results):
+    """
+    Convert simulation results to a list of dicts, one per receiver.
+
+    Parameters
+    ----------
+    results : list of dicts or dict
+        Either one dict per receiver (`estimate_link_budget`) or a
+        dict of arrays (`estimate_link_budget_vectorized`).
+
+    Output
+    ------
+    records : list of dicts
+        Contains one dict per receiver.
+
+    """
+    if not isinstance(results, dict):
+        return results
+
+    length = len(results['receiver_x'])
+
+    columns = {}
+    for key, value in results.items():
+        if np.ndim(value) == 0:
+            columns[key] = [value] * length
+        else:
+            columns[key] = value.tolist()
+
+    return [
+        {key: columns[key][idx] for key in columns.keys()}
+        for idx in range(length)
+    ]
+
+
+#metrics summarised in the lookup table, and whether a low value is better
+#(low values take the confidence interval percentile, others 100 minus it)
+PERCENTILE_METRICS = OrderedDict([
+    ('path_loss', True),
+    ('received_power', False),
+    ('interference', True),
+    ('noise', True),
+    ('sinr', False),
+    ('spectral_efficiency', False),
+    ('capacity_mbps', False),
+    ('capacity_mbps_km2', False),
+])
+
+
+class PercentileAccumulator(object):
+    """
+
+    Accumulate metric values incrementally and answer percentile queries
+    once all values have been pushed.
+
+    In `exact` mode all values are kept and percentiles match
+    `np.percentile(..., method='closest_observation')`, or the same
+    method applied to each value repeated by its weight when values are
+    pushed with weights. In `sketch` mode each metric is held as about
+    `capacity` weighted values in a KLL sketch (Karnin, Lang and
+    Liberty, 2016): values enter the lowest of a stack of levels, and a
+    full level is compacted by sorting it and keeping one value from
+    each adjacent pair, chosen at random, with the weight of both. The
+    rank error of a percentile is then independent of the number of
+    values pushed, within about 0.5 percentiles for the default capacity
+    of 2000. Random choices use a generator of the accumulator, so
+    results are repeatable and the global random state is untouched.
+
+    Parameters
+    ----------
+    metrics : list
+        Names of the metrics to accumulate.
+    mode : string
+        Either `exact` or `sketch`.
+    capacity : int
+        Approximate number of weighted values held per metric in
+        `sketch` mode.
+
+    """
+    def __init__(self, metrics=None, mode='exact', capacity=2000):
+
+        if mode not in ('exact', 'sketch'):
+            raise ValueError('Did not recognise percentile mode: {}'.format(
+                mode))
+
+        if metrics is None:
+            metrics = list(PERCENTILE_METRICS.keys())
+
+        self.metrics = list(metrics)
+        self.mode = mode
+        self.capacity = capacity
+        self.count = 0
+
+        #exact mode holds pushed chunks, sketch mode one array per level
+        self.values = {metric: [] for metric in self.metrics}
+        self.weights = {metric: [] for metric in self.metrics}
+        self.contains_nan = {metric: False for metric in self.metrics}
+        self.weighted = False
+        self.random_state = np.random.default_rng(0)
+
+
+    def push(self, results, weights=None):
+        """
+
+        Add a chunk of results.
+
+        Parameters
+        ----------
+        results : list of dicts or dict
+            Either one dict per receiver or a dict of arrays, as accepted
+            by `convert_results_to_columns`.
+        weights : numpy array
+            Optional weight (e.g. the area represented) of each receiver.
+            Unweighted receivers have a weight of one.
+
+        """
+        columns = convert_results_to_columns(results)
+
+        self.count += np.size(columns[self.metrics[0]])
+
+        if weights is not None:
+            self.weighted = True
+
+        for metric in self.metrics:
+
+            values = np.asarray(columns[metric], dtype=float)
+
+            if weights is None:
+                chunk_weights = np.ones(values.size)
+            else:
+                chunk_weights = np.ravel(np.broadcast_to(
+                    np.asarray(weights, dtype=float), values.shape))
+
+            values = np.ravel(values)
+
+            nan = np.isnan(values)
+            if nan.any():
+                self.contains_nan[metric] = True
+                if self.mode == 'sketch':
+                    values = values[~nan]
+                    chunk_weights = chunk_weights[~nan]
+
+            if self.mode == 'exact':
+                self.values[metric].append(values)
+                self.weights[metric].append(chunk_weights)
+                continue
+
+            levels = self.values[metric]
+            level_weights = self.weights[metric]
+
+            if not levels:
+                levels.append(values)
+                level_weights.append(chunk_weights)
+            else:
+                levels[0] = np.concatenate((levels[0], values))
+                level_weights[0] = np.concatenate(
+                    (level_weights[0], chunk_weights))
+
+            while sum(len(level) for level in levels) > self.capacity:
+                self._compact(metric)
+
+
+    def _level_capacities(self, size):
+        """
+
+        Capacities of a stack of `size` sketch levels, shrinking by a
+        factor of 2/3 from the top level down, so they sum to about
+        `capacity`.
+
+        """
+        top = max(self.capacity // 3, 2)
+
+        return [
+            max(int(top * (2 / 3) ** (size - 1 - level)), 2)
+            for level in range(size)
+        ]
+
+
+    def _compact(self, metric):
+        """
+
+        Compact the lowest full level of a metric into the level above,
+        keeping one value of each adjacent pair of sorted values with the
+        weight of both.
+
+        """
+        levels = self.values[metric]
+        level_weights = self.weights[metric]
+
+        capacities = self._level_capacities(len(levels))
+
+        level = 0
+        while level < len(levels) - 1 and \
+            len(levels[level]) < capacities[level]:
+            level += 1
+
+        order = np.argsort(levels[level], kind='stable')
+        values = levels[level][order]
+        weights = level_weights[level][order]
+
+        #an odd value out stays at this level
+        start = len(values) % 2
+        levels[level] = values[:start]
+        level_weights[level] = weights[:start]
+
+        offset = self.random_state.integers(2)
+        values = values[start:].reshape(-1, 2)[:, offset]
+        weights = weights[start:].reshape(-1, 2).sum(axis=1)
+
+        if level == len(levels) - 1:
+            levels.append(values)
+            level_weights.append(weights)
+        else:
+            levels[level + 1] = np.concatenate((levels[level + 1], values))
+            level_weights[level + 1] = np.concatenate(
+                (level_weights[level + 1], weights))
+
+
+    def percentile(self, metric, percentile):
+        """
+
+        Estimate a percentile of an accumulated metric.
+
+        Parameters
+        ----------
+        metric : string
+            Name of the metric.
+        percentile : float
+            Percentile between 0 and 100.
+
+        Returns
+        -------
+        value : float
+            The closest observed value at the percentile.
+
+        """
+        if self.mode == 'exact' and not self.weighted:
+            return np.percentile(np.concatenate(self.values[metric]),
+                percentile, method='closest_observation')
+
+        if self.contains_nan[metric]:
+            return np.nan
+
+        values = np.concatenate(self.values[metric])
+        weights = np.concatenate(self.weights[metric])
+
+        order = np.argsort(values, kind='stable')
+        values = values[order]
+        cumulative = np.cumsum(weights[order])
+
+        #zero based position of the closest observation, as in np.percentile
+        #with each value repeated by its weight
+        position = cumulative[-1] * (percentile / 100) - 1.5
+        previous = np.floor(position)
+        if position != previous or previous % 2 != 1:
+            previous += 1
+
+        index = min(np.searchsorted(cumulative, max(previous, 0),
+            side='right'), len(values) - 1)
+
+        return values[index]
+
+
+    def obtain_percentile_values(self, transmission_type,
+        confidence_intervals):
+        """
+
+        Get the threshold value for each metric at the given confidence
+        intervals.
+
+        Parameters
+        ----------
+        tranmission_type : string
+            The transmission type (SISO, MIMO etc.).
+        confidence_intervals: list
+            Integer confidence interval values.
+
+        Output
+        ------
+        percentile_site_results : list of dicts
+            Contains the confidence interval values for each metric.
+
+        """
+        output = []
+
+        for confidence_interval in confidence_intervals:
+
+            result = {
+                'confidence_interval': confidence_interval,
+                'tranmission_type': transmission_type,
+            }
+
+            for metric in self.metrics:
+                if PERCENTILE_METRICS.get(metric, False):
+                    percentile = confidence_interval
+                else:
+                    percentile = 100 - confidence_interval
+                result[metric] = self.percentile(metric, percentile)
+
+            output.append(result)
+
+        return output
+
+
+def obtain_percentile_values(results, transmission_type, parameters,
+    confidence_intervals, mode='exact', weights=None):
+    """
+
+    Get the threshold value for a metric based on a given percentiles.
+
+    Parameters
+    ----------
+    results : list of dicts or dict
+        All data returned from the system simulation, either per
+        receiver or as a dict of arrays.
+    tranmission_type : string
+        The transmission type (SISO, MIMO etc.).
+    parameters : dict
+        Contains all necessary simulation parameters.
+    confidence_intervals: list
+        Integer confidence interval values.
+    mode : string
+        Either `exact` or `sketch` (see `PercentileAccumulator`).
+    weights : numpy array
+        Optional weight of each receiver, e.g. the area it represents.
+
+    Output
+    ------
+    percentile_site_results : list of dicts
+        Contains the confidence interval values for each metric.
+
+    """
+    accumulator = PercentileAccumulator(mode=mode)
+
+    accumulator.push(results, weights)
+
+    return accumulator.obtain_percentile_values(transmission_type,
+        confidence_intervals)
+
+
+# def obtain_threshold_values_choice(results, parameters):
+#     """
+
+#     Get the threshold capacity based on a given percentile.
+
+#     Parameters
+#     ----------
+#     results : list of dicts
+#         All data returned from the system simulation.
+#     parameters : dict
+#         Contains all necessary simulation parameters.
+
+#     Output
+#     ------
+#     matching_result : float
+#         Contains the chosen percentile value based on the input data.
+
+#     """
+#     sinr_values = []
+
+#     percentile = parameters['percentile']
+
+#     for result in results:
+
+#         sinr = result['sinr']
+
+#         if sinr == None:
+#             pass
+#         else:
+#             sinr_values.append(sinr)
+
+#     sinr = np.percentile(sinr_values, percentile, interpolation='nearest')
+
+#     matching_result = []
+
+#     for result in results:
+#         if float(result['sinr']) == float(sinr):
+#             matching_result.append(result)
+
+#     return float(choice(matching_result))
+
+
+def convert_results_geojson(data):
+    """
+    Convert results to geojson format, for writing to shapefile.
+
+    Parameters
+    ----------
+    data : list of dicts or dict
+        Contains all results ready to be written, either per receiver
+        or as a dict of arrays.
+
+    Outputs
+    -------
+    output : list of dicts
+        A list of geojson dictionaries ready for writing.
+
+    """
+    output = []
+
+    for datum in convert_results_to_records(data):
+        output.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [
+                    datum['receiver_x'], datum['receiver_y']]
+                },
+            'properties': {
+                'path_loss': float(datum['path_loss']),
+                'received_power': float(datum['received_power']),
+                'interference': float(datum['interference']),
+                'noise': float(datum['noise']),
+                'sinr': float(datum['sinr']),
+                'spectral_efficiency': float(
+                    datum['spectral_efficiency']
+                ),
+                'capacity_mbps': float(
+                    datum['capacity_mbps']
+                ),
+                'capacity_mbps_km2': float(
+                    datum['capacity_mbps_km2']
+                ),
+                },
+            }
+        )
+
+    return output
+
+
+def write_full_results(data, environment, site_radius, frequency,
+    bandwidth, generation, ant_type, transmittion_type, directory,
+    filename, parameters):
+    """
+    Write full results data to .csv.
+
+    Parameters
+    ----------
+    data : list of dicts or dict
+        Contains all results ready to be written, either per receiver
+        or as a dict of arrays.
+    environment : string
+        Either urban, suburban or rural clutter type.
+    site_radius : int
+        Radius of site area in meters.
+    frequency : float
+        Spectral frequency of carrier band in GHz.
+    bandwidth : int
+        Channel bandwidth of carrier band in MHz.
+    generation : string
+        Either 4G or 5G depending on technology generation.
+    ant_type : string
+        The type of transmitter modelled (macro, micro etc.).
+    tranmission_type : string
+        The type of tranmission (SISO, MIMO 4x4, MIMO 8x8 etc.).
+    directory : string
+        Folder the data will be written to.
+    filename : string
+        Name of the .csv file.
+    parameters : dict
+        Contains all necessary simulation parameters.
+
+    """
+    sectors = parameters['sectorization']
+    inter_site_distance = site_radius * 2
+    site_area_km2 = (
+        math.sqrt(3) / 2 * inter_site_distance ** 2 / 1e6
+    )
+    sites_per_km2 = 1 / site_area_km2
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    full_path = os.path.join(directory, filename)
+
+    results_file = open(full_path, 'w', newline='')
+    results_writer = csv.writer(results_file)
+    results_writer.writerow(
+        (
+            'environment',
+            'inter_site_distance_m',
+            'sites_per_km2',
+            'frequency_GHz',
+            'bandwidth_MHz',
+            'number_of_sectors',
+            'generation',
+            'ant_type',
+            'transmittion_type',
+            'receiver_x',
+            'receiver_y',
+            'r_distance',
+            'path_loss_dB',
+            'r_model',
+            'received_power_dB',
+            'interference_dB',
+            'i_model',
+            'noise_dB',
+            'sinr_dB',
+            'spectral_efficiency_bps_hz',
+            'capacity_mbps',
+            'capacity_mbps_km2'
+        )
+    )
+
+    for row in convert_results_to_records(data):
+        results_writer.writerow((
+            environment,
+            inter_site_distance,
+            sites_per_km2,
+            frequency,
+            bandwidth,
+            sectors,
+            generation,
+            ant_type,
+            transmittion_type,
+            row['receiver_x'],
+            row['receiver_y'],
+            row['distance'],
+            row['path_loss'],
+            row['r_model'],
+            row['received_power'],
+            row['interference'],
+            row['i_model'],
+            row['noise'],
+            row['sinr'],
+            row['spectral_efficiency'],
+            row['capacity_mbps'],
+            row['capacity_mbps_km2'],
+            ))
+
+    results_file.close()
+
+
+#columns of the full results dataset held once per carrier and site radius
+FULL_RESULTS_CONSTANTS = [
+    'inter_site_distance_m',
+    'sites_per_km2',
+    'frequency_GHz',
+    'bandwidth_MHz',
+    'number_of_sectors',
+    'ant_type',
+    'transmittion_type',
+    'r_model',
+    'i_model',
+]
+
+#per receiver columns of the full results dataset, and the results keys
+FULL_RESULTS_METRICS = OrderedDict([
+    ('receiver_x', 'receiver_x'),
+    ('receiver_y', 'receiver_y'),
+    ('r_distance', 'distance'),
+    ('path_loss_dB', 'path_loss'),
+    ('received_power_dB', 'received_power'),
+    ('interference_dB', 'interference'),
+    ('noise_dB', 'noise'),
+    ('sinr_dB', 'sinr'),
+    ('spectral_efficiency_bps_hz', 'spectral_efficiency'),
+    ('capacity_mbps', 'capacity_mbps'),
+    ('capacity_mbps_km2', 'capacity_mbps_km2'),
+])
+
+
+def format_full_results_table(data, environment, site_radius, frequency,
+    bandwidth, generation, ant_type, transmittion_type, parameters):
+    """
+    Format full results as a compact table for `FullResultsDataset`.
+
+    Parameters
+    ----------
+    data : list of dicts or dict
+        Contains all results ready to be written, either per receiver
+        or as a dict of arrays.
+    environment : string
+        Either urban, suburban or rural clutter type.
+    site_radius : int
+        Radius of site area in meters.
+    frequency : float
+        Spectral frequency of carrier band in GHz.
+    bandwidth : int
+        Channel bandwidth of carrier band in MHz.
+    generation : string
+        Either 4G or 5G depending on technology generation.
+    ant_type : string
+        The type of transmitter modelled (macro, micro etc.).
+    transmittion_type : string
+        The type of tranmission (SISO, MIMO 4x4, MIMO 8x8 etc.).
+    parameters : dict
+        Contains all necessary simulation parameters.
+
+    Output
+    ------
+    table : dict
+        Contains the `partition` (environment and generation), the
+        `constants` shared by all receivers and the per receiver
+        `columns` as float32 arrays.
+
+    """
+    columns = convert_results_to_columns(data)
+
+    inter_site_distance = site_radius * 2
+    site_area_km2 = math.sqrt(3) / 2 * inter_site_distance ** 2 / 1e6
+
+    constants = OrderedDict([
+        ('inter_site_distance_m', inter_site_distance),
+        ('sites_per_km2', 1 / site_area_km2),
+        ('frequency_GHz', frequency),
+        ('bandwidth_MHz', bandwidth),
+        ('number_of_sectors', parameters['sectorization']),
+        ('ant_type', ant_type),
+        ('transmittion_type', transmittion_type),
+    ])
+
+    for key in ['r_model', 'i_model']:
+        values = np.unique(np.asarray(columns[key], dtype=str))
+        constants[key] = values[0] if len(values) == 1 else ','.join(values)
+
+    return {
+        'partition': OrderedDict([
+            ('environment', environment),
+            ('generation', generation),
+        ]),
+        'constants': constants,
+        'columns': OrderedDict([
+            (column, np.asarray(columns[key], dtype=np.float32))
+            for column, key in FULL_RESULTS_METRICS.items()
+        ]),
+    }
+
+
+class FullResultsDataset(object):
+    """
+    Full per receiver results, written as a Parquet dataset partitioned
+    by environment and generation.
+
+    Parts are written to `environment=<value>/generation=<value>/`
+    folders, so the partition values are only held in the folder names
+    and can be read back with e.g. `pandas.read_parquet(directory,
+    columns=[...])`. Each carrier and site radius is one row group, in
+    which the `FULL_RESULTS_CONSTANTS` are dictionary encoded with a
+    single value, and metrics are float32.
+
+    Tables are buffered and each `flush` writes complete part files,
+    via a temporary file and a rename.
+
+    Parameters
+    ----------
+    directory : string
+        Folder of the dataset.
+    rows_per_file : int
+        Buffered receivers that trigger a flush when a table is added.
+
+    """
+    def __init__(self, directory, rows_per_file=1000000):
+
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(
+                'Writing full results as parquet requires pyarrow')
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.buffers = OrderedDict()
+        self.buffered_rows = 0
+
+
+    def append(self, table):
+        """
+        Add a table produced by `format_full_results_table`, flushing
+        all buffers once `rows_per_file` receivers are held.
+
+        """
+        key = tuple(table['partition'].items())
+        self.buffers.setdefault(key, []).append(table)
+        self.buffered_rows += len(table['columns']['receiver_x'])
+
+        if self.buffered_rows >= self.rows_per_file:
+            self.flush()
+
+
+    def to_arrow(self, table):
+        """
+        Convert a table to a pyarrow table.
+
+        """
+        pa = self.pa
+        length = len(table['columns']['receiver_x'])
+        indices = pa.array(np.zeros(length, dtype=np.int8))
+
+        arrays = []
+        names = []
+
+        for name, value in table['constants'].items():
+            arrays.append(pa.DictionaryArray.from_arrays(indices,
+                pa.array([value])))
+            names.append(name)
+
+        for name, values in table['columns'].items():
+            arrays.append(pa.array(values))
+            names.append(name)
+
+        return pa.Table.from_arrays(arrays, names=names)
+
+
+    def flush(self):
+        """
+        Write each buffered partition to a new part file.
+
+        """
+        for partition, tables in self.buffers.items():
+
+            directory = os.path.join(self.directory, *[
+                '{}={}'.format(key, value) for key, value in partition
+            ])
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+            part = len([
+                name for name in os.listdir(directory)
+                if name.endswith('.parquet')
+            ])
+            path = os.path.join(directory, 'part-{:05d}.parquet'.format(part))
+
+            arrow_tables = [self.to_arrow(table) for table in tables]
+            schema = arrow_tables[0].schema
+
+            writer = self.pq.ParquetWriter(path + '.tmp', schema)
+            for arrow_table in arrow_tables:
+                writer.write_table(arrow_table.cast(schema))
+            writer.close()
+
+            os.replace(path + '.tmp', path)
+
+        self.buffers = OrderedDict()
+        self.buffered_rows = 0
+
+
+    def close(self):
+        """
+        Write any buffered tables.
+
+        """
+        self.flush()
+
+
+def format_lookup_table_rows(results, environment, site_radius,
+    frequency, bandwidth, generation, ant_type, tranmission_type,
+    parameters, samples=None):
+    """
+    Format percentile results as rows of the main lookup table.
+
+    Parameters
+    ----------
+    results : list of dicts
+        Contains the confidence interval values for each metric.
+    environment : string
+        Either urban, suburban or rural clutter type.
+    site_radius : int
+        Radius of site area in meters.
+    frequency : float
+        Spectral frequency of carrier band in GHz.
+    bandwidth : int
+        Channel bandwidth of carrier band in MHz.
+    generation : string
+        Either 4G or 5G depending on technology generation.
+    ant_type : string
+        Type of transmitters modelled.
+    tranmission_type : string
+        The transmission type (SISO, MIMO etc.).
+    parameters : dict
+        Contains all necessary simulation parameters.
+    samples : int
+        Number of receivers evaluated to obtain the results.
+
+    Output
+    ------
+    rows : list of dicts
+        Contains one dict per confidence interval, keyed by `LUT_FIELDS`.
+
+    """
+    inter_site_distance = site_radius * 2
+    site_area_km2 = math.sqrt(3) / 2 * inter_site_distance ** 2 / 1e6
+    sites_per_km2 = 1 / site_area_km2
+
+    sectors = parameters['sectorization']
+
+    rows = []
+
+    for result in results:
+        rows.append({
+            'confidence_interval': result['confidence_interval'],
+            'environment': environment,
+            'inter_site_distance_m': inter_site_distance,
+            'site_area_km2': site_area_km2,
+            'sites_per_km2': sites_per_km2,
+            'frequency_GHz': frequency,
+            'bandwidth_MHz': bandwidth,
+            'number_of_sectors': sectors,
+            'generation': generation,
+            'ant_type': ant_type,
+            'transmission_type': tranmission_type,
+            'path_loss_dB': result['path_loss'],
+            'received_power_dBm': result['received_power'],
+            'interference_dBm': result['interference'],
+            'noise_dB': result['noise'],
+            'sinr_dB': result['sinr'],
+            'spectral_efficiency_bps_hz': result['spectral_efficiency'],
+            'capacity_mbps': result['capacity_mbps'],
+            'capacity_mbps_km2': result['capacity_mbps_km2'] * sectors,
+            'samples': samples,
+        })
+
+    return rows
+
+
+def write_lookup_table_rows(rows, directory, filename):
+    """
+    Append rows to the main lookup table, writing the header if the
+    file does not yet exist.
+
+    Parameters
+    ----------
+    rows : list of dicts
+        Lookup table rows keyed by `LUT_FIELDS`.
+    directory : string
+        Folder the data will be written to.
+    filename : string
+        Name of the .csv file.
+
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    path = os.path.join(directory, filename)
+
+    if not os.path.exists(path):
+        lut_file = open(path, 'w', newline='')
+        lut_writer = csv.writer(lut_file)
+        lut_writer.writerow(LUT_FIELDS)
+    else:
+        lut_file = open(path, 'a', newline='')
+        lut_writer = csv.writer(lut_file)
+
+    for row in rows:
+        lut_writer.writerow([row[field] for field in LUT_FIELDS])
+
+    lut_file.close()
+
+
+def write_frequency_lookup_table(results, environment, site_radius,
+    frequency, bandwidth, generation, ant_type, tranmission_type,
+    directory, filename, parameters):
+    """
+    Write the main, comprehensive lookup table for all environments,
+    site radii, frequencies etc.
+
+    Parameters
+    ----------
+    results : list of dicts
+        Contains all results ready to be written.
+    environment : string
+        Either urban, suburban or rural clutter type.
+    site_radius : int
+        Radius of site area in meters.
+    frequency : float
+        Spectral frequency of carrier band in GHz.
+    bandwidth : int
+        Channel bandwidth of carrier band in MHz.
+    generation : string
+        Either 4G or 5G depending on technology generation.
+    ant_type : string
+        Type of transmitters modelled.
+    tranmission_type : string
+        The transmission type (SISO, MIMO etc.).
+    directory : string
+        Folder the data will be written to.
+    filename : string
+        Name of the .csv file.
+    parameters : dict
+        Contains all necessary simulation parameters.
+
+    """
+    rows = format_lookup_table_rows(results, environment, site_radius,
+        frequency, bandwidth, generation, ant_type, tranmission_type,
+        parameters)
+
+    write_lookup_table_rows(rows, directory, filename)
+
+
+def generate_site_template(parameters, grid=1):
+    """
+    Generate the site layout and receivers for a unit site radius, with
+    `interference_rings` rings of interfering sites (one by default).
+
+    The hex layout is self-similar, so the transmitter, interferer and
+    receiver positions for any site radius are this template multiplied
+    by the radius (see `scale_site_template`).
+
+    Parameters
+    ----------
+    parameters : dict
+        Contains all necessary simulation parameters.
+    grid : int
+        Binary indicator to dictate receiver generation type.
+
+    Output
+    ------
+    template : dict
+        Contains the unit `interferers` coordinates, the unit
+        `site_area` polygon and the unit `receivers` (ReceiverSet).
+
+    """
+    transmitter, interfering_transmitters, site_area, int_site_areas = \
+        produce_unit_sites_and_site_areas(1,
+            parameters.get('interference_rings', 1))
+
+    if grid == 1:
+        receivers = generate_receiver_grid(site_area, parameters)
+    else:
+        receivers = ReceiverSet.from_geojson(
+            generate_receivers(site_area, parameters, grid))
+
+    return {
+        'interferers': np.array([
+            site['geometry']['coordinates']
+            for site in interfering_transmitters
+        ], dtype=float),
+        'site_area': np.array(
+            site_area[0]['geometry']['coordinates'][0], dtype=float
+        ),
+        'receivers': receivers,
+    }
+
+
+def scale_site_template(template, site_radius, ant_type, parameters):
+    """
+    Scale the unit site template to a site radius.
+
+    Parameters
+    ----------
+    template : dict
+        Unit site template from `generate_site_template`.
+    site_radius : int
+        Radius of site area in meters.
+    ant_type : string
+        Type of transmitters modelled.
+    parameters : dict
+        Contains all necessary simulation parameters.
+
+    Output
+    ------
+    transmitter : TransmitterSet
+        The transmitter at the origin.
+    interfering_transmitters : TransmitterSet
+        The interfering transmitters.
+    receivers : ReceiverSet
+        The receivers within the site area.
+    site_area : List of dicts
+        Contains a geojson dict for the transmitter site area.
+
+    """
+    unit_receivers = template['receivers']
+
+    transmitter = TransmitterSet([[0, 0]], ant_type, parameters,
+        ids=['transmitter'])
+
+    interfering_transmitters = TransmitterSet(
+        template['interferers'] * site_radius, ant_type, parameters)
+
+    receivers = ReceiverSet(
+        unit_receivers.coordinates * site_radius,
+        unit_receivers.ue_height,
+        unit_receivers.gain,
+        unit_receivers.losses,
+        unit_receivers.misc_losses,
+        unit_receivers.indoor,
+    )
+
+    site_area = [{
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [
+                [tuple(point) for point in
+                    (template['site_area'] * site_radius).tolist()]
+            ],
+        },
+        'properties': {
+            'site_id': 'transmitter'
+        }
+    }]
+
+    return transmitter, interfering_transmitters, receivers, site_area
+
+
+def run_radius_sweep(site_radii, environment, ant_type, carriers,
+    modulation_and_coding_lut, parameters, confidence_intervals,
+    template=None, full_results_directory=None, monte_carlo=False,
+    sampling='grid', full_results_tables=None, symmetric=True):
+    """
+    Produce lookup table rows for many site radii from one unit
+    site template.
+
+    Monte Carlo results and full per-receiver results are only produced
+    by grid sampling; asking for them with another sampling method
+    raises a ValueError.
+
+    Parameters
+    ----------
+    site_radii : list
+        Radii of site areas in meters.
+    environment : string
+        Either urban, suburban or rural clutter type.
+    ant_type : string
+        Type of transmitters modelled.
+    carriers : list of tuples
+        Frequency (GHz), bandwidth (MHz), generation and transmission
+        type of each carrier.
+    modulation_and_coding_lut : dict
+        A lookup table containing modulation and coding rates,
+        spectral efficiencies and SINR estimates, or the output of
+        `compile_spectral_efficiency_lookups`.
+    parameters : dict
+        Contains all necessary simulation parameters.
+    confidence_intervals: list
+        Integer confidence interval values.
+    template : dict
+        Unit site template. Generated with `generate_site_template`
+        if not given.
+    full_results_directory : string
+        If given, full per-receiver results of the grid sampling are
+        written to this folder.
+    monte_carlo : bool
+        If True, results are averaged over `iterations` of shadow fading
+        (see `SimulationManager.estimate_link_budget_monte_carlo`).
+    sampling : string
+        Either `grid`, for the receivers of the site template, `adaptive`
+        (see `run_adaptive_sampling`), or `sobol` or `halton` (see
+        `run_quasi_random_sampling`).
+    full_results_tables : list
+        If given, full per-receiver results of the grid sampling are
+        added to this list as tables for `FullResultsDataset`.
+    symmetric : bool
+        With `adaptive`, `sobol` or `halton` sampling, sample only the
+        symmetry domain of the site area (see `run_adaptive_sampling`).
+
+    Output
+    ------
+    rows : list of dicts
+        Lookup table rows for every radius, carrier and confidence
+        interval, keyed by `LUT_FIELDS`.
+
+    """
+    if sampling not in ('grid', 'adaptive', 'sobol', 'halton'):
+        raise ValueError('Did not recognise sampling method: {}'.format(
+            sampling))
+
+    if sampling != 'grid':
+        if monte_carlo:
+            raise ValueError(
+                'Monte Carlo results require grid sampling, not {}'.format(
+                sampling))
+        if full_results_directory is not None or \
+            full_results_tables is not None:
+            raise ValueError(
+                'Full results require grid sampling, not {}'.format(
+                sampling))
+
+    if template is None:
+        template = generate_site_template(parameters)
+
+    rows = []
+
+    for site_radius in site_radii:
+
+        transmitter, interfering_transmitters, receivers, site_area = \
+            scale_site_template(template, site_radius, ant_type, parameters)
+
+        #(carrier index, percentile results, receivers evaluated)
+        percentile_rows = []
+
+        if sampling == 'adaptive':
+
+            #each confidence interval has its own adaptive sample
+            for confidence_interval in confidence_intervals:
+                all_results, weights, evaluations = run_adaptive_sampling(
+                    transmitter, interfering_transmitters, ant_type,
+                    site_area, carriers, environment,
+                    modulation_and_coding_lut, parameters,
+                    confidence_interval, symmetric=symmetric
+                    )
+                for idx, carrier in enumerate(carriers):
+                    percentile_rows.append((idx, obtain_percentile_values(
+                        select_carrier(all_results, idx), carrier[3],
+                        parameters, [confidence_interval], weights=weights
+                        ), evaluations))
+
+        elif sampling in ('sobol', 'halton'):
+
+            percentile_results, samples = run_quasi_random_sampling(
+                transmitter, interfering_transmitters, ant_type,
+                site_area, carriers, environment, modulation_and_coding_lut,
+                parameters, confidence_intervals, method=sampling,
+                symmetric=symmetric
+                )
+            for idx, percentile_site_results in enumerate(percentile_results):
+                percentile_rows.append((idx, percentile_site_results, samples))
+
+        else:
+
+            manager = SimulationManager(
+                transmitter, interfering_transmitters, ant_type,
+                receivers, site_area, parameters
+                )
+
+            if monte_carlo:
+                estimate_link_budget = manager.estimate_link_budget_monte_carlo
+            else:
+                estimate_link_budget = manager.estimate_link_budget_carriers
+
+            all_results = estimate_link_budget(
+                carriers,
+                ant_type,
+                environment,
+                modulation_and_coding_lut,
+                parameters
+                )
+
+            for idx, carrier in enumerate(carriers):
+
+                frequency, bandwidth, generation, transmission_type = carrier
+
+                results = select_carrier(all_results, idx)
+
+                if full_results_directory is not None:
+                    filename = 'full_capacity_lut_{}_{}_{}_{}_{}_{}.csv'.format(
+                        environment, site_radius, generation, frequency,
+                        ant_type, transmission_type)
+                    write_full_results(results, environment, site_radius,
+                        frequency, bandwidth, generation, ant_type,
+                        transmission_type, full_results_directory, filename,
+                        parameters)
+
+                if full_results_tables is not None:
+                    full_results_tables.append(format_full_results_table(
+                        results, environment, site_radius, frequency,
+                        bandwidth, generation, ant_type, transmission_type,
+                        parameters))
+
+                percentile_rows.append((idx, obtain_percentile_values(
+                    results, transmission_type, parameters,
+                    confidence_intervals), len(receivers)))
+
+        for idx, percentile_site_results, samples in percentile_rows:
+
+            frequency, bandwidth, generation, transmission_type = carriers[idx]
+
+            rows += format_lookup_table_rows(percentile_site_results,
+                environment, site_radius, frequency, bandwidth, generation,
+                ant_type, transmission_type, parameters, samples)
+
+    return rows
+
+
+LUT_KEY_FIELDS = [
+    'environment',
+    'ant_type',
+    'inter_site_distance_m',
+    'frequency_GHz',
+    'bandwidth_MHz',
+    'generation',
+    'transmission_type',
+    'confidence_interval',
+]
+
+#state shared by every task of a worker process, see `initialize_sweep_worker`
+SWEEP_WORKER_STATE = {}
+
+
+def generate_sweep_tasks(site_radii, ant_types, carriers):
+    """
+    Split a sweep into independent (environment, ant_type, site_radius,
+    carrier) tasks.
+
+    Parameters
+    ----------
+    site_radii : dict
+        Radii of site areas in meters, keyed by environment.
+    ant_types : list
+        Types of transmitters modelled.
+    carriers : list of tuples
+        Frequency (GHz), bandwidth (MHz), generation and transmission
+        type of each carrier.
+
+    Output
+    ------
+    tasks : list of tuples
+        One (environment, ant_type, site_radius, carrier) tuple per task.
+
+    """
+    tasks = []
+
+    for environment, radii in site_radii.items():
+        for ant_type in ant_types:
+            for site_radius in radii:
+                for carrier in carriers:
+                    tasks.append((environment, ant_type, site_radius,
+                        tuple(carrier)))
+
+    return tasks
+
+
+def generate_task_seed(task, parameters):
+    """
+    Derive a deterministic random seed for a sweep task.
+
+    The seed depends only on `seed_value` and the task itself, so results
+    do not depend on the number of workers or the order tasks are run in.
+
+    Parameters
+    ----------
+    task : tuple
+        An (environment, ant_type, site_radius, carrier) task.
+    parameters : dict
+        Contains all necessary simulation parameters.
+
+    Output
+    ------
+    seed : int
+        Seed for the global numpy random state.
+
+    """
+    key = zlib.crc32(repr(task).encode('utf-8'))
+
+    return int(np.random.SeedSequence(
+        [parameters['seed_value'], key]).generate_state(1)[0])
+
+
+def initialize_sweep_worker(template, modulation_and_coding_lut, parameters,
+    confidence_intervals, full_results_directory, monte_carlo, sampling,
+    full_results_tables=False, instrumentation_directory=None):
+    """
+    Store the inputs shared by all sweep tasks in the worker process.
+
+    """
+    SWEEP_WORKER_STATE.update({
+        'template': template,
+        'modulation_and_coding_lut': modulation_and_coding_lut,
+        'parameters': parameters,
+        'confidence_intervals': confidence_intervals,
+        'full_results_directory': full_results_directory,
+        'monte_carlo': monte_carlo,
+        'sampling': sampling,
+        'full_results_tables': full_results_tables,
+        'instrumentation_directory': instrumentation_directory,
+    })
+
+
+def run_sweep_task(task):
+    """
+    Produce the lookup table rows of a single sweep task, using the
+    state stored by `initialize_sweep_worker`.
+
+    Parameters
+    ----------
+    task : tuple
+        An (environment, ant_type, site_radius, carrier) task.
+
+    Output
+    ------
+    rows : list of dicts
+        Lookup table rows for each confidence interval, keyed by
+        `LUT_FIELDS`.
+    tables : list of dicts
+        Full results tables (see `format_full_results_table`), if
+        requested when the worker was initialized.
+
+    """
+    environment, ant_type, site_radius, carrier = task
+    state = SWEEP_WORKER_STATE
+
+    np.random.seed(generate_task_seed(task, state['parameters']))
+
+    instrumentation = get_instrumentation()
+    if instrumentation is not None:
+        instrumentation.reset()
+
+    tables = [] if state['full_results_tables'] else None
+
+    rows = run_radius_sweep(
+        [site_radius],
+        environment,
+        ant_type,
+        [carrier],
+        state['modulation_and_coding_lut'],
+        state['parameters'],
+        state['confidence_intervals'],
+        template=state['template'],
+        full_results_directory=state['full_results_directory'],
+        monte_carlo=state['monte_carlo'],
+        sampling=state['sampling'],
+        full_results_tables=tables,
+        )
+
+    if instrumentation is not None and \
+        state['instrumentation_directory'] is not None:
+        frequency, bandwidth, generation, transmission_type = carrier
+        filename = 'instrumentation_{}_{}_{}_{}_{}_{}.json'.format(
+            environment, site_radius, generation, frequency, ant_type,
+            transmission_type)
+        instrumentation.write_json(
+            os.path.join(state['instrumentation_directory'], filename),
+            environment=environment, ant_type=ant_type,
+            site_radius=site_radius, carrier=list(carrier),
+            sampling=state['sampling'], monte_carlo=state['monte_carlo'])
+
+    return rows, tables or []
+
+
+def run_parallel_sweep(tasks, modulation_and_coding_lut, parameters,
+    confidence_intervals, template=None, workers=None,
+    full_results_directory=None, monte_carlo=False, sampling='grid',
+    checkpoint=None, full_results_dataset=None,
+    instrumentation_directory=None):
+    """
+    Run sweep tasks on a pool of worker processes.
+
+    Each task is seeded with `generate_task_seed`, so the rows are the
+    same for any number of workers. With `workers=1` tasks are run in
+    this process.
+
+    Parameters
+    ----------
+    tasks : list of tuples
+        Tasks produced by `generate_sweep_tasks`.
+    modulation_and_coding_lut : dict
+        A lookup table containing modulation and coding rates,
+        spectral efficiencies and SINR estimates, or the output of
+        `compile_spectral_efficiency_lookups`.
+    parameters : dict
+        Contains all necessary simulation parameters.
+    confidence_intervals: list
+        Integer confidence interval values.
+    template : dict
+        Unit site template. Generated with `generate_site_template`
+        if not given.
+    workers : int
+        Number of worker processes, all available cpus if not given.
+    full_results_directory : string
+        If given, full per-receiver results of the grid sampling are
+        written to this folder.
+    monte_carlo : bool
+        If True, results are averaged over shadow fading iterations.
+    sampling : string
+        Receiver sampling method (see `run_radius_sweep`).
+    checkpoint : function
+        If given, called with the rows of completed tasks, e.g. to save
+        them with a `SweepManifest`. With a `full_results_dataset`, rows
+        are passed on once the dataset has written their full results.
+    full_results_dataset : FullResultsDataset
+        If given, full per-receiver results of the grid sampling are
+        added to this dataset, which is flushed at the end.
+    instrumentation_directory : string
+        If given and instrumentation is enabled (see
+        `enable_instrumentation`), a .json summary of stage timings is
+        written to this folder for each task.
+
+    Output
+    ------
+    rows : list of dicts
+        Sorted and deduplicated lookup table rows of all tasks (see
+        `merge_lookup_table_rows`).
+
+    """
+    if template is None:
+        template = generate_site_template(parameters)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    initargs = (template, modulation_and_coding_lut, parameters,
+        confidence_intervals, full_results_directory, monte_carlo, sampling,
+        full_results_dataset is not None, instrumentation_directory)
+
+    rows = []
+    pending = []
+
+    def collect(task_rows, tables):
+        rows.extend(task_rows)
+        pending.extend(task_rows)
+        if full_results_dataset is not None:
+            for table in tables:
+                full_results_dataset.append(table)
+            if full_results_dataset.buffered_rows > 0:
+                return
+        if checkpoint is not None:
+            checkpoint(list(pending))
+        del pending[:]
+
+    if workers == 1 or len(tasks) <= 1:
+        initialize_sweep_worker(*initargs)
+        for task in tasks:
+            collect(*run_sweep_task(task))
+    else:
+        chunksize = max(1, len(tasks) // (workers * 4))
+
+        with ProcessPoolExecutor(max_workers=workers,
+            initializer=initialize_sweep_worker,
+            initargs=initargs) as executor:
+            for task_rows, tables in executor.map(run_sweep_task, tasks,
+                chunksize=chunksize):
+                collect(task_rows, tables)
+
+    if full_results_dataset is not None:
+        full_results_dataset.flush()
+    if checkpoint is not None and pending:
+        checkpoint(pending)
+
+    return merge_lookup_table_rows(rows)
+
+
+def simulate_capacity_points(site_radii, ant_type, carrier,
+    confidence_interval, modulation_and_coding_lut, parameters,
+    template=None, monte_carlo=False, sampling='grid'):
+    """
+    Produce the lookup table rows of one carrier and confidence
+    interval, for use as the `simulate` function of a `CapacityOracle`
+    (bind the remaining arguments with `functools.partial`).
+
+    Each site radius is seeded as the matching sweep task (see
+    `generate_task_seed`), so rows match those of a full sweep.
+
+    Parameters
+    ----------
+    site_radii : dict
+        Radii of site areas in meters, keyed by environment.
+    ant_type : string
+        Type of transmitters modelled.
+    carrier : tuple
+        Frequency (GHz), bandwidth (MHz), generation and transmission
+        type of the carrier.
+    confidence_interval : int
+        Confidence interval value.
+    modulation_and_coding_lut : dict
+        A lookup table containing modulation and coding rates,
+        spectral efficiencies and SINR estimates, or the output of
+        `compile_spectral_efficiency_lookups`.
+    parameters : dict
+        Contains all necessary simulation parameters.
+    template : dict
+        Unit site template. Generated with `generate_site_template`
+        if not given.
+    monte_carlo : bool
+        If True, results are averaged over shadow fading iterations.
+    sampling : string
+        Receiver sampling method (see `run_radius_sweep`).
+
+    Output
+    ------
+    rows : list of dicts
+        Lookup table rows keyed by `LUT_FIELDS`.
+
+    """
+    if template is None:
+        template = generate_site_template(parameters)
+
+    rows = []
+
+    for environment, radii in site_radii.items():
+        for site_radius in radii:
+
+            task = (environment, ant_type, site_radius, tuple(carrier))
+            np.random.seed(generate_task_seed(task, parameters))
+
+            rows += run_radius_sweep(
+                [site_radius],
+                environment,
+                ant_type,
+                [carrier],
+                modulation_and_coding_lut,
+                parameters,
+                [confidence_interval],
+                template=template,
+                monte_carlo=monte_carlo,
+                sampling=sampling,
+                )
+
+    return rows
+
+
+def lookup_table_key(row):
+    """
+    Return the sort and deduplication key of a lookup table row.
+
+    Numeric fields are converted, so rows read back from the .csv file
+    match freshly computed rows.
+
+    """
+    return (
+        str(row['environment']),
+        str(row['ant_type']),
+        float(row['inter_site_distance_m']),
+        float(row['frequency_GHz']),
+        float(row['bandwidth_MHz']),
+        str(row['generation']),
+        str(row['transmission_type']),
+        float(row['confidence_interval']),
+    )
+
+
+def merge_lookup_table_rows(*row_lists):
+    """
+    Merge lookup table rows, sorted by `LUT_KEY_FIELDS`.
+
+    Where rows share a key the last one is kept, so later results
+    replace earlier ones.
+
+    Parameters
+    ----------
+    row_lists : lists of dicts
+        Lookup table rows keyed by `LUT_FIELDS`.
+
+    Output
+    ------
+    rows : list of dicts
+        Sorted rows with one row per key.
+
+    """
+    merged = {}
+
+    for rows in row_lists:
+        for row in rows:
+            merged[lookup_table_key(row)] = row
+
+    return [merged[key] for key in sorted(merged)]
+
+
+def write_merged_lookup_table(rows, directory, filename):
+    """
+    Merge rows into the main lookup table, rewriting it sorted and
+    without duplicate keys.
 
+    Parameters
+    ----------
+    rows : list of dicts
+        Lookup table rows keyed by `LUT_FIELDS`.
+    directory : string
+        Folder the data will be written to.
+    filename : string
+        Name of the .csv file.
 
-def obtain_percentile_values(results, transmission_type, parameters, confidence_intervals):
     """
+    with LookupTableSink(directory, filename) as sink:
+        sink.write(rows)
 
-    Get the threshold value for a metric based on a given percentiles.
+
+def hash_parameters(*settings):
+    """
+    Return a short hash of the settings that determine lookup table
+    values, such as `PARAMETERS` and the modulation and coding table.
 
     Parameters
     ----------
-    results : list of dicts
-        All data returned from the system simulation.
-    tranmission_type : string
-        The transmission type (SISO, MIMO etc.).
-    parameters : dict
-        Contains all necessary simulation parameters.
-    confidence_intervals: list
-        Integer confidence interval values. 
+    settings : json serializable objects
+        Settings to hash, in a fixed order.
 
     Output
     ------
-    percentile_site_results : list of dicts
-        Contains the confidence interval values for each metric.
+    parameters_hash : string
+        Hexadecimal sha256 digest of the settings.
 
     """
-    output = []
+    encoded = json.dumps(settings, sort_keys=True, default=str)
 
-    path_loss_values = []
-    received_power_values = []
-    interference_values = []
-    noise_values = []
-    sinr_values = []
-    spectral_efficiency_values = []
-    estimated_capacity_values = []
-    estimated_capacity_values_km2 = []
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
 
-    for result in results:
 
-        path_loss_values.append(result['path_loss'])
+class SweepManifest(object):
+    """
+    Record of the lookup table keys completed by a sweep, so a sweep
+    that stops part way can be resumed.
 
-        received_power_values.append(result['received_power'])
+    The manifest is a json lines file. The first line holds the hash of
+    the parameters the rows were produced with, and each further line
+    one completed key (see `lookup_table_key`). Lines are only ever
+    appended, so a partly written last line is simply ignored. Keys hold
+    every field of the carrier, so carriers or confidence intervals added
+    to a sweep are run without discarding completed rows.
 
-        interference_values.append(result['interference'])
+    Parameters
+    ----------
+    path : string
+        Path of the manifest file.
+    parameters_hash : string
+        Hash of the current parameters (see `hash_parameters`).
 
-        noise_values.append(result['noise'])
+    """
+    def __init__(self, path, parameters_hash):
 
-        sinr_values.append(result['sinr'])
-        # print(sinr_values)
-        # if sinr == None:
-        #     sinr = 0
-        # else:
-        #     sinr_values.append(sinr)
+        self.path = path
+        self.parameters_hash = parameters_hash
+        self.completed = set()
+        self.stale = False
 
-        spectral_efficiency = result['spectral_efficiency']
-        if spectral_efficiency == None:
-            spectral_efficiency = 0
+        if os.path.exists(self.path):
+            self.load()
         else:
-            spectral_efficiency_values.append(spectral_efficiency)
+            self.stale = True
 
-        estimated_capacity = result['capacity_mbps']
-        if estimated_capacity == None:
-            estimated_capacity = 0
-        else:
-            estimated_capacity_values.append(estimated_capacity)
 
-        estimated_capacity_km2 = result['capacity_mbps_km2']
-        if estimated_capacity_km2 == None:
-            estimated_capacity_km2 = 0
-        else:
-            estimated_capacity_values_km2.append(estimated_capacity_km2)
+    def load(self):
+        """
+        Read the completed keys, marking the manifest stale if it was
+        written with different parameters.
 
-    for confidence_interval in confidence_intervals:
-        # print(confidence_interval, 100-confidence_interval)
-        # print(np.percentile(
-        #         sinr_values, 100-confidence_interval, method='closest_observation'
-        #     ))
-        output.append({
-            'confidence_interval': confidence_interval,
-            'tranmission_type': transmission_type,
-            'path_loss': np.percentile(
-                path_loss_values, confidence_interval, method='closest_observation' #<- low path loss is better
-            ),
-            'received_power': np.percentile(
-                received_power_values, 100 - confidence_interval, method='closest_observation'
-            ),
-            'interference': np.percentile(
-                interference_values, confidence_interval, method='closest_observation' #<- low interference is better
-            ),
-            'noise': np.percentile(
-                noise_values, confidence_interval, method='closest_observation' #<- low interference is better
-            ),
-            'sinr': np.percentile(
-                sinr_values, 100 - confidence_interval, method='closest_observation'
-            ),
-            'spectral_efficiency': np.percentile(
-                spectral_efficiency_values, 100 - confidence_interval, method='closest_observation'
-            ),
-            'capacity_mbps': np.percentile(
-                estimated_capacity_values, 100 - confidence_interval, method='closest_observation'
-            ),
-            'capacity_mbps_km2': np.percentile(
-                estimated_capacity_values_km2, 100 - confidence_interval, method='closest_observation'
-            )
-        })
+        """
+        with open(self.path, 'r') as manifest_file:
+            lines = manifest_file.read().splitlines()
 
-    return output
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            header = {}
 
+        if header.get('parameters_hash') != self.parameters_hash:
+            self.stale = True
+            return
 
-# def obtain_threshold_values_choice(results, parameters):
-#     """
+        for line in lines[1:]:
+            try:
+                self.completed.add(tuple(json.loads(line)))
+            except ValueError:
+                continue
 
-#     Get the threshold capacity based on a given percentile.
 
-#     Parameters
-#     ----------
-#     results : list of dicts
-#         All data returned from the system simulation.
-#     parameters : dict
-#         Contains all necessary simulation parameters.
+    def reset(self):
+        """
+        Start a new manifest for the current parameters.
 
-#     Output
-#     ------
-#     matching_result : float
-#         Contains the chosen percentile value based on the input data.
+        """
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
 
-#     """
-#     sinr_values = []
+        with open(self.path, 'w') as manifest_file:
+            manifest_file.write(json.dumps(
+                {'parameters_hash': self.parameters_hash}) + '\n')
 
-#     percentile = parameters['percentile']
+        self.completed = set()
+        self.stale = False
 
-#     for result in results:
 
-#         sinr = result['sinr']
+    def task_keys(self, task, confidence_intervals):
+        """
+        Return the lookup table keys produced by a sweep task.
 
-#         if sinr == None:
-#             pass
-#         else:
-#             sinr_values.append(sinr)
+        """
+        environment, ant_type, site_radius, carrier = task
+        frequency, bandwidth, generation, transmission_type = carrier
 
-#     sinr = np.percentile(sinr_values, percentile, interpolation='nearest')
+        return [
+            lookup_table_key({
+                'environment': environment,
+                'ant_type': ant_type,
+                'inter_site_distance_m': site_radius * 2,
+                'frequency_GHz': frequency,
+                'bandwidth_MHz': bandwidth,
+                'generation': generation,
+                'transmission_type': transmission_type,
+                'confidence_interval': confidence_interval,
+            })
+            for confidence_interval in confidence_intervals
+        ]
 
-#     matching_result = []
 
-#     for result in results:
-#         if float(result['sinr']) == float(sinr):
-#             matching_result.append(result)
+    def is_complete(self, task, confidence_intervals):
+        """
+        Return True if all rows of a sweep task have been recorded.
 
-#     return float(choice(matching_result))
+        """
+        return all(key in self.completed
+            for key in self.task_keys(task, confidence_intervals))
 
 
-def convert_results_geojson(data):
+    def record(self, rows):
+        """
+        Append the keys of written lookup table rows to the manifest.
+
+        """
+        keys = [lookup_table_key(row) for row in rows]
+
+        with open(self.path, 'a') as manifest_file:
+            for key in keys:
+                manifest_file.write(json.dumps(key) + '\n')
+
+        self.completed.update(keys)
+
+
+def open_sweep_manifest(directory, filename, parameters_hash,
+    dataset_directory=None):
     """
-    Convert results to geojson format, for writing to shapefile.
+    Open the manifest of a lookup table, removing the table if its rows
+    were produced with other parameters, or without a manifest.
 
     Parameters
     ----------
-    data : list of dicts
-        Contains all results ready to be written.
+    directory : string
+        Folder of the lookup table.
+    filename : string
+        Name of the lookup table .csv file. The manifest is written
+        alongside as `<name>_manifest.jsonl`.
+    parameters_hash : string
+        Hash of the current parameters (see `hash_parameters`).
+    dataset_directory : string
+        Folder of a `FullResultsDataset` written alongside the table,
+        removed with the table rows as parts are only ever added.
 
-    Outputs
-    -------
-    output : list of dicts
-        A list of geojson dictionaries ready for writing.
+    Output
+    ------
+    manifest : SweepManifest
+        Manifest holding the keys already completed.
 
     """
-    output = []
+    path = os.path.join(directory,
+        '{}_manifest.jsonl'.format(os.path.splitext(filename)[0]))
 
-    for datum in data:
-        output.append({
-            'type': 'Feature',
-            'geometry': {
-                'type': 'Point',
-                'coordinates': [
-                    datum['receiver_x'], datum['receiver_y']]
-                },
-            'properties': {
-                'path_loss': float(datum['path_loss']),
-                'received_power': float(datum['received_power']),
-                'interference': float(datum['interference']),
-                'noise': float(datum['noise']),
-                'sinr': float(datum['sinr']),
-                'spectral_efficiency': float(
-                    datum['spectral_efficiency']
-                ),
-                'capacity_mbps': float(
-                    datum['capacity_mbps']
-                ),
-                'capacity_mbps_km2': float(
-                    datum['capacity_mbps_km2']
-                ),
-                },
-            }
-        )
+    manifest = SweepManifest(path, parameters_hash)
 
-    return output
+    if manifest.stale:
+        lut_path = os.path.join(directory, filename)
+        if os.path.exists(lut_path):
+            print('Removing stale lookup table rows: {}'.format(lut_path))
+            os.remove(lut_path)
+        if dataset_directory is not None and os.path.exists(dataset_directory):
+            print('Removing stale full results: {}'.format(dataset_directory))
+            shutil.rmtree(dataset_directory)
+        manifest.reset()
 
+    return manifest
 
-def write_full_results(data, environment, site_radius, frequency,
-    bandwidth, generation, ant_type, transmittion_type, directory,
-    filename, parameters):
+
+class LookupTableSink(object):
     """
-    Write full results data to .csv.
+    The main lookup table, opened once per sweep.
+
+    Rows already in the table are read when the sink is opened, and new
+    rows are merged with them by `lookup_table_key`, later rows
+    replacing earlier ones. Rows are buffered, and each flush rewrites
+    the sorted table to a temporary file which then replaces the table,
+    so the file on disk is always complete. As each flush rewrites the
+    whole table, rows are flushed once `buffer_rows` are held or
+    `flush_interval` seconds have passed since the last flush. Open the
+    sink in a `with` block, so buffered rows are still written if the
+    sweep stops with an error.
 
     Parameters
     ----------
-    data : list of dicts
-        Contains all results ready to be written.
-    environment : string
-        Either urban, suburban or rural clutter type.
-    site_radius : int
-        Radius of site area in meters.
-    frequency : float
-        Spectral frequency of carrier band in GHz.
-    bandwidth : int
-        Channel bandwidth of carrier band in MHz.
-    generation : string
-        Either 4G or 5G depending on technology generation.
-    ant_type : string
-        The type of transmitter modelled (macro, micro etc.).
-    tranmission_type : string
-        The type of tranmission (SISO, MIMO 4x4, MIMO 8x8 etc.).
     directory : string
         Folder the data will be written to.
     filename : string
         Name of the .csv file.
-    parameters : dict
-        Contains all necessary simulation parameters.
+    buffer_rows : int
+        Buffered rows that trigger a flush when rows are written.
+    manifest : SweepManifest
+        If given, rows are recorded in the manifest once flushed.
+    flush_interval : float
+        Seconds after the last flush at which written rows trigger a
+        flush. With 0, every write is flushed.
 
     """
-    sectors = parameters['sectorization']
-    inter_site_distance = site_radius * 2
-    site_area_km2 = (
-        math.sqrt(3) / 2 * inter_site_distance ** 2 / 1e6
-    )
-    sites_per_km2 = 1 / site_area_km2
+    def __init__(self, directory, filename, buffer_rows=1000, manifest=None,
+        flush_interval=60):
 
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+        self.directory = directory
+        self.path = os.path.join(directory, filename)
+        self.buffer_rows = buffer_rows
+        self.manifest = manifest
+        self.flush_interval = flush_interval
+        self.flushed = time.monotonic()
+        self.rows = {}
+        self.pending = []
 
-    full_path = os.path.join(directory, filename)
+        if os.path.exists(self.path):
+            with open(self.path, 'r', newline='') as lut_file:
+                for row in csv.DictReader(lut_file):
+                    row = {field: row.get(field, '') for field in LUT_FIELDS}
+                    self.rows[lookup_table_key(row)] = row
 
-    results_file = open(full_path, 'w', newline='')
-    results_writer = csv.writer(results_file)
-    results_writer.writerow(
-        (
-            'environment',
-            'inter_site_distance_m',
-            'sites_per_km2',
-            'frequency_GHz',
-            'bandwidth_MHz',
-            'number_of_sectors',
-            'generation',
-            'ant_type',
-            'transmittion_type',
-            'receiver_x',
-            'receiver_y',
-            'r_distance',
-            'path_loss_dB',
-            'r_model',
-            'received_power_dB',
-            'interference_dB',
-            'i_model',
-            'noise_dB',
-            'sinr_dB',
-            'spectral_efficiency_bps_hz',
-            'capacity_mbps',
-            'capacity_mbps_km2'
-        )
-    )
 
-    for row in data:
-        results_writer.writerow((
-            environment,
-            inter_site_distance,
-            sites_per_km2,
-            frequency,
-            bandwidth,
-            sectors,
-            generation,
-            ant_type,
-            transmittion_type,
-            row['receiver_x'],
-            row['receiver_y'],
-            row['distance'],
-            row['path_loss'],
-            row['r_model'],
-            row['received_power'],
-            row['interference'],
-            row['i_model'],
-            row['noise'],
-            row['sinr'],
-            row['spectral_efficiency'],
-            row['capacity_mbps'],
-            row['capacity_mbps_km2'],
-            ))
+    def __enter__(self):
+        return self
 
 
-def write_frequency_lookup_table(results, environment, site_radius,
-    frequency, bandwidth, generation, ant_type, tranmission_type,
-    directory, filename, parameters):
-    """
-    Write the main, comprehensive lookup table for all environments,
-    site radii, frequencies etc.
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-    Parameters
-    ----------
-    results : list of dicts
-        Contains all results ready to be written.
-    environment : string
-        Either urban, suburban or rural clutter type.
-    site_radius : int
-        Radius of site area in meters.
-    frequency : float
-        Spectral frequency of carrier band in GHz.
-    bandwidth : int
-        Channel bandwidth of carrier band in MHz.
-    generation : string
-        Either 4G or 5G depending on technology generation.
-    ant_type : string
-        Type of transmitters modelled.
-    tranmission_type : string
-        The transmission type (SISO, MIMO etc.).
-    directory : string
-        Folder the data will be written to.
-    filename : string
-        Name of the .csv file.
-    parameters : dict
-        Contains all necessary simulation parameters.
 
-    """
-    inter_site_distance = site_radius * 2
-    site_area_km2 = math.sqrt(3) / 2 * inter_site_distance ** 2 / 1e6
-    sites_per_km2 = 1 / site_area_km2
+    def write(self, rows):
+        """
+        Add lookup table rows, flushing once `buffer_rows` are held or
+        `flush_interval` seconds have passed.
 
-    sectors = parameters['sectorization']
+        """
+        for row in rows:
+            self.rows[lookup_table_key(row)] = row
+        self.pending += rows
 
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+        if len(self.pending) >= self.buffer_rows or \
+            time.monotonic() - self.flushed >= self.flush_interval:
+            self.flush()
 
-    directory = os.path.join(directory, filename)
 
-    if not os.path.exists(directory):
-        lut_file = open(directory, 'w', newline='')
-        lut_writer = csv.writer(lut_file)
-        lut_writer.writerow(
-            (
-                'confidence_interval',
-                'environment',
-                'inter_site_distance_m',
-                'site_area_km2',
-                'sites_per_km2',
-                'frequency_GHz',
-                'bandwidth_MHz',
-                'number_of_sectors',
-                'generation',
-                'ant_type',
-                'transmission_type',
-                'path_loss_dB',
-                'received_power_dBm',
-                'interference_dBm',
-                'noise_dB',
-                'sinr_dB',
-                'spectral_efficiency_bps_hz',
-                'capacity_mbps',
-                'capacity_mbps_km2',
-            )
-        )
-    else:
-        lut_file = open(directory, 'a', newline='')
-        lut_writer = csv.writer(lut_file)
+    def flush(self):
+        """
+        Rewrite the table with all rows, then record the buffered rows
+        in the manifest.
 
-    for result in results:
-        lut_writer.writerow(
-            (
-                result['confidence_interval'],
-                environment,
-                inter_site_distance,
-                site_area_km2,
-                sites_per_km2,
-                frequency,
-                bandwidth,
-                sectors,
-                generation,
-                ant_type,
-                tranmission_type,
-                result['path_loss'],
-                result['received_power'],
-                result['interference'],
-                result['noise'],
-                result['sinr'],
-                result['spectral_efficiency'],
-                result['capacity_mbps'],
-                result['capacity_mbps_km2'] * sectors,
-            )
-        )
+        """
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
 
-    lut_file.close()
+        temp_path = self.path + '.tmp'
+
+        with open(temp_path, 'w', newline='') as lut_file:
+            lut_writer = csv.writer(lut_file)
+            lut_writer.writerow(LUT_FIELDS)
+            for key in sorted(self.rows):
+                row = self.rows[key]
+                lut_writer.writerow([row[field] for field in LUT_FIELDS])
+            lut_file.flush()
+            os.fsync(lut_file.fileno())
+
+        os.replace(temp_path, self.path)
+
+        if self.manifest is not None:
+            self.manifest.record(self.pending)
+        self.pending = []
+        self.flushed = time.monotonic()
+
+
+    def close(self):
+        """
+        Write any buffered rows.
+
+        """
+        self.flush()
+
+
+    def capacity_lut(self):
+        """
+        Return the rows indexed for `lookup_capacity`, as produced by
+        reading the table with `read_capacity_lut` in run.py.
+
+        """
+        return index_capacity_lut(
+            self.rows[key] for key in sorted(self.rows))
 
 
 if __name__ == '__main__':
@@ -554,8 +2579,22 @@ if __name__ == '__main__':
         'network_load': 100,
         'sectorization': 3,
         'iterations': 100,
+        'interference_rings': 1,
+        'interference_max_sites': 3,
+        'interference_pruning_dB': None,
+        'path_loss_max_error_dB': None,
+        'shadow_fading_correlated': False,
+        'building_penetration_loss': 0,
+        'grid_resolution': 50,
     }
 
+    #average results over PARAMETERS['iterations'] of shadow fading,
+    #with grid sampling only
+    MONTE_CARLO = False
+
+    #receiver sampling, either 'grid', 'adaptive', 'sobol' or 'halton'
+    SAMPLING = 'grid'
+
     SPECTRUM_PORTFOLIO = [
         (0.7, 10, '5G', '4x4'),
         (0.8, 10, '4G', '2x2'),
@@ -644,6 +2683,10 @@ if __name__ == '__main__':
         ]
     }
 
+    SPECTRAL_EFFICIENCY_LUT = compile_spectral_efficiency_lookups(
+        MODULATION_AND_CODING_LUT
+    )
+
     CONFIDENCE_INTERVALS = [
         # 10,
         50,
@@ -691,66 +2734,92 @@ if __name__ == '__main__':
         # 'free-space'
     ]
 
-    for environment in environments:
-        for ant_type in ANT_TYPES:
-            site_radii_generator = SITE_RADII[ant_type]
-            for site_radius in site_radii_generator[environment]:
-
-                # if site_radius > 1000:
-                #     continue
-
-                if environment == 'urban' and site_radius > 5000:
-                    continue
-                if environment == 'suburban' and site_radius > 15000:
-                    continue
-
-                print('--working on {}: {}'.format(environment, site_radius))
-
-                transmitter, interfering_transmitters, site_area, int_site_areas = \
-                    produce_sites_and_site_areas(
-                        unprojected_point['geometry']['coordinates'],
-                        site_radius,
-                        unprojected_crs,
-                        projected_crs
-                        )
-
-                receivers = generate_receivers(site_area, PARAMETERS, 1)
-
-                for frequency, bandwidth, generation, transmission_type in SPECTRUM_PORTFOLIO:
-
-                    print('{}, {}, {}, {}'.format(frequency, bandwidth, generation, transmission_type))
-
-                    MANAGER = SimulationManager(
-                        transmitter, interfering_transmitters, ant_type,
-                        receivers, site_area, PARAMETERS
-                        )
-
-                    results = MANAGER.estimate_link_budget(
-                        frequency,
-                        bandwidth,
-                        generation,
-                        ant_type,
-                        transmission_type,
-                        environment,
-                        MODULATION_AND_CODING_LUT,
-                        PARAMETERS
-                        )
-
-                    folder = os.path.join(DATA_INTERMEDIATE, 'luts', 'full_tables')
-                    filename = 'full_capacity_lut_{}_{}_{}_{}_{}_{}.csv'.format(
-                        environment, site_radius, generation, frequency, ant_type, transmission_type)
-
-                    write_full_results(results, environment, site_radius,
-                        frequency, bandwidth, generation, ant_type, transmission_type,
-                        folder, filename, PARAMETERS)
+    #receivers are generated once on a unit site and scaled to each radius
+    TEMPLATE = generate_site_template(PARAMETERS)
+
+    #worker processes for the sweep, all available cpus if None
+    WORKERS = None
+
+    #full per receiver results, either 'csv' (one file per carrier and
+    #site radius) or 'parquet' (a dataset partitioned by environment and
+    #generation, requires pyarrow)
+    FULL_RESULTS_FORMAT = 'csv'
+
+    RESULTS_DIRECTORY = os.path.join(DATA_INTERMEDIATE, 'luts')
+    LUT_FILENAME = 'capacity_lut_by_frequency.csv'
+
+    #rows produced with other settings are removed rather than resumed,
+    #while carriers and confidence intervals are part of each completed key
+    PARAMETERS_HASH = hash_parameters(PARAMETERS, MODULATION_AND_CODING_LUT,
+        MONTE_CARLO, SAMPLING)
+    manifest = open_sweep_manifest(RESULTS_DIRECTORY, LUT_FILENAME,
+        PARAMETERS_HASH, os.path.join(RESULTS_DIRECTORY, 'full_results'))
+
+    #full per receiver results are only produced by grid sampling
+    if SAMPLING != 'grid':
+        full_results_directory = None
+        full_results_dataset = None
+    elif FULL_RESULTS_FORMAT == 'parquet':
+        full_results_directory = None
+        full_results_dataset = FullResultsDataset(
+            os.path.join(RESULTS_DIRECTORY, 'full_results'))
+    else:
+        full_results_directory = os.path.join(RESULTS_DIRECTORY, 'full_tables')
+        full_results_dataset = None
 
-                    percentile_site_results = obtain_percentile_values(
-                        results, transmission_type, PARAMETERS, CONFIDENCE_INTERVALS
-                    )
+    #rows are merged into the table, which is rewritten at least once a
+    #minute as tasks complete, and once more if the sweep stops early
+    with LookupTableSink(RESULTS_DIRECTORY, LUT_FILENAME, manifest=manifest,
+        flush_interval=60) as sink:
+        for ant_type in ANT_TYPES:
 
-                    results_directory = os.path.join(DATA_INTERMEDIATE, 'luts')
-                    write_frequency_lookup_table(percentile_site_results, environment,
-                        site_radius, frequency, bandwidth, generation,
-                        ant_type, transmission_type, results_directory,
-                        'capacity_lut_by_frequency.csv', PARAMETERS
-                    )
+            site_radii = {}
+
+            for environment in environments:
+                site_radii_generator = SITE_RADII[ant_type]
+
+                site_radii[environment] = []
+                for site_radius in site_radii_generator[environment]:
+
+                    # if site_radius > 1000:
+                    #     continue
+
+                    if environment == 'urban' and site_radius > 5000:
+                        continue
+                    if environment == 'suburban' and site_radius > 15000:
+                        continue
+
+                    site_radii[environment].append(site_radius)
+
+                print('--working on {}: {} site radii'.format(
+                    environment, len(site_radii[environment])))
+
+            tasks = generate_sweep_tasks(site_radii, [ant_type],
+                SPECTRUM_PORTFOLIO)
+
+            #tasks recorded in the manifest are skipped when a sweep is
+            #resumed
+            tasks = [
+                task for task in tasks
+                if not manifest.is_complete(task, CONFIDENCE_INTERVALS)
+            ]
+
+            print('--{} of the {} sweep tasks to run'.format(
+                len(tasks), ant_type))
+
+            run_parallel_sweep(
+                tasks,
+                SPECTRAL_EFFICIENCY_LUT,
+                PARAMETERS,
+                CONFIDENCE_INTERVALS,
+                template=TEMPLATE,
+                workers=WORKERS,
+                full_results_directory=full_results_directory,
+                monte_carlo=MONTE_CARLO,
+                sampling=SAMPLING,
+                checkpoint=sink.write,
+                full_results_dataset=full_results_dataset,
+                #stage timings per task, written if CUCUMBER_INSTRUMENT is set
+                instrumentation_directory=os.path.join(
+                    RESULTS_DIRECTORY, 'instrumentation'),
+                )
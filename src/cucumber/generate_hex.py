@@ -13,6 +13,8 @@ See the git repo for futher details: https://github.com/urschrei/hexcover
 import os
 import configparser
 import math
+from fractions import Fraction
+import numpy as np
 from shapely.geometry import Point, mapping, shape, Polygon
 from rtree import index
 import geopandas as gpd
@@ -159,7 +161,7 @@ def calculate_polygons(startx, starty, endx, endy, radius):
     return polygons
 
 
-def find_closest_site_areas(hexagons, geom_shape):
+def find_closest_site_areas(hexagons, geom_shape, rings=1):
     """
 
     Get the transmitter and interfering site areas, by finding the closest
@@ -173,6 +175,9 @@ def find_closest_site_areas(hexagons, geom_shape):
         Each haxagon is a geojson dict.
     geom_shape : Shapely geometry object
         Geometry object for the transmitter.
+    rings : int
+        Number of rings of interfering sites (1, 2 and 3 rings give 6, 18
+        and 36 sites).
 
     Returns
     -------
@@ -203,13 +208,15 @@ def find_closest_site_areas(hexagons, geom_shape):
         site_area['geometry']['coordinates'][0]
         ).centroid
 
+    number_of_sites = 1 + count_interfering_sites(rings)
+
     all_closest_sites =  list(
         idx.nearest(
             closest_site_area_centroid.bounds,
-            7, objects='raw')
+            number_of_sites, objects='raw')
             )
 
-    interfering_site_areas = all_closest_sites[1:7]
+    interfering_site_areas = all_closest_sites[1:number_of_sites]
 
     site_area = []
     site_area.append(all_closest_sites[0])
@@ -263,7 +270,7 @@ def find_site_locations(site_area, interfering_site_areas):
     return transmitter, interfering_transmitters
 
 
-def generate_site_areas(point, site_radius):
+def generate_site_areas(point, site_radius, rings=1):
     """
 
     Generate a site area, as well as the interfering site areas, for
@@ -275,6 +282,8 @@ def generate_site_areas(point, site_radius):
         Geojson point in desired Coordinate Reference System.
     site_radius : int
         Distance between transmitter and site edge in meters.
+    rings : int
+        Number of rings of interfering sites.
 
     Returns
     -------
@@ -286,7 +295,7 @@ def generate_site_areas(point, site_radius):
     """
     geom_shape = shape(point['geometry'])
 
-    buffered = Polygon(geom_shape.buffer(site_radius*2).exterior)
+    buffered = Polygon(geom_shape.buffer(site_radius*2*rings).exterior)
 
     polygon = calculate_polygons(
         buffered.bounds[0], buffered.bounds[1],
@@ -311,14 +320,14 @@ def generate_site_areas(point, site_radius):
         id_num += 1
 
     site_area, interfering_site_areas = find_closest_site_areas(
-        hexagons, geom_shape
+        hexagons, geom_shape, rings
     )
 
     return site_area, interfering_site_areas
 
 
 def produce_sites_and_site_areas(unprojected_point, site_radius, unprojected_crs,
-    projected_crs):
+    projected_crs, rings=1):
     """
 
     Meta function to produce a set of hex shapes with a specific site_radius.
@@ -329,6 +338,8 @@ def produce_sites_and_site_areas(unprojected_point, site_radius, unprojected_crs
         x and y coordinates for an unprojected point.
     site_radius : int
         Distance between transmitter and site edge in meters.
+    rings : int
+        Number of rings of interfering sites.
 
     Returns
     -------
@@ -347,10 +358,282 @@ def produce_sites_and_site_areas(unprojected_point, site_radius, unprojected_crs
         projected_crs
     )
 
-    site_area, interfering_site_areas = generate_site_areas(point, site_radius)
+    site_area, interfering_site_areas = generate_site_areas(point, site_radius,
+        rings)
 
     transmitter, interfering_transmitters = find_site_locations(site_area,
         interfering_site_areas
     )
 
     return transmitter, interfering_transmitters, site_area, interfering_site_areas
+
+
+def calculate_hexagon(centre_x, centre_y, radius):
+    """
+
+    Calculate the coordinates of a single hexagon, with the same
+    orientation and vertex order as those produced by
+    `calculate_polygons`.
+
+    Parameters
+    ----------
+    centre_x : float
+        Hexagon centre coordinate x.
+    centre_y : float
+        Hexagon centre coordinate y.
+    radius : float
+        Given radius of the site area (the centre to edge distance).
+
+    Returns
+    -------
+    polygon : list of tuples
+        The closed list of tuple coordinates of the hexagon.
+
+    """
+    sl = (2 * radius) * math.tan(math.pi / 6)
+    p = sl * 0.5
+    b = sl * math.cos(math.radians(30))
+
+    polygon = [
+        (centre_x - b, centre_y - p),
+        (centre_x - b, centre_y + p),
+        (centre_x, centre_y + sl),
+        (centre_x + b, centre_y + p),
+        (centre_x + b, centre_y - p),
+        (centre_x, centre_y - sl),
+        (centre_x - b, centre_y - p),
+    ]
+
+    return polygon
+
+
+def count_interfering_sites(rings):
+    """
+
+    Count the interfering sites within a number of hex rings.
+
+    Parameters
+    ----------
+    rings : int
+        Number of rings of interfering sites.
+
+    Returns
+    -------
+    count : int
+        Number of interfering sites (6, 18, 36 for 1, 2, 3 rings).
+
+    """
+    return 3 * rings * (rings + 1)
+
+
+def calculate_interfering_site_offsets(radius, rings=1):
+    """
+
+    Calculate the position of the rings of interfering sites, relative
+    to the transmitter, for a hex layout of the given radius.
+
+    Parameters
+    ----------
+    radius : float
+        Given radius of site areas.
+    rings : int
+        Number of rings of interfering sites.
+
+    Returns
+    -------
+    offsets : list of tuples
+        The x and y offsets of the neighbouring sites, ring by ring,
+        anticlockwise from the positive x axis.
+
+    """
+    inter_site_distance = 2 * radius
+
+    offsets = []
+    for ring in range(1, rings + 1):
+
+        corners = []
+        for angle in range(0, 360, 60):
+            corners.append((
+                ring * inter_site_distance * math.cos(math.radians(angle)),
+                ring * inter_site_distance * math.sin(math.radians(angle))
+            ))
+
+        for (ax, ay), (bx, by) in zip(corners, corners[1:] + corners[:1]):
+            for step in range(ring):
+                offsets.append((
+                    ax + (bx - ax) * step / ring,
+                    ay + (by - ay) * step / ring
+                ))
+
+    return offsets
+
+
+def produce_unit_sites_and_site_areas(site_radius=1, rings=1):
+    """
+
+    Produce the transmitter and interfering sites, and their site areas,
+    analytically around the origin.
+
+    The hex layout is self-similar, so the geometry for any site radius
+    is this layout multiplied by the radius. Unlike
+    `produce_sites_and_site_areas` no CRS transform, hex lattice or
+    spatial index is required.
+
+    Parameters
+    ----------
+    site_radius : float
+        Distance between transmitter and site edge in meters.
+    rings : int
+        Number of rings of interfering sites.
+
+    Returns
+    -------
+    transmitter : List of dicts
+        Contains a geojson dict for the transmitter site.
+    interfering_transmitters : List of dicts
+        Contains multiple geojson dicts for the interfering transmitter sites.
+    site_area : List of dicts
+        Contains a geojson dict for the transmitter site area.
+    interfering_site_areas : List of dicts
+        Contains multiple geojson dicts for the interfering transmitter site
+        areas.
+
+    """
+    transmitter = [{
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': (0.0, 0.0),
+        },
+        'properties': {
+            'site_id': 'transmitter'
+        }
+    }]
+
+    site_area = [{
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [calculate_hexagon(0, 0, site_radius)],
+        },
+        'properties': {
+            'site_id': 'transmitter'
+        }
+    }]
+
+    interfering_transmitters = []
+    interfering_site_areas = []
+    for id_num, (x, y) in enumerate(
+        calculate_interfering_site_offsets(site_radius, rings)):
+
+        interfering_transmitters.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': (x, y),
+            },
+            'properties': {
+                'site_id': id_num
+            }
+        })
+
+        interfering_site_areas.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Polygon',
+                'coordinates': [calculate_hexagon(x, y, site_radius)],
+            },
+            'properties': {
+                'site_id': id_num
+            }
+        })
+
+    return transmitter, interfering_transmitters, site_area, interfering_site_areas
+
+
+def points_in_convex_polygon(polygon, x, y):
+    """
+
+    Test which points lie strictly inside a convex polygon, such as a
+    hexagonal site area, for arrays of points at once.
+
+    Parameters
+    ----------
+    polygon : list of tuples
+        The tuple coordinates of a convex polygon, closed or not.
+    x : numpy array
+        Point coordinates x.
+    y : numpy array
+        Point coordinates y, with the shape of `x`.
+
+    Returns
+    -------
+    inside : numpy array
+        Boolean array with the shape of `x`, True for points inside the
+        polygon (points on the boundary are outside, as with shapely
+        `contains`).
+
+    """
+    vertices = np.asarray(polygon, dtype=float)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    positive = np.ones(x.shape, dtype=bool)
+    negative = np.ones(x.shape, dtype=bool)
+
+    #the closing edge of an already closed polygon has zero length
+    for (x1, y1), (x2, y2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if x1 == x2 and y1 == y2:
+            continue
+        left = (x2 - x1) * (y - y1)
+        right = (y2 - y1) * (x - x1)
+        cross = np.asarray(left - right)
+
+        #rounding can give the wrong side for points on or next to a
+        #sloping edge, so their side is found exactly, as shapely does
+        uncertain = np.flatnonzero(
+            (np.abs(cross) <= 1e-12 * (np.abs(left) + np.abs(right))) &
+            (left != 0) & (right != 0))
+        for idx in uncertain:
+            exact = (Fraction(x2) - Fraction(x1)) * \
+                (Fraction(float(y.flat[idx])) - Fraction(y1)) - \
+                (Fraction(y2) - Fraction(y1)) * \
+                (Fraction(float(x.flat[idx])) - Fraction(x1))
+            cross.flat[idx] = (exact > 0) - (exact < 0)
+
+        positive &= cross > 0
+        negative &= cross < 0
+
+    return positive | negative
+
+
+def calculate_hexagon_symmetry_domain(polygon):
+    """
+
+    Calculate the triangle between the centre, the midpoint of the first
+    edge and its end vertex of a regular hexagon. This is one twelfth of
+    the hexagon, from which the whole hexagon is generated by its
+    rotations and reflections.
+
+    Parameters
+    ----------
+    polygon : list of tuples
+        The coordinates of a regular hexagon, e.g. from
+        `calculate_hexagon`.
+
+    Returns
+    -------
+    triangle : list of tuples
+        The closed list of tuple coordinates of the triangle.
+
+    """
+    vertices = np.asarray(polygon, dtype=float)[:6]
+
+    centre = vertices.mean(axis=0)
+    midpoint = (vertices[0] + vertices[1]) / 2
+
+    triangle = [tuple(centre), tuple(midpoint), tuple(vertices[1]),
+        tuple(centre)]
+
+    return [(float(x), float(y)) for x, y in triangle]
@@ -19,12 +19,22 @@ import numpy as np
 from math import pi, sqrt, log10
 import random
 
+#shared PathLossModel objects, keyed by frequency, environment and heights
+PATH_LOSS_MODELS = {}
+
+#shared PathLossTable objects, keyed as above plus the error bound
+PATH_LOSS_TABLES = {}
+
 
 def path_loss_calculator(distance, frequency, environment, 
-                         simulation_parameters,random_variation):
+                         simulation_parameters,random_variation, indoor=True):
     """
     Calculate the correct path loss given a range of critera.
 
+    Setting `simulation_parameters['path_loss_max_error_dB']` selects an
+    approximate mode, interpolating the unrounded path loss from a
+    `PathLossTable` built to that error bound.
+
     Parameters
     ----------
     frequency : float
@@ -73,10 +83,22 @@ def path_loss_calculator(distance, frequency, environment,
     type_of_sight = 'nlos'
     ue_height = simulation_parameters['rx_height']
     above_roof = 0
-    indoor = 1
     seed_value = simulation_parameters['tx_macro_baseline_height']
     iterations = simulation_parameters['seed_value']
 
+    max_error = simulation_parameters.get('path_loss_max_error_dB')
+
+    if max_error is not None:
+
+        path_loss_table = get_path_loss_table(frequency, environment,
+            simulation_parameters, max_error)
+
+        path_loss = path_loss_table(distance) + outdoor_to_indoor_path_loss(
+            frequency, indoor, seed_value, simulation_parameters
+        )
+
+        return path_loss, path_loss_table.model
+
     if 0.05 < frequency <= 100:
 
         path_loss = etsi_tr_138_901(frequency, distance, ant_height, ant_type,
@@ -85,7 +107,7 @@ def path_loss_calculator(distance, frequency, environment,
         )
 
         path_loss = path_loss + outdoor_to_indoor_path_loss(
-            frequency, indoor, seed_value
+            frequency, indoor, seed_value, simulation_parameters
         )
 
         model = 'etsi_tr_138_901'
@@ -309,6 +331,789 @@ def uma_nlos_optional(frequency, distance, ant_height, ue_height,
     return round(path_loss)# + random_variation)
 
 
+def path_loss_calculator_vectorized(distance, frequency, environment,
+                                    simulation_parameters, random_variation=None,
+                                    indoor=None):
+    """
+    Array equivalent of `path_loss_calculator`.
+
+    Accepts an array of distances and returns the path loss for each
+    element, identical to calling `path_loss_calculator` on each value.
+    The frequency may also be an array which broadcasts against the
+    distances, e.g. with shape (carriers, 1) for a (receivers,) array
+    of distances, to evaluate several carriers at once. The scenario
+    constants are held by a shared `PathLossModel`.
+
+    If `simulation_parameters['path_loss_max_error_dB']` is set, the
+    unrounded path loss is instead interpolated from a shared
+    `PathLossTable` built to that error bound.
+
+    Parameters
+    ----------
+    distance : array_like
+        Distances between the transmitter and receivers in meters.
+    frequency : float or array_like
+        Frequency band given in GHz.
+    environment : string
+        Gives the type of settlement (urban, suburban or rural).
+    simulation_parameters : dict
+        A dict containing all simulation parameters necessary.
+    random_variation : array_like
+        Not used, retained to match `path_loss_calculator`.
+    indoor : array_like
+        Boolean mask indicating if each user is indoor (True) or
+        outdoor (False), which broadcasts against `distance`. Defaults
+        to indoor, as for `path_loss_calculator`.
+
+    Returns
+    -------
+    path_loss : numpy array
+        Path loss in decibels (dB), with the broadcast shape of
+        `distance` and `frequency`.
+    model : string
+        Type of model used for path loss estimation.
+
+    """
+    if indoor is None:
+        indoor = True
+
+    penetration_loss = outdoor_to_indoor_path_loss_vectorized(
+        frequency, indoor, None, simulation_parameters
+    )
+
+    max_error = simulation_parameters.get('path_loss_max_error_dB')
+
+    if max_error is not None:
+        path_loss_table = get_path_loss_table(frequency, environment,
+            simulation_parameters, max_error)
+        return (path_loss_table(distance) + penetration_loss,
+            path_loss_table.model)
+
+    path_loss_model = get_path_loss_model(frequency, environment,
+        simulation_parameters)
+
+    return (np.round(path_loss_model(distance) + penetration_loss),
+        path_loss_model.model)
+
+
+def etsi_tr_138_901_vectorized(frequency, distance, ant_height, ant_type,
+    building_height, street_width, settlement_type, type_of_sight,
+    ue_height, above_roof, indoor, seed_value, iterations):
+    """
+
+    Array equivalent of `etsi_tr_138_901`.
+
+    The distance thresholds which select each regime in the scalar
+    model are applied as masks over the distance array. Combinations
+    the scalar model does not define (e.g. LOS below 10 m, or micro
+    NLOS beyond 5 km) are returned as nan. The frequency may be an
+    array which broadcasts against the distances.
+
+    Model requires:
+        - Frequency in gigahertz
+        - Distance in meters
+
+    """
+    fc = frequency
+    c = 3e8
+
+    he = 1 #enviroment_height
+    hbs = ant_height
+    hut = ue_height
+    h_apost_bs = ant_height - ue_height
+    h_apost_ut = ue_height - he
+    w = street_width # mean street width is 20m
+    h = building_height # mean building height
+
+    distance = np.asarray(distance, dtype=float)
+
+    dbp = 2 * pi * hbs * hut * (fc * 1e9) / c
+    d_apost_bp = 4 * h_apost_bs * h_apost_ut * (fc*1e9) / c
+    d2d_in = 10 #mean d2d_in value
+    d2d_out = distance - d2d_in
+    d2d = d2d_out + d2d_in
+    d3d = np.sqrt((d2d_out + d2d_in)**2 + (hbs - hut)**2)
+
+    check_3gpp_applicability(building_height, street_width, ant_height, ue_height)
+
+    if ant_type == 'macro':
+        if settlement_type == 'suburban' or settlement_type == 'rural':
+            pl1 = np.round(
+                20*np.log10(40*pi*d3d*fc/3) + min(0.03*h**1.72,10) *
+                np.log10(d3d) - min(0.044*h**1.72,14.77) +
+                0.002*np.log10(h)*d3d
+            )
+
+            pl2 = np.round(
+                20*np.log10(40*pi*dbp*fc/3) + min(0.03*h**1.72,10) *
+                np.log10(dbp) - min(0.044*h**1.72,14.77) +
+                0.002*np.log10(h)*dbp +
+                40*np.log10(d3d / dbp)
+            )
+
+            if type_of_sight == 'los':
+                return np.select(
+                    [
+                        (10 <= d2d) & (d2d <= dbp),
+                        (dbp <= d2d) & (d2d <= 10000),
+                        d2d > 10000,
+                    ],
+                    [
+                        pl1,
+                        pl2,
+                        uma_nlos_optional_vectorized(frequency, distance,
+                            ant_height, ue_height, seed_value, iterations),
+                    ],
+                    default=np.nan
+                )
+
+            pl_apostrophe_rma_nlos = np.round(
+                161.04 - 7.1 * np.log10(w)+7.5*np.log10(h) -
+                (24.37 - 3.7 * (h/hbs)**2)*np.log10(hbs) +
+                (43.42 - 3.1*np.log10(hbs))*(np.log10(d3d)-3) +
+                20*np.log10(fc) - (3.2 * (np.log10(11.75*hut))**2 - 4.97)
+            )
+
+            return np.maximum(pl_apostrophe_rma_nlos, pl2)
+
+        elif settlement_type == 'urban':
+
+            pl1 = np.round(
+                28 + 22 * np.log10(d3d) + 20 * np.log10(fc)
+            )
+
+            pl2 = np.round(
+                28 + 40*np.log10(d3d) + 20 * np.log10(fc) -
+                9*np.log10((d_apost_bp)**2 + (hbs-hut)**2)
+            )
+
+            if type_of_sight == 'los':
+                return np.select(
+                    [
+                        (10 <= d2d) & (d2d <= d_apost_bp),
+                        (d_apost_bp <= d2d) & (d2d <= 5000),
+                    ],
+                    [pl1, pl2],
+                    default=np.nan
+                )
+
+            pl_apostrophe_uma_nlos = np.where(
+                d2d <= 5000,
+                np.round(
+                    13.54 + 39.08 * np.log10(d3d) + 20 *
+                    np.log10(fc) - 0.6 * (hut - 1.5)
+                ),
+                uma_nlos_optional_vectorized(frequency, distance, ant_height,
+                    ue_height, seed_value, iterations)
+            )
+
+            return np.maximum(pl_apostrophe_uma_nlos, pl2)
+
+        else:
+            raise ValueError('Did not recognise settlement_type')
+
+    elif ant_type == 'micro':
+
+            pl1 = np.round(
+                32.4 + 21 * np.log10(d3d) + 20 * np.log10(fc)
+            )
+
+            pl2 = np.round(
+                32.4 + 40*np.log10(d3d) + 20 * np.log10(fc) -
+                9.5*np.log10((d_apost_bp)**2 + (hbs-hut)**2)
+            )
+
+            if type_of_sight == 'los':
+                return np.select(
+                    [
+                        (10 <= d2d) & (d2d <= d_apost_bp),
+                        (d_apost_bp <= d2d) & (d2d <= 5000),
+                    ],
+                    [pl1, pl2],
+                    default=np.nan
+                )
+
+            pl_apostrophe_umi_nlos = np.round(
+                35.3 * np.log10(d3d) + 22.4 +
+                21.3 * np.log10(fc) - 0.3 * (hut - 1.5)
+            )
+
+            return np.where(
+                d2d <= 5000,
+                np.maximum(pl_apostrophe_umi_nlos, pl2),
+                np.nan
+            )
+
+    else:
+        raise ValueError('Did not recognise ant_type')
+
+
+def uma_nlos_optional_vectorized(frequency, distance, ant_height, ue_height,
+    seed_value, iterations):
+    """
+
+    Array equivalent of `uma_nlos_optional`.
+
+    Parameters
+    ----------
+    frequency : float or array_like
+        Carrier band (f) required in GHz.
+    distance : array_like
+        Distances (d) between transmitter and receivers (m).
+    ant_height : int
+        Transmitter antenna height (h1) (m, above ground).
+    ue_height : int
+        Receiver antenna height (h2) (m, above ground).
+    seed_value : int
+        Dictates repeatable random number generation.
+    iterations : int
+        Specifies iterations for a specific calculation.
+
+    Returns
+    -------
+    path_loss : numpy array
+        Path loss in decibels (dB)
+
+    """
+    fc = frequency
+    d3d = np.sqrt((np.asarray(distance, dtype=float))**2 +
+        (ant_height - ue_height)**2)
+
+    path_loss = 32.4 + 20*np.log10(fc) + 30*np.log10(d3d)
+
+    return np.round(path_loss)
+
+
+class PathLossModel(object):
+    """
+
+    ETSI TR 138.901 path loss for one propagation scenario.
+
+    Every term of `etsi_tr_138_901_vectorized` which depends only on the
+    frequency, antenna heights, building height and street width is
+    computed once on construction, together with the applicability
+    check, leaving only the distance dependent terms for each call.
+    Results are identical to `path_loss_calculator_vectorized`.
+
+    Parameters
+    ----------
+    frequency : float or array_like
+        Frequency band given in GHz, or an array of frequencies which
+        broadcasts against the distances, e.g. with shape (carriers, 1).
+    environment : string
+        Gives the type of settlement (urban, suburban or rural).
+    ant_height : float
+        Height of the transmitting antenna (m).
+    ue_height : float
+        Height of the User Equipment (m).
+    building_height : int
+        Height of surrounding buildings in meters (m).
+    street_width : float
+        Width of street in meters (m).
+    ant_type : string
+        Indicates the type of site antenna (macro or micro).
+    type_of_sight : string
+        Indicates whether the path is (Non) Line of Sight (LOS or NLOS).
+    rounded : bool
+        Round to whole decibels as `etsi_tr_138_901` does. If False the
+        continuous formulas are returned, which round to the same values.
+
+    """
+    model = 'etsi_tr_138_901'
+
+    def __init__(self, frequency, environment, ant_height, ue_height,
+        building_height=8, street_width=20, ant_type='macro',
+        type_of_sight='nlos', rounded=True):
+
+        fc = np.asarray(frequency, dtype=float)
+
+        if not np.all((0.05 < fc) & (fc <= 100)):
+            raise ValueError (
+                "frequency of {} is NOT within correct range".format(frequency)
+            )
+
+        if ant_type == 'macro':
+            if environment not in ('urban', 'suburban', 'rural'):
+                raise ValueError('Did not recognise settlement_type')
+        elif ant_type != 'micro':
+            raise ValueError('Did not recognise ant_type')
+
+        check_3gpp_applicability(building_height, street_width, ant_height,
+            ue_height)
+
+        self.frequency = fc
+        self.environment = environment
+        self.ant_type = ant_type
+        self.type_of_sight = type_of_sight
+        self._round = np.round if rounded else np.asarray
+
+        c = 3e8
+        he = 1 #enviroment_height
+        hbs = ant_height
+        hut = ue_height
+        w = street_width
+        h = building_height
+
+        self.hbs = hbs
+        self.hut = hut
+        self.height_difference = (hbs - hut)**2
+        self.dbp = 2 * pi * hbs * hut * (fc * 1e9) / c
+        self.d_apost_bp = 4 * (hbs - hut) * (hut - he) * (fc*1e9) / c
+
+        log_fc = np.log10(fc)
+
+        #distances at which the path loss may jump between regimes
+        if type_of_sight == 'los':
+            if ant_type == 'macro' and environment != 'urban':
+                self.breakpoints = (10, self.dbp, 10000)
+            else:
+                self.breakpoints = (10, self.d_apost_bp, 5000)
+        elif ant_type == 'macro' and environment != 'urban':
+            self.breakpoints = ()
+        else:
+            self.breakpoints = (5000,)
+
+        if ant_type == 'macro' and environment != 'urban':
+            dbp = self.dbp
+            self.rma_slope = min(0.03*h**1.72,10)
+            self.rma_offset = min(0.044*h**1.72,14.77)
+            self.rma_distance = 0.002*np.log10(h)
+            self.rma_frequency = 40*pi*fc/3
+            self.pl2_intercept = (
+                20*np.log10(40*pi*dbp*fc/3) + self.rma_slope *
+                np.log10(dbp) - self.rma_offset +
+                0.002*np.log10(h)*dbp
+            )
+            self.nlos_intercept = (
+                161.04 - 7.1 * np.log10(w)+7.5*np.log10(h) -
+                (24.37 - 3.7 * (h/hbs)**2)*np.log10(hbs)
+            )
+            self.nlos_slope = 43.42 - 3.1*np.log10(hbs)
+            self.nlos_offset = 20*log_fc - (3.2 * (np.log10(11.75*hut))**2 - 4.97)
+            self.optional_intercept = 32.4 + 20*log_fc
+
+        elif ant_type == 'macro':
+            self.frequency_term = 20 * log_fc
+            self.breakpoint_term = 9*np.log10(
+                (self.d_apost_bp)**2 + self.height_difference)
+            self.nlos_offset = 0.6 * (hut - 1.5)
+            self.optional_intercept = 32.4 + 20*log_fc
+
+        else:
+            self.frequency_term = 20 * log_fc
+            self.breakpoint_term = 9.5*np.log10(
+                (self.d_apost_bp)**2 + self.height_difference)
+            self.nlos_frequency_term = 21.3 * log_fc
+            self.nlos_offset = 0.3 * (hut - 1.5)
+
+
+    def __call__(self, distance):
+        """
+
+        Calculate the path loss for an array of distances.
+
+        Parameters
+        ----------
+        distance : array_like
+            Distances between the transmitter and receivers in meters.
+
+        Returns
+        -------
+        path_loss : numpy array
+            Path loss in decibels (dB), with the broadcast shape of
+            `distance` and the model frequency.
+
+        """
+        distance = np.asarray(distance, dtype=float)
+
+        d2d_in = 10 #mean d2d_in value
+        d2d = (distance - d2d_in) + d2d_in
+        d3d = np.sqrt(d2d**2 + self.height_difference)
+        log_d3d = np.log10(d3d)
+
+        if self.ant_type == 'micro':
+            path_loss = self._umi(distance, d2d, d3d, log_d3d)
+        elif self.environment == 'urban':
+            path_loss = self._uma(distance, d2d, d3d, log_d3d)
+        else:
+            path_loss = self._rma(distance, d2d, d3d, log_d3d)
+
+        return self._round(path_loss)
+
+
+    def _optional(self, distance):
+
+        d3d = np.sqrt(distance**2 + self.height_difference)
+
+        return self._round(self.optional_intercept + 30*np.log10(d3d))
+
+
+    def _rma(self, distance, d2d, d3d, log_d3d):
+
+        dbp = self.dbp
+
+        pl2 = self._round(self.pl2_intercept + 40*np.log10(d3d / dbp))
+
+        if self.type_of_sight == 'los':
+            pl1 = self._round(
+                20*np.log10(self.rma_frequency*d3d) + self.rma_slope *
+                log_d3d - self.rma_offset + self.rma_distance*d3d
+            )
+            return np.select(
+                [
+                    (10 <= d2d) & (d2d <= dbp),
+                    (dbp <= d2d) & (d2d <= 10000),
+                    d2d > 10000,
+                ],
+                [pl1, pl2, self._optional(distance)],
+                default=np.nan
+            )
+
+        pl_apostrophe_rma_nlos = self._round(
+            self.nlos_intercept + self.nlos_slope*(log_d3d-3) +
+            self.nlos_offset
+        )
+
+        return np.maximum(pl_apostrophe_rma_nlos, pl2)
+
+
+    def _uma(self, distance, d2d, d3d, log_d3d):
+
+        pl2 = self._round(
+            28 + 40*log_d3d + self.frequency_term - self.breakpoint_term
+        )
+
+        if self.type_of_sight == 'los':
+            pl1 = self._round(28 + 22 * log_d3d + self.frequency_term)
+            return np.select(
+                [
+                    (10 <= d2d) & (d2d <= self.d_apost_bp),
+                    (self.d_apost_bp <= d2d) & (d2d <= 5000),
+                ],
+                [pl1, pl2],
+                default=np.nan
+            )
+
+        pl_apostrophe_uma_nlos = np.where(
+            d2d <= 5000,
+            self._round(
+                13.54 + 39.08 * log_d3d + self.frequency_term -
+                self.nlos_offset
+            ),
+            self._optional(distance)
+        )
+
+        return np.maximum(pl_apostrophe_uma_nlos, pl2)
+
+
+    def _umi(self, distance, d2d, d3d, log_d3d):
+
+        pl2 = self._round(
+            32.4 + 40*log_d3d + self.frequency_term - self.breakpoint_term
+        )
+
+        if self.type_of_sight == 'los':
+            pl1 = self._round(32.4 + 21 * log_d3d + self.frequency_term)
+            return np.select(
+                [
+                    (10 <= d2d) & (d2d <= self.d_apost_bp),
+                    (self.d_apost_bp <= d2d) & (d2d <= 5000),
+                ],
+                [pl1, pl2],
+                default=np.nan
+            )
+
+        pl_apostrophe_umi_nlos = self._round(
+            35.3 * log_d3d + 22.4 + self.nlos_frequency_term - self.nlos_offset
+        )
+
+        return np.where(
+            d2d <= 5000,
+            np.maximum(pl_apostrophe_umi_nlos, pl2),
+            np.nan
+        )
+
+
+class PathLossTable(object):
+    """
+
+    Tabulated approximation of a `PathLossModel`.
+
+    The continuous ETSI TR 138.901 formulas are sampled on a uniform
+    grid of log10 distance, shared by every frequency, and linearly
+    interpolated. The interval containing each distance is found
+    arithmetically, so an evaluation needs one log10 and one table
+    lookup for all frequencies at once. The grid is refined until the
+    error at interior points of every interval is below `max_error`.
+    Intervals which contain one of the model `breakpoints`, where the
+    path loss may jump between regimes, and distances outside the table
+    are marked nan in the table and evaluated exactly.
+
+    The exact calculators round to whole decibels, while the table
+    returns unrounded values, so it differs from them by at most
+    `max_error` plus 0.5 dB.
+
+    Parameters
+    ----------
+    frequency : float or array_like
+        Frequency band given in GHz, or an array of frequencies which
+        broadcasts against the distances, e.g. with shape (carriers, 1).
+    environment : string
+        Gives the type of settlement (urban, suburban or rural).
+    ant_height : float
+        Height of the transmitting antenna (m).
+    ue_height : float
+        Height of the User Equipment (m).
+    max_error : float
+        Maximum interpolation error in decibels.
+    min_distance : float
+        Shortest tabulated distance (m).
+    max_distance : float
+        Longest tabulated distance (m).
+    min_points : int
+        Grid points per decade of distance to start refining from,
+        which also limits how many distances fall into the intervals
+        evaluated exactly.
+    max_points : int
+        Upper limit on the grid points per decade of distance, beyond
+        which a ValueError is raised.
+
+    """
+    model = 'etsi_tr_138_901_tabulated'
+
+    def __init__(self, frequency, environment, ant_height, ue_height,
+        max_error=0.1, min_distance=10, max_distance=100000,
+        min_points=64, max_points=2**16, **kwargs):
+
+        self.frequency = np.asarray(frequency, dtype=float)
+        self.max_error = max_error
+        self.origin = log10(min_distance)
+
+        self.models = [
+            PathLossModel(value, environment, ant_height, ue_height,
+                rounded=False, **kwargs)
+            for value in self.frequency.ravel()
+        ]
+
+        decades = np.log10(max_distance) - self.origin
+        points_per_decade = min_points
+
+        while points_per_decade <= max_points:
+
+            cells = int(np.ceil(decades * points_per_decade))
+            grid = self.origin + np.arange(cells + 1) / points_per_decade
+
+            values = np.array([model(10**grid) for model in self.models])
+
+            exact = np.zeros((len(self.models), cells), dtype=bool)
+            for row, model in zip(exact, self.models):
+                for breakpoint in model.breakpoints:
+                    cell = int(np.floor(
+                        (np.log10(breakpoint) - self.origin) *
+                        points_per_decade))
+                    if 0 <= cell < cells:
+                        row[cell] = True
+
+            if self._error(grid, values, exact) <= max_error:
+                break
+
+            points_per_decade *= 2
+
+        else:
+            raise ValueError(
+                "path loss table exceeds {} dB error with {} points per "
+                "decade".format(max_error, max_points)
+            )
+
+        #each row holds the start and step of every interval, between
+        #nan sentinels which catch distances outside the table
+        start = np.full((len(self.models), cells + 2), np.nan)
+        step = np.zeros((len(self.models), cells + 2))
+        start[:, 1:-1] = np.where(exact, np.nan, values[:, :-1])
+        step[:, 1:-1] = np.diff(values, axis=1)
+
+        self.scale = points_per_decade
+        self.cells = cells
+        self.start = start.ravel()
+        self.step = step.ravel()
+        self.offset = (cells + 2) * np.arange(self.frequency.size).reshape(
+            self.frequency.shape)
+
+        #plain lists for single distances, avoiding array overhead
+        self._start = self.start.tolist()
+        self._step = self.step.tolist()
+
+
+    def _error(self, grid, values, exact):
+        """
+
+        Return the largest interpolation error at interior points of
+        the intervals which are not evaluated exactly.
+
+        """
+        error = 0
+
+        for fraction in (0.25, 0.5, 0.75):
+            points = 10**(grid[:-1] + fraction * np.diff(grid))
+            for model, start, row in zip(self.models, values, exact):
+                estimate = start[:-1] + fraction * np.diff(start)
+                difference = np.abs(estimate - model(points))
+                error = np.nanmax(difference[~row], initial=error)
+
+        return error
+
+
+    def __len__(self):
+
+        return self.start.size
+
+
+    def _lookup(self, distance):
+        """
+
+        Approximate the path loss for a single distance and frequency.
+
+        """
+        position = (log10(distance) - self.origin) * self.scale + 1
+        position = min(max(position, 0), self.cells + 1)
+
+        cell = int(position)
+        start = self._start[cell]
+
+        if start != start:
+            return float(self.models[0](distance))
+
+        return start + self._step[cell] * (position - cell)
+
+
+    def __call__(self, distance):
+        """
+
+        Approximate the path loss for an array of distances.
+
+        Parameters
+        ----------
+        distance : array_like
+            Distances between the transmitter and receivers in meters.
+
+        Returns
+        -------
+        path_loss : numpy array
+            Path loss in decibels (dB), with the broadcast shape of
+            `distance` and the table frequency. A float is returned
+            for a single distance and frequency.
+
+        """
+        if self.frequency.ndim == 0 and isinstance(distance, (int, float)):
+            return self._lookup(distance)
+
+        distance = np.asarray(distance, dtype=float)
+
+        position = (np.log10(distance) - self.origin) * self.scale + 1
+        np.clip(position, 0, self.cells + 1, out=position)
+
+        cell = position.astype(np.intp)
+        fraction = position - cell
+        cell = cell + self.offset
+
+        path_loss = self.start.take(cell) + self.step.take(cell) * fraction
+
+        missing = np.flatnonzero(np.isnan(path_loss))
+
+        if len(missing):
+            shape = path_loss.shape
+            rows = np.broadcast_to(self.offset, shape).ravel()[missing]
+            distance = np.broadcast_to(distance, shape).ravel()[missing]
+            values = path_loss.reshape(-1)
+            for row, model in enumerate(self.models):
+                selected = rows == row * (self.cells + 2)
+                if selected.any():
+                    values[missing[selected]] = model(distance[selected])
+
+        return path_loss
+
+
+def get_path_loss_model(frequency, environment, simulation_parameters):
+    """
+
+    Return the `PathLossModel` used by `path_loss_calculator_vectorized`
+    for a frequency and environment, building it on first use.
+
+    Parameters
+    ----------
+    frequency : float or array_like
+        Frequency band given in GHz.
+    environment : string
+        Gives the type of settlement (urban, suburban or rural).
+    simulation_parameters : dict
+        A dict containing all simulation parameters necessary.
+
+    Returns
+    -------
+    model : PathLossModel
+        The shared model for this scenario.
+
+    """
+    frequency = np.asarray(frequency, dtype=float)
+
+    key = (
+        frequency.shape, tuple(frequency.ravel().tolist()), environment,
+        simulation_parameters['tx_macro_baseline_height'],
+        simulation_parameters['rx_height'],
+    )
+
+    if key not in PATH_LOSS_MODELS:
+        PATH_LOSS_MODELS[key] = PathLossModel(frequency, environment,
+            simulation_parameters['tx_macro_baseline_height'],
+            simulation_parameters['rx_height'])
+
+    return PATH_LOSS_MODELS[key]
+
+
+def get_path_loss_table(frequency, environment, simulation_parameters,
+    max_error):
+    """
+
+    Return the shared `PathLossTable` for a frequency and environment,
+    building it on first use.
+
+    Parameters
+    ----------
+    frequency : float or array_like
+        Frequency band given in GHz.
+    environment : string
+        Gives the type of settlement (urban, suburban or rural).
+    simulation_parameters : dict
+        A dict containing all simulation parameters necessary.
+    max_error : float
+        Maximum interpolation error in decibels.
+
+    Returns
+    -------
+    table : PathLossTable
+        The shared table for this scenario.
+
+    """
+    if isinstance(frequency, (int, float)):
+        frequencies = float(frequency)
+    else:
+        frequency = np.asarray(frequency, dtype=float)
+        frequencies = (frequency.shape, tuple(frequency.ravel().tolist()))
+
+    key = (
+        frequencies, environment,
+        simulation_parameters['tx_macro_baseline_height'],
+        simulation_parameters['rx_height'], max_error,
+    )
+
+    if key not in PATH_LOSS_TABLES:
+        PATH_LOSS_TABLES[key] = PathLossTable(frequency, environment,
+            simulation_parameters['tx_macro_baseline_height'],
+            simulation_parameters['rx_height'], max_error)
+
+    return PATH_LOSS_TABLES[key]
+
+
 def check_3gpp_applicability(building_height, street_width, ant_height, ue_height):
 
     if 5 <= building_height < 50 :
@@ -386,19 +1191,25 @@ def generate_log_normal_dist_value(frequency, mu, sigma, draws, seed_value):
     return round(np.mean(hs),2)
 
 
-def outdoor_to_indoor_path_loss(frequency, indoor, seed_value):
+def outdoor_to_indoor_path_loss(frequency, indoor, seed_value,
+    simulation_parameters=None):
     """
 
     ITU-R M.1225 suggests building penetration loss for shadow fading can be modelled
     as a log-normal distribution with a mean and  standard deviation of 12 dB and
     8 dB respectively.
 
+    Indoor users take the mean building penetration loss for the
+    frequency (see `building_penetration_loss`), and outdoor users none.
+
     frequency : int
-        Carrier band (f) required in MHz.
+        Carrier band (f) required in GHz.
     indoor : binary
         Indicates if the user is indoor (True) or outdoor (False).
     seed_value : int
         Dictates repeatable random number generation.
+    simulation_parameters : dict
+        A dict containing all simulation parameters necessary.
 
     Returns
     -------
@@ -406,6 +1217,10 @@ def outdoor_to_indoor_path_loss(frequency, indoor, seed_value):
         Outdoor to indoor path loss in decibels (dB)
 
     """
+    if indoor and simulation_parameters is not None:
+        return float(building_penetration_loss(frequency,
+            simulation_parameters)[0])
+
     # if indoor:
 
     #     outdoor_to_indoor_path_loss = generate_log_normal_dist_value(frequency, 12, 8, 1, seed_value)
@@ -454,3 +1269,86 @@ def lognormal_dist_values(mu, sigma, seed_value, draws):
     random_variations = np.random.lognormal(normal_mean, normal_std, draws)
 
     return random_variations
+
+
+def outdoor_to_indoor_path_loss_vectorized(frequency, indoor, seed_value,
+    simulation_parameters=None):
+    """
+
+    Array equivalent of `outdoor_to_indoor_path_loss`.
+
+    The loss of every user is selected from their indoor mask in one
+    pass, rather than branching per user. Indoor users take the mean
+    loss only; its random variation is drawn per receiver by
+    `SimulationManager.estimate_link_budget_monte_carlo`.
+
+    Parameters
+    ----------
+    frequency : float or array_like
+        Carrier band (f) required in GHz, which broadcasts against
+        `indoor`.
+    indoor : array_like
+        Boolean mask indicating if each user is indoor (True) or
+        outdoor (False).
+    seed_value : int
+        Unused, kept to match `outdoor_to_indoor_path_loss`.
+    simulation_parameters : dict
+        A dict containing all simulation parameters necessary.
+
+    Returns
+    -------
+    path_loss : numpy array
+        Outdoor to indoor path loss in decibels (dB), with the
+        broadcast shape of `frequency` and `indoor`.
+
+    """
+    if simulation_parameters is None:
+        return np.zeros(np.shape(indoor))
+
+    mean = building_penetration_loss(frequency, simulation_parameters)[0]
+
+    return np.where(indoor, mean, 0.0)
+
+
+def building_penetration_loss(frequency, simulation_parameters):
+    """
+
+    Mean and standard deviation of the building penetration loss for
+    each frequency.
+
+    The `building_penetration_loss` simulation parameter is either a
+    single mean loss in dB for every frequency, or a list of
+    (frequency (GHz), mean (dB), standard deviation (dB)) tuples which
+    are linearly interpolated in frequency, and held constant beyond
+    the first and last frequencies. It defaults to no loss.
+
+    Parameters
+    ----------
+    frequency : float or array_like
+        Carrier band (f) required in GHz.
+    simulation_parameters : dict
+        A dict containing all simulation parameters necessary.
+
+    Returns
+    -------
+    mean : numpy array
+        Mean building penetration loss (dB), with the shape of
+        `frequency`.
+    std : numpy array
+        Standard deviation of the building penetration loss (dB), with
+        the shape of `frequency`.
+
+    """
+    frequency = np.asarray(frequency, dtype=float)
+
+    loss = simulation_parameters.get('building_penetration_loss', 0)
+
+    if np.ndim(loss) == 0:
+        return np.full(frequency.shape, float(loss)), np.zeros(frequency.shape)
+
+    points = np.array(sorted(loss), dtype=float).reshape(-1, 3)
+
+    return (
+        np.interp(frequency, points[:, 0], points[:, 1]),
+        np.interp(frequency, points[:, 0], points[:, 2]),
+    )
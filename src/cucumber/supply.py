@@ -6,9 +6,15 @@ Written by Ed Oughton.
 Winter 2020
 
 """
+import os
+import json
 import math
+import time
+import hashlib
+from collections import OrderedDict
 from itertools import tee
 from operator import itemgetter
+import numpy as np
 
 
 def estimate_supply(country, deciles, capacity_lut):
@@ -288,7 +294,8 @@ def lookup_capacity(capacity_lut, env, ant_type, frequency,
     Parameters
     ----------
     capacity_lut : dict
-        A dictionary containing the lookup capacities.
+        A dictionary containing the lookup capacities, or a
+        `CapacityOracle`.
     env : string
         The settlement type e.g. urban, suburban or rural.
     ant_type : string
@@ -317,6 +324,362 @@ def lookup_capacity(capacity_lut, env, ant_type, frequency,
     return density_capacities
 
 
+def index_capacity_lut(rows):
+    """
+    Index the rows of the main capacity lookup table for
+    `lookup_capacity`.
+
+    Parameters
+    ----------
+    rows : iterable of dicts
+        Lookup table rows, either read from the .csv file or produced
+        by the simulation.
+
+    Returns
+    -------
+    capacity_lut : dict
+        Site density to capacity tuples, sorted by site density, keyed
+        by antenna type, frequency (MHz), generation and confidence
+        interval.
+
+    """
+    capacity_lut = {}
+
+    for row in rows:
+
+        if float(row["capacity_mbps_km2"]) <= 0:
+            continue
+
+        ant_type = row["ant_type"]
+        frequency_MHz = str(int(float(row["frequency_GHz"]) * 1e3))
+        generation = str(row["generation"])
+        ci = str(row['confidence_interval'])
+
+        capacity_lut.setdefault((ant_type, frequency_MHz, generation, ci),
+            []).append((
+                float(row["sites_per_km2"]),
+                float(row["capacity_mbps_km2"])
+            ))
+
+    for key, value_list in capacity_lut.items():
+        value_list.sort(key=lambda tup: tup[0])
+
+    return capacity_lut
+
+
+def compile_capacity_lut(capacity_lut, path, source=None):
+    """
+    Write an indexed capacity lookup table in a binary form which can be
+    memory mapped by `load_capacity_lut`.
+
+    All site density to capacity pairs are held in one float64 .npy
+    array, named after a hash of its contents, with rows for each key
+    kept together and sorted by site density. The .json index at `path`
+    holds the name of the array and the rows of each key. The index is
+    replaced last, so readers always see a complete table.
+
+    Parameters
+    ----------
+    capacity_lut : dict
+        Indexed lookup table, see `index_capacity_lut`.
+    path : string
+        Path of the .json index.
+    source : list
+        Optional signature of the table the index was compiled from,
+        returned by `read_capacity_lut_source`.
+
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    index = []
+    arrays = []
+    start = 0
+
+    for key in sorted(capacity_lut):
+        values = np.asarray(capacity_lut[key], dtype=np.float64).reshape(-1, 2)
+        arrays.append(values)
+        index.append(list(key) + [start, start + len(values)])
+        start += len(values)
+
+    if len(arrays) > 0:
+        data = np.ascontiguousarray(np.concatenate(arrays))
+    else:
+        data = np.zeros((0, 2), dtype=np.float64)
+
+    data_filename = '{}.{}.npy'.format(
+        os.path.splitext(os.path.basename(path))[0],
+        hashlib.sha256(data.tobytes()).hexdigest()[:16])
+    data_path = os.path.join(directory, data_filename)
+
+    previous = None
+    if os.path.exists(path):
+        with open(path, 'r') as index_file:
+            previous = json.load(index_file).get('data')
+
+    with open(data_path + '.tmp', 'wb') as data_file:
+        np.save(data_file, data)
+    os.replace(data_path + '.tmp', data_path)
+
+    with open(path + '.tmp', 'w') as index_file:
+        json.dump({'data': data_filename, 'source': source, 'keys': index},
+            index_file)
+    os.replace(path + '.tmp', path)
+
+    if previous is not None and previous != data_filename:
+        try:
+            os.remove(os.path.join(directory, previous))
+        except OSError:
+            pass
+
+
+def read_capacity_lut_source(path):
+    """
+    Return the source signature stored by `compile_capacity_lut`, or
+    None if there is no compiled table at `path`.
+
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r') as index_file:
+        return json.load(index_file).get('source')
+
+
+def load_capacity_lut(path):
+    """
+    Load a table written by `compile_capacity_lut`.
+
+    The array is memory mapped read only, so processes loading the same
+    table share one copy and nothing is parsed.
+
+    Parameters
+    ----------
+    path : string
+        Path of the .json index.
+
+    Returns
+    -------
+    capacity_lut : dict
+        Arrays of site density to capacity pairs, sorted by site
+        density, keyed by antenna type, frequency (MHz), generation and
+        confidence interval.
+
+    """
+    with open(path, 'r') as index_file:
+        index = json.load(index_file)
+
+    if len(index['keys']) == 0:
+        return {}
+
+    data = np.load(os.path.join(os.path.dirname(path), index['data']),
+        mmap_mode='r')
+
+    return {
+        tuple(entry[:4]): data[entry[4]:entry[5]]
+        for entry in index['keys']
+    }
+
+
+class LockFile(object):
+    """
+    A lock shared between processes, held by creating a lock file.
+
+    Creating the file with O_EXCL is atomic on local and network
+    filesystems, on any platform. A lock file older than `timeout`
+    seconds is taken to be left by a process which died, and is
+    replaced.
+
+    Parameters
+    ----------
+    path : string
+        Path of the lock file.
+    timeout : float
+        Seconds to wait for the lock before replacing it.
+    interval : float
+        Seconds between attempts to take the lock.
+
+    """
+    def __init__(self, path, timeout=3600, interval=0.1):
+
+        self.path = path
+        self.timeout = timeout
+        self.interval = interval
+
+
+    def __enter__(self):
+
+        while True:
+            try:
+                descriptor = os.open(self.path,
+                    os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(descriptor, str(os.getpid()).encode('utf-8'))
+                os.close(descriptor)
+                return self
+            except FileExistsError:
+                try:
+                    age = time.time() - os.path.getmtime(self.path)
+                except OSError:
+                    continue
+                if age > self.timeout:
+                    try:
+                        os.remove(self.path)
+                    except OSError:
+                        pass
+                    continue
+                time.sleep(self.interval)
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class CapacityOracle(object):
+    """
+    Capacity lookups which simulate missing lookup table points on
+    demand.
+
+    The oracle can be used in place of the capacity lookup table dict,
+    e.g. with `lookup_capacity` or `find_site_density`. Keys are served
+    from the precomputed table, then a per process LRU cache, then the
+    on-disk cache. On a miss, `simulate` is run for the key's carrier
+    and confidence interval over all environments and site radii, and
+    the indexed result is stored in the on-disk cache. A `LockFile` per
+    key ensures only one process simulates each key.
+
+    Parameters
+    ----------
+    directory : string
+        Folder of the on-disk cache, one .npy file per key.
+    simulate : function
+        Called as `simulate(site_radii, ant_type, carrier,
+        confidence_interval)`, returning lookup table rows, e.g.
+        `simulate_capacity_points` in scripts/sim.py.
+    carriers : list of tuples
+        Frequency (GHz), bandwidth (MHz), generation and transmission
+        type of each carrier which can be simulated.
+    site_radii : dict
+        Radii of site areas in meters, keyed by environment.
+    capacity_lut : dict
+        Optional precomputed lookup table, see `index_capacity_lut`.
+    cache_size : int
+        Number of keys held in memory.
+    timeout : float
+        Seconds to wait for another process simulating the same key.
+
+    """
+    def __init__(self, directory, simulate, carriers, site_radii,
+        capacity_lut=None, cache_size=128, timeout=3600):
+
+        self.directory = directory
+        self.simulate = simulate
+        self.carriers = {
+            (str(int(float(carrier[0]) * 1e3)), str(carrier[2])): carrier
+            for carrier in carriers
+        }
+        self.site_radii = site_radii
+        self.capacity_lut = capacity_lut if capacity_lut is not None else {}
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.cache = OrderedDict()
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+
+
+    def find_carrier(self, key):
+        """
+        Return the carrier which can be simulated for a key, or None.
+
+        """
+        if not isinstance(key, tuple) or len(key) != 4:
+            return None
+
+        return self.carriers.get((key[1], key[2]))
+
+
+    def path(self, key):
+        """
+        Return the path of a key in the on-disk cache.
+
+        """
+        return os.path.join(self.directory, '{}.npy'.format('_'.join(key)))
+
+
+    def __contains__(self, key):
+
+        return (key in self.capacity_lut or key in self.cache or
+            self.find_carrier(key) is not None)
+
+
+    def __getitem__(self, key):
+
+        if key in self.capacity_lut:
+            return self.capacity_lut[key]
+
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        if self.find_carrier(key) is None:
+            raise KeyError(key)
+
+        path = self.path(key)
+
+        if not os.path.exists(path):
+            with LockFile(path + '.lock', self.timeout):
+                #another process may have simulated the key while waiting
+                if not os.path.exists(path):
+                    self.store(key, path)
+
+        value = np.load(path)
+
+        self.cache[key] = value
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return value
+
+
+    def store(self, key, path):
+        """
+        Simulate a key and write it to the on-disk cache.
+
+        The confidence interval of the key may be written as an integer
+        or a float (e.g. '50' or '50.0'), and is matched by value. A
+        KeyError is raised if the simulated rows do not hold the key,
+        e.g. as no site radius has a positive capacity.
+
+        """
+        confidence_interval = float(key[3])
+        if confidence_interval.is_integer():
+            confidence_interval = int(confidence_interval)
+
+        rows = self.simulate(self.site_radii, key[0], self.find_carrier(key),
+            confidence_interval)
+
+        values = None
+        for (ant_type, frequency, generation, ci), value in \
+            index_capacity_lut(rows).items():
+            if (ant_type, frequency, generation) == key[:3] and \
+                float(ci) == confidence_interval:
+                values = value
+
+        if values is None:
+            raise KeyError(key)
+
+        values = np.asarray(values, dtype=np.float64).reshape(-1, 2)
+
+        with open(path + '.tmp', 'wb') as cache_file:
+            np.save(cache_file, values)
+        os.replace(path + '.tmp', path)
+
+
 def interpolate(x0, y0, x1, y1, x):
     """
     Linear interpolation between two values.
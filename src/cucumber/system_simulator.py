@@ -7,15 +7,207 @@ Author: Edward Oughton
 Date: Adapted January 2022
 
 """
+import os
+import json
+import time
+import functools
+from contextlib import contextmanager, nullcontext
 from shapely.geometry import shape, Point, LineString
 import numpy as np
 from itertools import tee
 from collections import OrderedDict
 
-from cucumber.path_loss import path_loss_calculator, lognormal_dist_values
+from cucumber.path_loss import (path_loss_calculator,
+    path_loss_calculator_vectorized, lognormal_dist_values,
+    building_penetration_loss)
 
 np.random.seed(42)
 
+#compiled spectral efficiency lookups, keyed by generation and table rows
+SPECTRAL_EFFICIENCY_LOOKUPS = {}
+
+#default shadow fading standard deviation (dB) for each environment, taken
+#from the NLOS scenarios of ETSI TR 138.901 (UMa for urban, RMa otherwise)
+SHADOW_FADING_STD = {
+    'urban': 6,
+    'suburban': 8,
+    'rural': 8,
+}
+
+#default shadow fading decorrelation distance (m) for each environment,
+#from the same NLOS scenarios of ETSI TR 138.901
+SHADOW_FADING_DECORRELATION = {
+    'urban': 50,
+    'suburban': 120,
+    'rural': 120,
+}
+
+#no-op stage used when instrumentation is disabled
+NO_STAGE = nullcontext()
+
+
+class Instrumentation(object):
+    """
+
+    Wall time, call counts and items processed for each stage of the
+    simulation.
+
+    Stage times include any stages nested within them, e.g. the path
+    loss of interfering links is also part of the `interference` stage.
+
+    """
+    def __init__(self):
+        self.stages = OrderedDict()
+
+
+    @contextmanager
+    def stage(self, name, items=1):
+        """
+
+        Time the enclosed block as one call of a stage, processing
+        `items` (e.g. receivers or links).
+
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, items)
+
+
+    def record(self, name, seconds, items=1, calls=1):
+        """
+
+        Add a timed call to a stage.
+
+        """
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'calls': 0, 'seconds': 0.0,
+                'items': 0}
+
+        stage['calls'] += calls
+        stage['seconds'] += seconds
+        stage['items'] += int(items)
+
+
+    def merge(self, other):
+        """
+
+        Add the stages of another `Instrumentation`.
+
+        """
+        for name, stage in other.stages.items():
+            self.record(name, stage['seconds'], stage['items'],
+                stage['calls'])
+
+
+    def reset(self):
+        """
+
+        Clear all stages.
+
+        """
+        self.stages = OrderedDict()
+
+
+    def summary(self):
+        """
+
+        Returns
+        -------
+        summary : dict
+            Calls, seconds, items and items per second of each stage.
+
+        """
+        summary = OrderedDict()
+
+        for name, stage in self.stages.items():
+            summary[name] = dict(stage)
+            summary[name]['items_per_second'] = (
+                stage['items'] / stage['seconds'] if stage['seconds'] > 0
+                else None
+            )
+
+        return summary
+
+
+    def write_json(self, path, **metadata):
+        """
+
+        Write the summary, with any metadata (e.g. the sweep task), to
+        a .json file.
+
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        with open(path, 'w') as json_file:
+            json.dump({'metadata': metadata, 'stages': self.summary()},
+                json_file, indent=2)
+
+
+#process-wide instrumentation shared by new managers, or None if disabled
+INSTRUMENTATION = (
+    Instrumentation()
+    if os.environ.get('CUCUMBER_INSTRUMENT', '') not in ('', '0')
+    else None
+)
+
+
+def enable_instrumentation(enabled=True):
+    """
+
+    Enable or disable the process-wide instrumentation used by managers
+    created afterwards. Also enabled by setting the CUCUMBER_INSTRUMENT
+    environment variable.
+
+    Returns
+    -------
+    instrumentation : Instrumentation
+        The process-wide instrumentation, or None if disabled.
+
+    """
+    global INSTRUMENTATION
+
+    if not enabled:
+        INSTRUMENTATION = None
+    elif INSTRUMENTATION is None:
+        INSTRUMENTATION = Instrumentation()
+
+    return INSTRUMENTATION
+
+
+def get_instrumentation():
+    """
+
+    Return the process-wide instrumentation, or None if disabled.
+
+    """
+    return INSTRUMENTATION
+
+
+def instrumented(name, items=None):
+    """
+
+    Decorate a `SimulationManager` method to be timed as a stage when
+    the manager has instrumentation. `items` is called with the method
+    arguments to count the items processed (one by default).
+
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.instrumentation is None:
+                return method(self, *args, **kwargs)
+            count = 1 if items is None else items(self, *args, **kwargs)
+            with self.instrumentation.stage(name, count):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 class SimulationManager(object):
     """
 
@@ -23,40 +215,116 @@ class SimulationManager(object):
 
     Parameters
     ----------
-    transmitter : list of dicts
+    transmitter : list of dicts or TransmitterSet
         Contains a geojson dict for the transmitter site.
-    interfering_transmitters : list of dicts
+    interfering_transmitters : list of dicts or TransmitterSet
         Contains dicts for each interfering transmitter site.
-    receivers : list of dicts
+    receivers : list of dicts or ReceiverSet
         Contains a dict for each User Equipment (UE) receiver.
     site_area : list of dicts
         Contains geojson dict for the site area polygon.
     simulation_parameters : dict
         A dict containing all simulation parameters necessary.
+    geometry : SiteGeometry
+        Optional precomputed geometry for these transmitters and
+        receivers, e.g. shared from another manager for the same site
+        area. Computed on first use if not given.
+    instrumentation : Instrumentation
+        Optional collector of per stage timings. The process-wide
+        instrumentation is used if not given (see
+        `enable_instrumentation`), and stages are not timed if neither
+        is set.
 
     """
-    def __init__(self, transmitter, interfering_transmitters, ant_type,
-        receivers, site_area, simulation_parameters):
+    instrumentation = None
 
-        self.transmitter = Transmitter(transmitter[0], ant_type,
+    def __init__(self, transmitter, interfering_transmitters, ant_type,
+        receivers, site_area, simulation_parameters, geometry=None,
+        instrumentation=None):
+
+        if not isinstance(transmitter, TransmitterSet):
+            transmitter = TransmitterSet.from_geojson(transmitter, ant_type,
+                simulation_parameters)
+        if not isinstance(interfering_transmitters, TransmitterSet):
+            interfering_transmitters = TransmitterSet.from_geojson(
+                interfering_transmitters, ant_type, simulation_parameters)
+        if not isinstance(receivers, ReceiverSet):
+            receivers = ReceiverSet.from_geojson(receivers)
+
+        self.transmitter_set = transmitter
+        self.interferer_set = interfering_transmitters
+        self.receiver_set = receivers
+
+        self.transmitter = Transmitter(transmitter.to_geojson()[0], ant_type,
             simulation_parameters)
         self.interfering_transmitters = {}
-        self.receivers = {}
+        self._receivers = None
+        self._simulation_parameters = simulation_parameters
         self.site_area = SiteArea(site_area[0])
 
-        for interfering_transmitter in interfering_transmitters:
+        for interfering_transmitter in interfering_transmitters.to_geojson():
             site_id = interfering_transmitter['properties']["site_id"]
             site_object = InterferingTransmitter(
                 interfering_transmitter, ant_type, simulation_parameters
                 )
             self.interfering_transmitters[site_id] = site_object
 
-        for receiver in receivers:
-            receiver_id = receiver['properties']["ue_id"]
-            receiver = Receiver(receiver, simulation_parameters)
-            self.receivers[receiver_id] = receiver
+        self._geometry = geometry
+
+        if instrumentation is None:
+            instrumentation = INSTRUMENTATION
+        self.instrumentation = instrumentation
+
+
+    def stage(self, name, items=1):
+        """
+
+        Context manager timing a block as a stage, or doing nothing
+        without instrumentation.
+
+        """
+        if self.instrumentation is None:
+            return NO_STAGE
 
+        return self.instrumentation.stage(name, items)
 
+
+    @property
+    def receivers(self):
+        """
+
+        Receiver (UE) objects keyed by ue id, as used by the scalar
+        `estimate_link_budget`. Built from `receiver_set` on first use.
+
+        """
+        if self._receivers is None:
+            self._receivers = {}
+            for receiver in self.receiver_set.to_geojson():
+                receiver_id = receiver['properties']["ue_id"]
+                receiver = Receiver(receiver, self._simulation_parameters)
+                self._receivers[receiver_id] = receiver
+
+        return self._receivers
+
+
+    @property
+    def geometry(self):
+        """
+
+        Frequency-independent geometry of the site area, computed once
+        and reused by every carrier evaluated with this manager.
+
+        """
+        if self._geometry is None:
+            with self.stage('geometry', len(self.receiver_set)):
+                self._geometry = SiteGeometry(self.transmitter_set,
+                    self.interferer_set, self.receiver_set, self.site_area)
+
+        return self._geometry
+
+
+    @instrumented('link_budget',
+        lambda self, *args, **kwargs: len(self.receiver_set))
     def estimate_link_budget(self, frequency, bandwidth,
         generation, ant_type, tranmission_type, environment,
         modulation_and_coding_lut, simulation_parameters):
@@ -129,32 +397,652 @@ class SimulationManager(object):
                 bandwidth, spectral_efficiency)
             )
 
-            results.append({
-                'id': receiver.id,
-                'path_loss': path_loss,
-                'r_model': r_model,
-                # 'type_of_sight': type_of_sight,
-                'ave_inf_pl': ave_inf_pl,
-                'received_power': f_received_power,
-                'distance': r_distance,
-                'interference': np.log10(f_interference),
-                'i_model': i_model,
-                'network_load': simulation_parameters['network_load'],
-                'ave_distance': ave_distance,
-                'noise': f_noise,
-                'i_plus_n': np.log10(i_plus_n),
-                'tranmission_type': tranmission_type,
-                'sinr': sinr,
-                'spectral_efficiency': spectral_efficiency,
-                'capacity_mbps': capacity_mbps,
-                'capacity_mbps_km2': capacity_mbps_km2,
-                'receiver_x': receiver.coordinates[0],
-                'receiver_y': receiver.coordinates[1],
-                })
+            results.append({
+                'id': receiver.id,
+                'path_loss': path_loss,
+                'r_model': r_model,
+                # 'type_of_sight': type_of_sight,
+                'ave_inf_pl': ave_inf_pl,
+                'received_power': f_received_power,
+                'distance': r_distance,
+                'interference': np.log10(f_interference),
+                'i_model': i_model,
+                'network_load': simulation_parameters['network_load'],
+                'ave_distance': ave_distance,
+                'noise': f_noise,
+                'i_plus_n': np.log10(i_plus_n),
+                'tranmission_type': tranmission_type,
+                'sinr': sinr,
+                'spectral_efficiency': spectral_efficiency,
+                'capacity_mbps': capacity_mbps,
+                'capacity_mbps_km2': capacity_mbps_km2,
+                'receiver_x': receiver.coordinates[0],
+                'receiver_y': receiver.coordinates[1],
+                })
+
+        return results
+
+
+    def estimate_link_budget_vectorized(self, frequency, bandwidth,
+        generation, ant_type, tranmission_type, environment,
+        modulation_and_coding_lut, simulation_parameters):
+        """
+
+        Array equivalent of `estimate_link_budget`.
+
+        Distances, path loss, received power, interference, SINR,
+        spectral efficiency and capacity are computed for all receivers
+        and interfering transmitters in a single pass, rather than
+        looping over each receiver. `estimate_link_budget` is kept as
+        the scalar reference implementation.
+
+        Parameters
+        ----------
+        frequency : float
+            The carrier frequency for the chosen spectrum band (GHz).
+        bandwidth : int
+            The bandwidth of the carrier frequency (MHz).
+        generation : string
+            The technology generation type.
+        ant_type : str
+            Type of antenna (macro, small etc.).
+        tranmission_type : string
+            Transmission type (SISO, MIMO etc.).
+        environment : string
+            Either urban, suburban or rural.
+        modulation_and_coding_lut : dict
+            A lookup table containing modulation and coding rates,
+            spectral efficiencies and SINR estimates, or the output of
+            `compile_spectral_efficiency_lookups`.
+        simulation_parameters : dict
+            A dict containing all simulation parameters necessary.
+
+        Returns
+        -------
+        results : dict
+            Contains the same keys as each `estimate_link_budget` result,
+            with per-receiver metrics held as numpy arrays (ordered as
+            `self.receivers`) and constant fields held as scalars.
+
+        """
+        results = self.estimate_link_budget_carriers(
+            [(frequency, bandwidth, generation, tranmission_type)],
+            ant_type, environment, modulation_and_coding_lut,
+            simulation_parameters
+        )
+
+        return select_carrier(results, 0)
+
+
+    @instrumented('link_budget',
+        lambda self, carriers, *args, **kwargs:
+            len(carriers) * len(self.receiver_set))
+    def estimate_link_budget_carriers(self, carriers, ant_type, environment,
+        modulation_and_coding_lut, simulation_parameters, indoor=None):
+        """
+
+        Evaluate the link budget for several carriers in one call.
+
+        Path loss, noise and SINR are broadcast over receivers, interfering
+        transmitters and carriers, with all carriers sharing the site
+        geometry.
+
+        Parameters
+        ----------
+        carriers : list of tuples
+            Each tuple contains the frequency (GHz), bandwidth (MHz),
+            generation and transmission type of a carrier, as in the
+            `SPECTRUM_PORTFOLIO` of `scripts/sim.py`.
+        ant_type : str
+            Type of antenna (macro, small etc.).
+        environment : string
+            Either urban, suburban or rural.
+        modulation_and_coding_lut : dict
+            A lookup table containing modulation and coding rates,
+            spectral efficiencies and SINR estimates, or the output of
+            `compile_spectral_efficiency_lookups`.
+        simulation_parameters : dict
+            A dict containing all simulation parameters necessary.
+        indoor : numpy array
+            Boolean mask of indoor receivers, overriding the receivers'
+            own, so several indoor shares can be evaluated on the same
+            site geometry.
+
+        Returns
+        -------
+        results : dict
+            Per-carrier, per-receiver metrics have shape (carriers,
+            receivers). Receiver-only fields (coordinates, distances)
+            have shape (receivers,), and the carrier fields `frequency`,
+            `bandwidth`, `generation` and `tranmission_type` have shape
+            (carriers,). Use `select_carrier` to obtain the results of
+            a single carrier.
+
+        """
+        geometry = self.geometry
+
+        frequency = np.array([carrier[0] for carrier in carriers], dtype=float)
+        bandwidth = np.array([carrier[1] for carrier in carriers], dtype=float)
+        generation = np.array([carrier[2] for carrier in carriers])
+        tranmission_type = np.array([carrier[3] for carrier in carriers])
+
+        if indoor is None:
+            indoor = geometry.indoor
+
+        #(carriers, receivers)
+        r_distance = geometry.serving_distance
+
+        path_loss = self.estimate_path_loss_vectorized(
+            r_distance, frequency[:, np.newaxis], environment,
+            simulation_parameters, indoor
+        )
+
+        received_power = (self.transmitter_set.eirp -
+            path_loss -
+            geometry.misc_losses +
+            geometry.gain -
+            geometry.losses
+        )
+
+        noise = self.estimate_noise(bandwidth)[:, np.newaxis]
+
+        with self.stage('interference', len(carriers) *
+            len(self.interferer_set) * len(geometry.receiver_ids)):
+
+            interferers = self.select_interferers(frequency, noise, environment,
+                simulation_parameters)
+
+            #(carriers, receivers, interfering transmitters)
+            i_distance = geometry.interferer_distance[:, interferers]
+
+            i_path_loss = self.estimate_path_loss_vectorized(
+                i_distance, frequency[:, np.newaxis, np.newaxis], environment,
+                simulation_parameters, indoor[:, np.newaxis]
+            )
+
+            interference = (self.interferer_set.eirp -
+                i_path_loss -
+                geometry.misc_losses[:, np.newaxis] +
+                geometry.gain[:, np.newaxis] -
+                geometry.losses[:, np.newaxis]
+            )
+
+        raw_sum_of_interference, i_plus_n, sinr = \
+            self.estimate_sinr_vectorized(received_power, interference,
+            noise, simulation_parameters)
+
+        with self.stage('spectral_efficiency', len(carriers) *
+            len(geometry.receiver_ids)):
+            spectral_efficiency = np.zeros(sinr.shape)
+            for value in np.unique(generation):
+                mask = generation == value
+                spectral_efficiency[mask] = get_spectral_efficiency_lookup(
+                    modulation_and_coding_lut, value
+                )(sinr[mask])
+
+        capacity_mbps, capacity_mbps_km2 = (
+            self.estimate_average_capacity(
+            bandwidth[:, np.newaxis], spectral_efficiency)
+        )
+
+        with self.stage('results', len(carriers) *
+            len(geometry.receiver_ids)):
+            results = {
+                'id': geometry.receiver_ids,
+                'frequency': frequency,
+                'bandwidth': bandwidth,
+                'generation': generation,
+                'path_loss': path_loss,
+                'r_model': 'fspl',
+                'ave_inf_pl': i_path_loss.mean(axis=-1),
+                'received_power': received_power,
+                'distance': r_distance,
+                'interference': np.log10(raw_sum_of_interference),
+                'i_model': 'fspl',
+                'network_load': simulation_parameters['network_load'],
+                'ave_distance': i_distance.mean(axis=-1),
+                'noise': np.broadcast_to(noise, sinr.shape),
+                'i_plus_n': np.log10(i_plus_n),
+                'tranmission_type': tranmission_type,
+                'sinr': sinr,
+                'spectral_efficiency': spectral_efficiency,
+                'capacity_mbps': capacity_mbps,
+                'capacity_mbps_km2': capacity_mbps_km2,
+                'receiver_x': geometry.coordinates[:, 0],
+                'receiver_y': geometry.coordinates[:, 1],
+            }
+
+        return results
+
+
+    @instrumented('link_budget_monte_carlo',
+        lambda self, carriers, *args, **kwargs:
+            len(carriers) * len(self.receiver_set))
+    def estimate_link_budget_monte_carlo(self, carriers, ant_type,
+        environment, modulation_and_coding_lut, simulation_parameters,
+        iterations=None, chunk_size=10, indoor=None):
+        """
+
+        Evaluate the link budget for several carriers over Monte Carlo
+        iterations of log-normal shadow fading.
+
+        Each iteration draws an independent fading value (in dB) for
+        every receiver and every serving or interfering link, which is
+        added to the path loss. Iterations are evaluated `chunk_size` at
+        a time so memory stays bounded, and every iteration has its own
+        random stream, so results do not depend on the chunk size.
+
+        If the `shadow_fading_correlated` simulation parameter is set,
+        each iteration instead draws a spatially correlated field per
+        transmitter (see `ShadowFadingField`), so nearby receivers fade
+        together.
+
+        Indoor receivers also draw a normal variation of their building
+        penetration loss each iteration, with the standard deviation of
+        `building_penetration_loss`, shared by all links of a receiver.
+
+        Parameters
+        ----------
+        carriers : list of tuples
+            Each tuple contains the frequency (GHz), bandwidth (MHz),
+            generation and transmission type of a carrier.
+        ant_type : str
+            Type of antenna (macro, small etc.).
+        environment : string
+            Either urban, suburban or rural.
+        modulation_and_coding_lut : dict
+            A lookup table containing modulation and coding rates,
+            spectral efficiencies and SINR estimates, or the output of
+            `compile_spectral_efficiency_lookups`.
+        simulation_parameters : dict
+            A dict containing all simulation parameters necessary.
+        iterations : int
+            Number of Monte Carlo iterations. Defaults to the
+            `iterations` simulation parameter.
+        chunk_size : int
+            Number of iterations evaluated at once.
+        indoor : numpy array
+            Boolean mask of indoor receivers, overriding the receivers'
+            own.
+
+        Returns
+        -------
+        results : dict
+            The same layout as `estimate_link_budget_carriers`, with each
+            per-receiver metric averaged across iterations.
+
+        """
+        if iterations is None:
+            iterations = simulation_parameters['iterations']
+
+        geometry = self.geometry
+
+        frequency = np.array([carrier[0] for carrier in carriers], dtype=float)
+        bandwidth = np.array([carrier[1] for carrier in carriers], dtype=float)
+        generation = np.array([carrier[2] for carrier in carriers])
+        tranmission_type = np.array([carrier[3] for carrier in carriers])
+
+        if indoor is None:
+            indoor = geometry.indoor
+
+        #(carriers, receivers)
+        r_distance = geometry.serving_distance
+
+        path_loss = self.estimate_path_loss_vectorized(
+            r_distance, frequency[:, np.newaxis], environment,
+            simulation_parameters, indoor
+        )
+
+        noise = self.estimate_noise(bandwidth)[:, np.newaxis]
+
+        interferers = self.select_interferers(frequency, noise, environment,
+            simulation_parameters)
+
+        #(carriers, receivers, interfering transmitters)
+        i_distance = geometry.interferer_distance[:, interferers]
+
+        i_path_loss = self.estimate_path_loss_vectorized(
+            i_distance, frequency[:, np.newaxis, np.newaxis], environment,
+            simulation_parameters, indoor[:, np.newaxis]
+        )
+
+        std = simulation_parameters.get(
+            'shadow_fading_std_{}'.format(environment),
+            SHADOW_FADING_STD[environment]
+        )
+
+        streams = spawn_fading_streams(environment, iterations,
+            simulation_parameters)
+
+        if simulation_parameters.get('shadow_fading_correlated', False):
+            shadow_fading_field = ShadowFadingField(geometry.coordinates,
+                std, simulation_parameters.get(
+                    'shadow_fading_decorrelation_{}'.format(environment),
+                    SHADOW_FADING_DECORRELATION[environment]
+                )
+            )
+        else:
+            shadow_fading_field = None
+
+        #(carriers, receivers) spread of the building penetration loss
+        penetration_std = np.where(indoor,
+            building_penetration_loss(frequency, simulation_parameters)[1][
+                :, np.newaxis], 0.0)
+        penetration_varies = penetration_std.any()
+
+        #link budget without fading, shared by all iterations
+        received_power = (self.transmitter_set.eirp -
+            path_loss -
+            geometry.misc_losses +
+            geometry.gain -
+            geometry.losses
+        )
+
+        interference = (self.interferer_set.eirp -
+            i_path_loss -
+            geometry.misc_losses[:, np.newaxis] +
+            geometry.gain[:, np.newaxis] -
+            geometry.losses[:, np.newaxis]
+        )
+
+        #fading is independent of the carrier, so it is applied in the
+        #linear domain and broadcast over carriers
+        raw_received_power = 10**received_power
+        raw_interference = 10**interference
+        raw_noise = 10**noise
+
+        receivers, interferers = i_distance.shape
+
+        metrics = ['path_loss', 'received_power', 'interference', 'i_plus_n',
+            'sinr', 'spectral_efficiency', 'capacity_mbps', 'capacity_mbps_km2']
+        totals = {metric: np.zeros(path_loss.shape) for metric in metrics}
+
+        for start in range(0, iterations, chunk_size):
+
+            chunk = streams[start:start + chunk_size]
+
+            #(iterations, receivers, serving + interfering transmitters)
+            fading = np.empty((len(chunk), receivers, 1 + interferers))
+            #(iterations, receivers) standard normal penetration variation
+            penetration = np.zeros((len(chunk), receivers))
+            for idx, stream in enumerate(chunk):
+                rng = np.random.default_rng(stream)
+                if shadow_fading_field is None:
+                    fading[idx] = rng.normal(
+                        0, std, (receivers, 1 + interferers))
+                else:
+                    fading[idx] = shadow_fading_field(
+                        rng, 1 + interferers).T
+                if penetration_varies:
+                    penetration[idx] = rng.standard_normal(receivers)
+
+            raw_fading = 10**-fading
+
+            #(iterations, carriers, receivers), the same building loss
+            #applies to the serving and interfering links of a receiver
+            if penetration_varies:
+                penetration = penetration[:, np.newaxis, :] * penetration_std
+                raw_penetration = 10**-penetration
+            else:
+                penetration = penetration[:, np.newaxis, :]
+                raw_penetration = np.ones(penetration.shape)
+
+            sum_of_interference, i_plus_n, sinr = self.estimate_sinr_linear(
+                raw_received_power * raw_fading[:, np.newaxis, :, 0] *
+                    raw_penetration,
+                raw_interference * raw_fading[:, np.newaxis, :, 1:] *
+                    raw_penetration[..., np.newaxis],
+                raw_noise, simulation_parameters)
+
+            spectral_efficiency = np.zeros(sinr.shape)
+            for value in np.unique(generation):
+                mask = generation == value
+                spectral_efficiency[:, mask] = get_spectral_efficiency_lookup(
+                    modulation_and_coding_lut, value
+                )(sinr[:, mask])
+
+            capacity_mbps, capacity_mbps_km2 = (
+                self.estimate_average_capacity(
+                bandwidth[:, np.newaxis], spectral_efficiency)
+            )
+
+            fading_sum = fading[:, :, 0].sum(axis=0) + penetration.sum(axis=0)
+
+            totals['path_loss'] += len(chunk) * path_loss + fading_sum
+            totals['received_power'] += (
+                len(chunk) * received_power - fading_sum)
+            totals['interference'] += np.log10(
+                sum_of_interference).sum(axis=0)
+            totals['i_plus_n'] += np.log10(i_plus_n).sum(axis=0)
+            totals['sinr'] += sinr.sum(axis=0)
+            totals['spectral_efficiency'] += spectral_efficiency.sum(axis=0)
+            totals['capacity_mbps'] += capacity_mbps.sum(axis=0)
+            totals['capacity_mbps_km2'] += capacity_mbps_km2.sum(axis=0)
+
+        means = {metric: totals[metric] / iterations for metric in metrics}
+
+        return {
+            'id': geometry.receiver_ids,
+            'frequency': frequency,
+            'bandwidth': bandwidth,
+            'generation': generation,
+            'path_loss': means['path_loss'],
+            'r_model': 'fspl',
+            'ave_inf_pl': i_path_loss.mean(axis=-1),
+            'received_power': means['received_power'],
+            'distance': r_distance,
+            'interference': means['interference'],
+            'i_model': 'fspl',
+            'network_load': simulation_parameters['network_load'],
+            'ave_distance': i_distance.mean(axis=-1),
+            'noise': np.broadcast_to(noise, path_loss.shape),
+            'i_plus_n': means['i_plus_n'],
+            'tranmission_type': tranmission_type,
+            'sinr': means['sinr'],
+            'spectral_efficiency': means['spectral_efficiency'],
+            'capacity_mbps': means['capacity_mbps'],
+            'capacity_mbps_km2': means['capacity_mbps_km2'],
+            'receiver_x': geometry.coordinates[:, 0],
+            'receiver_y': geometry.coordinates[:, 1],
+        }
+
+
+    def select_interferers(self, frequency, noise, environment,
+        simulation_parameters):
+        """
+
+        Find the interfering transmitters which may be significant at any
+        receiver.
+
+        An interferer is pruned when its received power at the closest
+        receiver, which bounds its power at every receiver, is more than
+        `interference_pruning_dB` below the noise for all carriers. The
+        closest interferer is always kept. Without the parameter (or set
+        to None) all interferers are kept.
+
+        Parameters
+        ----------
+        frequency : numpy array
+            The carrier frequencies (GHz).
+        noise : numpy array
+            Received noise for each carrier in decibels, with shape
+            (carriers, 1).
+        environment : string
+            Either urban, suburban or rural.
+        simulation_parameters : dict
+            A dict containing all simulation parameters necessary.
+
+        Returns
+        -------
+        interferers : numpy array
+            Indices of the interfering transmitters to evaluate.
+
+        """
+        i_distance = self.geometry.interferer_distance
+
+        threshold = simulation_parameters.get('interference_pruning_dB')
+
+        if threshold is None or i_distance.shape[1] == 0:
+            return np.arange(i_distance.shape[1])
+
+        geometry = self.geometry
+
+        closest = i_distance.min(axis=0)
+
+        #(carriers, interfering transmitters), without building
+        #penetration loss so the power remains an upper bound
+        path_loss = self.estimate_path_loss_vectorized(
+            closest, np.asarray(frequency)[:, np.newaxis], environment,
+            simulation_parameters, indoor=False
+        )
+
+        max_interference = (self.interferer_set.eirp - path_loss +
+            (geometry.gain - geometry.losses - geometry.misc_losses).max()
+        )
+
+        #nan path loss (undefined regimes) is never pruned
+        significant = ~(max_interference < noise + threshold)
+        significant = significant.any(axis=0)
+        significant[np.argmin(closest)] = True
+
+        return np.flatnonzero(significant)
+
+
+    @instrumented('path_loss',
+        lambda self, distance, frequency, *args, **kwargs:
+            np.broadcast(distance, frequency).size)
+    def estimate_path_loss_vectorized(self, distance, frequency, environment,
+        simulation_parameters, indoor=None):
+        """
+
+        Calculate the path loss for an array of transmitter-receiver
+        distances.
+
+        Parameters
+        ----------
+        distance : numpy array
+            Straight line distances in meters.
+        frequency : float or numpy array
+            The carrier frequency for the chosen spectrum band (GHz),
+            or an array of frequencies which broadcasts against
+            `distance`.
+        environment : string
+            Either urban, suburban or rural.
+        simulation_parameters : dict
+            A dict containing all simulation parameters necessary.
+        indoor : numpy array
+            Boolean mask of indoor receivers, which broadcasts against
+            `distance` and selects the receivers with building
+            penetration loss. Defaults to indoor.
+
+        Returns
+        -------
+        path_loss : numpy array
+            Estimated path loss in decibels, with the broadcast shape of
+            `distance` and `frequency`.
+
+        """
+        path_loss, model = path_loss_calculator_vectorized(
+            distance,
+            frequency,
+            environment,
+            simulation_parameters,
+            indoor=indoor
+        )
+
+        return path_loss
+
+
+    @instrumented('sinr',
+        lambda self, received_power, *args, **kwargs: np.size(received_power))
+    def estimate_sinr_vectorized(self, received_power, interference, noise,
+        simulation_parameters):
+        """
+
+        Calculate the SINR for all receivers at once.
+
+        Matches `estimate_sinr`, keeping the strongest
+        `interference_max_sites` interfering transmitters for each
+        receiver.
+
+        Parameters
+        ----------
+        received_power : numpy array
+            UE received power in decibels, one value per receiver, with
+            any leading (e.g. carrier) axes.
+        interference : numpy array
+            Received interference power in decibels, with the shape of
+            `received_power` plus a last axis of interfering transmitters.
+        noise : float or numpy array
+            Received noise at the UE receiver in decibels, broadcastable
+            against `received_power`.
+        simulation_parameters : dict
+            A dict containing all simulation parameters necessary.
+
+        Returns
+        -------
+        raw_sum_of_interference : numpy array
+            Linear values of summed interference at each receiver.
+        i_plus_n : numpy array
+            Linear sum of interference plus noise at each receiver.
+        sinr : numpy array
+            Signal-to-Interference-plus-Noise-Ratio (SINR) in decibels.
+
+        """
+        return self.estimate_sinr_linear(10**received_power,
+            10**interference, 10**noise, simulation_parameters)
+
+
+    def estimate_sinr_linear(self, raw_received_power, raw_interference,
+        raw_noise, simulation_parameters):
+        """
+
+        Calculate the SINR from linear received, interference and noise
+        powers, keeping the strongest `interference_max_sites` interfering
+        transmitters (three by default, None for all) for each receiver.
+
+        Parameters
+        ----------
+        raw_received_power : numpy array
+            Linear UE received power, one value per receiver, with any
+            leading (e.g. carrier) axes.
+        raw_interference : numpy array
+            Linear received interference power, with the shape of
+            `raw_received_power` plus a last axis of interfering
+            transmitters.
+        raw_noise : float or numpy array
+            Linear received noise, broadcastable against
+            `raw_received_power`.
+        simulation_parameters : dict
+            A dict containing all simulation parameters necessary.
+
+        Returns
+        -------
+        raw_sum_of_interference : numpy array
+            Linear values of summed interference at each receiver.
+        i_plus_n : numpy array
+            Linear sum of interference plus noise at each receiver.
+        sinr : numpy array
+            Signal-to-Interference-plus-Noise-Ratio (SINR) in decibels.
+
+        """
+        max_sites = simulation_parameters.get('interference_max_sites', 3)
+        raw_interference = np.sort(raw_interference, axis=-1)[..., ::-1]
+        raw_interference = raw_interference[..., :max_sites]
+
+        network_load = simulation_parameters['network_load']
+        raw_sum_of_interference = (
+            raw_interference.sum(axis=-1) * (network_load/100)
+        )
+
+        i_plus_n = (raw_sum_of_interference + raw_noise)
+
+        sinr = np.round(np.log10(raw_received_power / i_plus_n), 2)
 
-        return results
+        return raw_sum_of_interference, i_plus_n, sinr
 
 
+    @instrumented('path_loss')
     def estimate_path_loss(self, receiver, frequency, environment,
         simulation_parameters, random_variation, generation):
         """
@@ -213,7 +1101,8 @@ class SimulationManager(object):
             frequency,
             environment,
             simulation_parameters,
-            random_variation
+            random_variation,
+            receiver.indoor
         )
 
         return path_loss, 'fspl', strt_distance#, type_of_sight
@@ -262,6 +1151,7 @@ class SimulationManager(object):
         return received_power
 
 
+    @instrumented('interference')
     def estimate_interference(self, receiver, frequency, environment,
         simulation_parameters, random_variation, generation):
         """
@@ -333,7 +1223,8 @@ class SimulationManager(object):
 
             path_loss, variation = path_loss_calculator(
                 interference_strt_distance, frequency, environment,
-                simulation_parameters, random_variation[index:index+1][0])
+                simulation_parameters, random_variation[index:index+1][0],
+                receiver.indoor)
 
             received_interference = self.estimate_received_power(
                 interfering_transmitter,
@@ -404,6 +1295,7 @@ class SimulationManager(object):
         return noise
 
 
+    @instrumented('sinr')
     def estimate_sinr(self, received_power, interference, noise,
         simulation_parameters):
         """
@@ -444,7 +1336,8 @@ class SimulationManager(object):
             interference_list.append(output_value)
 
         interference_list.sort(reverse=True)
-        interference_list = interference_list[:3]
+        interference_list = interference_list[
+            :simulation_parameters.get('interference_max_sites', 3)]
 
         network_load = simulation_parameters['network_load']
         i_summed = sum(interference_list)
@@ -461,21 +1354,27 @@ class SimulationManager(object):
         return received_power, raw_sum_of_interference, noise, i_plus_n, sinr
 
 
+    @instrumented('spectral_efficiency')
     def estimate_spectral_efficiency(self, sinr, generation,
         modulation_and_coding_lut):
         """
         Uses the SINR to determine spectral efficiency given the relevant
         modulation and coding scheme.
 
+        SINR values below the lowest threshold return 0, and values at
+        or above the highest threshold return the highest spectral
+        efficiency (see `SpectralEfficiencyLookup`).
+
         Parameters
         ----------
         sinr : float
             Signal-to-Interference-plus-Noise-Ratio (SINR) in decibels.
         generation : string
             Either 4G or 5G dependent on technology.
-        modulation_and_coding_lut : list of tuples
+        modulation_and_coding_lut : dict
             A lookup table containing modulation and coding rates,
-            spectral efficiencies and SINR estimates.
+            spectral efficiencies and SINR estimates, or the output of
+            `compile_spectral_efficiency_lookups`.
 
         Returns
         -------
@@ -483,30 +1382,13 @@ class SimulationManager(object):
             Efficiency of information transfer in Bps/Hz
 
         """
-        lookup = modulation_and_coding_lut[generation]
-
-        spectral_efficiency = 0.1
-        for lower, upper in pairwise(lookup):
-            if lower[0] and upper[0] == generation:
-
-                lower_sinr = lower[6]
-                upper_sinr = upper[6]
-
-                if sinr >= lower_sinr and sinr < upper_sinr:
-                    spectral_efficiency = lower[5]
-                    return spectral_efficiency
-
-                highest_value = lookup[-1]
-
-                if sinr >= highest_value[6]:
-                    spectral_efficiency = highest_value[5]
-                    return spectral_efficiency
+        lookup = get_spectral_efficiency_lookup(
+            modulation_and_coding_lut, generation
+        )
 
-                lowest_value = lookup[0]
+        spectral_efficiency = float(lookup(sinr))
 
-                if sinr < lowest_value[5]:
-                    spectral_efficiency = 0
-                    return spectral_efficiency
+        return spectral_efficiency
 
 
     def estimate_average_capacity(self, bandwidth, spectral_efficiency):
@@ -660,6 +1542,219 @@ class Receiver(object):
         self.indoor = data['properties']['indoor']
 
 
+class ReceiverSet(object):
+    """
+
+    Struct-of-arrays container for receivers (UE).
+
+    Each attribute is a numpy column with one element per receiver,
+    avoiding a Python object and geojson dict per receiver.
+
+    Parameters
+    ----------
+    coordinates : array_like
+        Receiver coordinates with shape (receivers, 2).
+    ue_height : array_like or float
+        Height of each receiver in meters.
+    gain : array_like or float
+        Receiver antenna gain in decibels.
+    losses : array_like or float
+        Receiver losses in decibels.
+    misc_losses : array_like or float
+        Miscellaneous receiver losses in decibels.
+    indoor : array_like or bool
+        Indicates if each user is indoor (True) or outdoor (False).
+    ids : array_like
+        Optional receiver ids. Defaults to `id_0`, `id_1` etc.
+
+    """
+    def __init__(self, coordinates, ue_height, gain, losses, misc_losses,
+        indoor, ids=None):
+
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
+        length = len(self.coordinates)
+
+        self.ue_height = self._column(ue_height, length, float)
+        self.gain = self._column(gain, length, float)
+        self.losses = self._column(losses, length, float)
+        self.misc_losses = self._column(misc_losses, length, float)
+        self.indoor = self._column(indoor, length, bool)
+
+        self._ids = None if ids is None else np.asarray(ids)
+
+
+    def __len__(self):
+        return len(self.coordinates)
+
+
+    @staticmethod
+    def _column(value, length, dtype):
+        column = np.asarray(value, dtype=dtype)
+        if column.ndim == 0:
+            return np.full(length, column, dtype=dtype)
+        return column.reshape(length)
+
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = np.char.add(
+                'id_', np.arange(len(self)).astype(str)
+            )
+        return self._ids
+
+
+    @classmethod
+    def from_parameters(cls, coordinates, indoor, simulation_parameters):
+        """
+
+        Create receivers with the default receiver characteristics.
+
+        Parameters
+        ----------
+        coordinates : array_like
+            Receiver coordinates with shape (receivers, 2).
+        indoor : array_like or bool
+            Indicates if each user is indoor (True) or outdoor (False).
+        simulation_parameters : dict
+            A dict containing all simulation parameters necessary.
+
+        """
+        return cls(
+            coordinates,
+            float(simulation_parameters['rx_height']),
+            simulation_parameters['rx_gain'],
+            simulation_parameters['rx_losses'],
+            simulation_parameters['rx_misc_losses'],
+            indoor
+        )
+
+
+    @classmethod
+    def from_geojson(cls, receivers):
+        """
+
+        Create receivers from a list of geojson receiver dicts.
+
+        """
+        properties = [receiver['properties'] for receiver in receivers]
+
+        return cls(
+            [receiver['geometry']['coordinates'] for receiver in receivers],
+            [prop['ue_height'] for prop in properties],
+            [prop['gain'] for prop in properties],
+            [prop['losses'] for prop in properties],
+            [prop['misc_losses'] for prop in properties],
+            [prop['indoor'] for prop in properties],
+            ids=[prop['ue_id'] for prop in properties]
+        )
+
+
+    def to_geojson(self):
+        """
+
+        Convert receivers back to a list of geojson receiver dicts.
+
+        """
+        output = []
+
+        for idx, receiver_id in enumerate(self.ids.tolist()):
+            output.append({
+                'type': "Feature",
+                'geometry': {
+                    "type": "Point",
+                    "coordinates": self.coordinates[idx].tolist(),
+                },
+                'properties': {
+                    'ue_id': receiver_id,
+                    "misc_losses": float(self.misc_losses[idx]),
+                    "gain": float(self.gain[idx]),
+                    "losses": float(self.losses[idx]),
+                    "ue_height": float(self.ue_height[idx]),
+                    "indoor": bool(self.indoor[idx]),
+                }
+            })
+
+        return output
+
+
+class TransmitterSet(object):
+    """
+
+    Struct-of-arrays container for transmitters of one antenna type.
+
+    Parameters
+    ----------
+    coordinates : array_like
+        Transmitter coordinates with shape (transmitters, 2).
+    ant_type : str
+        Type of antenna (macro, micro etc.).
+    simulation_parameters : dict
+        A dict containing all simulation parameters necessary.
+    ids : list
+        Optional site ids. Defaults to 0, 1, 2 etc.
+
+    """
+    def __init__(self, coordinates, ant_type, simulation_parameters,
+        ids=None):
+
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self.ant_type = ant_type
+        self.ids = list(range(len(self.coordinates))) if ids is None \
+            else list(ids)
+
+        self.ant_height = float(
+            simulation_parameters['tx_{}_baseline_height'.format(ant_type)])
+        self.power = float(simulation_parameters['tx_{}_power'.format(ant_type)])
+        self.gain = float(simulation_parameters['tx_{}_gain'.format(ant_type)])
+        self.losses = float(
+            simulation_parameters['tx_{}_losses'.format(ant_type)])
+
+        #Equivalent Isotropically Radiated Power (EIRP)
+        self.eirp = self.power + self.gain - self.losses
+
+
+    def __len__(self):
+        return len(self.coordinates)
+
+
+    @classmethod
+    def from_geojson(cls, transmitters, ant_type, simulation_parameters):
+        """
+
+        Create transmitters from a list of geojson site dicts.
+
+        """
+        return cls(
+            [site['geometry']['coordinates'] for site in transmitters],
+            ant_type,
+            simulation_parameters,
+            ids=[site['properties']['site_id'] for site in transmitters]
+        )
+
+
+    def to_geojson(self):
+        """
+
+        Convert transmitters back to a list of geojson site dicts.
+
+        """
+        return [
+            {
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': tuple(self.coordinates[idx].tolist()),
+                },
+                'properties': {
+                    'site_id': site_id
+                }
+            }
+            for idx, site_id in enumerate(self.ids)
+        ]
+
+
 class SiteArea(object):
     """
 
@@ -684,6 +1779,367 @@ class SiteArea(object):
         return area
 
 
+class SiteGeometry(object):
+    """
+
+    Frequency-independent geometry of a site area.
+
+    Holds the receiver to transmitter distances and the receiver
+    attributes as arrays. None of these depend on the carrier, so a
+    single instance can be shared by every carrier simulated for the
+    same site area.
+
+    Parameters
+    ----------
+    transmitter : TransmitterSet
+        Contains the serving transmitter.
+    interfering_transmitters : TransmitterSet
+        Contains the interfering transmitters.
+    receivers : ReceiverSet
+        Contains the receivers (UE).
+    site_area : object
+        Site area object.
+
+    """
+    def __init__(self, transmitter, interfering_transmitters, receivers,
+        site_area):
+
+        self.site_area_id = site_area.id
+        self.area = site_area.area
+
+        self.receiver_ids = receivers.ids
+        self.coordinates = receivers.coordinates
+        self.gain = receivers.gain
+        self.losses = receivers.losses
+        self.misc_losses = receivers.misc_losses
+        self.indoor = receivers.indoor
+
+        self.transmitter_coordinates = transmitter.coordinates[0]
+        self.interferer_coordinates = interfering_transmitters.coordinates
+
+        #matches the 20 m minimum distance of `estimate_path_loss`
+        self.serving_distance = np.maximum(
+            self.distance_to(self.transmitter_coordinates[np.newaxis, :])[:, 0],
+            20
+        )
+
+        #(receivers, interfering transmitters)
+        self.interferer_distance = self.distance_to(
+            self.interferer_coordinates
+        )
+
+
+    def distance_to(self, coordinates):
+        """
+
+        Straight line distance from every receiver to each point.
+
+        Parameters
+        ----------
+        coordinates : numpy array
+            Point coordinates with shape (points, 2).
+
+        Returns
+        -------
+        distance : numpy array
+            Distances in meters with shape (receivers, points).
+
+        """
+        return np.sqrt(
+            (self.coordinates[:, 0:1] - coordinates[:, 0])**2 +
+            (self.coordinates[:, 1:2] - coordinates[:, 1])**2
+        )
+
+
+class SpectralEfficiencyLookup(object):
+    """
+
+    Precompiled SINR to spectral efficiency lookup for one generation.
+
+    The SINR thresholds of the modulation and coding table are held as a
+    sorted array, so whole arrays of SINR values can be mapped to spectral
+    efficiencies with a binary search. A SINR value falls into the band
+    of the highest threshold it reaches. Values below the lowest
+    threshold return 0 and values at or above the highest threshold
+    return the highest spectral efficiency.
+
+    Parameters
+    ----------
+    lookup : list of tuples
+        Modulation and coding rows for a single generation, each
+        containing the spectral efficiency (index 5) and the SINR
+        threshold (index 6).
+
+    """
+    def __init__(self, lookup):
+
+        lookup = sorted(lookup, key=lambda row: row[6])
+
+        self.sinr = np.array([row[6] for row in lookup], dtype=float)
+        self.spectral_efficiency = np.array(
+            [row[5] for row in lookup], dtype=float
+        )
+
+
+    def __call__(self, sinr):
+        """
+
+        Map SINR values to spectral efficiencies.
+
+        Parameters
+        ----------
+        sinr : array_like
+            Signal-to-Interference-plus-Noise-Ratio (SINR) in decibels.
+
+        Returns
+        -------
+        spectral_efficiency : numpy array
+            Efficiency of information transfer in Bps/Hz, with the
+            shape of `sinr`. Missing (nan) SINR values return nan.
+
+        """
+        sinr = np.asarray(sinr, dtype=float)
+
+        idx = np.searchsorted(self.sinr, sinr, side='right') - 1
+
+        spectral_efficiency = np.where(
+            idx < 0, 0.0, self.spectral_efficiency[np.maximum(idx, 0)]
+        )
+
+        return np.where(np.isnan(sinr), np.nan, spectral_efficiency)
+
+
+def compile_spectral_efficiency_lookups(modulation_and_coding_lut):
+    """
+
+    Build a `SpectralEfficiencyLookup` for each generation.
+
+    Parameters
+    ----------
+    modulation_and_coding_lut : dict
+        A lookup table containing modulation and coding rates,
+        spectral efficiencies and SINR estimates, keyed by generation.
+
+    Returns
+    -------
+    lookups : dict
+        Contains a `SpectralEfficiencyLookup` for each generation.
+
+    """
+    return {
+        generation: SpectralEfficiencyLookup(lookup)
+        for generation, lookup in modulation_and_coding_lut.items()
+    }
+
+
+def get_spectral_efficiency_lookup(modulation_and_coding_lut, generation):
+    """
+
+    Return the compiled lookup for a generation, building it from the
+    raw modulation and coding table if it has not been compiled.
+
+    Parameters
+    ----------
+    modulation_and_coding_lut : dict
+        Either the raw modulation and coding table or the output of
+        `compile_spectral_efficiency_lookups`.
+    generation : string
+        Either 4G or 5G dependent on technology.
+
+    Returns
+    -------
+    lookup : SpectralEfficiencyLookup
+        The lookup for the requested generation.
+
+    """
+    lookup = modulation_and_coding_lut[generation]
+
+    if isinstance(lookup, SpectralEfficiencyLookup):
+        return lookup
+
+    key = (generation, tuple(tuple(row) for row in lookup))
+
+    if key not in SPECTRAL_EFFICIENCY_LOOKUPS:
+        SPECTRAL_EFFICIENCY_LOOKUPS[key] = SpectralEfficiencyLookup(lookup)
+
+    return SPECTRAL_EFFICIENCY_LOOKUPS[key]
+
+
+CARRIER_FIELDS = ['frequency', 'bandwidth', 'generation', 'tranmission_type']
+
+
+def select_carrier(results, index):
+    """
+
+    Take the results of a single carrier from the output of
+    `SimulationManager.estimate_link_budget_carriers`.
+
+    Parameters
+    ----------
+    results : dict
+        Multi-carrier results.
+    index : int
+        Position of the carrier in the list of carriers.
+
+    Returns
+    -------
+    results : dict
+        Results with the same layout as
+        `SimulationManager.estimate_link_budget_vectorized`.
+
+    """
+    output = {}
+
+    for key, value in results.items():
+        if key in CARRIER_FIELDS:
+            if key == 'tranmission_type':
+                output[key] = str(value[index])
+            continue
+        if np.ndim(value) == 2:
+            output[key] = value[index]
+        else:
+            output[key] = value
+
+    return output
+
+
+class ShadowFadingField(object):
+    """
+
+    Generator of spatially correlated log-normal shadow fading over a
+    set of receivers.
+
+    Fields follow the Gudmundson model, a normal field in decibels with
+    exponential autocorrelation exp(-d / decorrelation_distance). They
+    are synthesised on a regular grid covering the receivers by
+    filtering complex white noise in the frequency domain, which costs
+    O(N log N) in the number of grid cells for every two fields.
+
+    As the FFT treats the grid as periodic, each axis is padded by five
+    decorrelation distances, or by its own length if that is less, so
+    the grid is at most doubled as in a circulant embedding. Receivers
+    closer than half the padded grid keep their true distance, and
+    receivers further apart are at least five decorrelation distances
+    apart across the wrap, where the correlation is below 1%. Each
+    receiver takes the value of its nearest grid cell. The grid spacing
+    is half the mean spacing of the receivers, but no finer than a
+    quarter of the decorrelation distance.
+
+    Parameters
+    ----------
+    coordinates : numpy array
+        Receiver coordinates in meters with shape (receivers, 2).
+    std : float
+        Standard deviation of the shadow fading (dB).
+    decorrelation_distance : float
+        Distance (m) over which the correlation falls to 1/e.
+    max_cells : int
+        Upper limit on the grid cells along each axis.
+
+    """
+    def __init__(self, coordinates, std, decorrelation_distance,
+        max_cells=256):
+
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
+        origin = coordinates.min(axis=0)
+        extent = coordinates.max(axis=0) - origin
+
+        #half the mean receiver spacing resolves the receivers, and finer
+        #grids than a quarter of the decorrelation distance add nothing
+        spacing = max(
+            decorrelation_distance / 4,
+            np.sqrt(np.prod(np.maximum(extent, 1)) / len(coordinates)) / 2,
+            extent.max() / max_cells,
+        )
+        cells = np.floor(extent / spacing).astype(int) + 1
+        padding = int(np.ceil(5 * decorrelation_distance / spacing))
+        self.shape = tuple(
+            int(size) for size in cells + np.minimum(cells, padding))
+
+        #distances on the periodic grid, wrapping at each edge
+        x_offset, y_offset = (
+            np.minimum(np.arange(size), size - np.arange(size)) * spacing
+            for size in self.shape
+        )
+        distance = np.hypot(x_offset[:, np.newaxis], y_offset[np.newaxis, :])
+        covariance = std**2 * np.exp(-distance / decorrelation_distance)
+
+        #the covariance is symmetric, so its spectrum is real
+        spectrum = np.fft.fft2(covariance).real
+        self.filter = np.sqrt(np.maximum(spectrum, 0) * spectrum.size)
+
+        cell = np.rint((coordinates - origin) / spacing).astype(int)
+        self.index = np.ravel_multi_index(cell.T, self.shape)
+        self.spacing = spacing
+
+
+    def __len__(self):
+
+        return len(self.index)
+
+
+    def __call__(self, rng, count=1):
+        """
+
+        Draw independent shadow fading fields and sample them at the
+        receivers.
+
+        Parameters
+        ----------
+        rng : numpy Generator
+            Source of the white noise.
+        count : int
+            Number of independent fields, e.g. one per transmitter.
+
+        Returns
+        -------
+        fading : numpy array
+            Shadow fading in decibels with shape (count, receivers).
+
+        """
+        #filtered complex white noise gives two independent fields, in
+        #the real and imaginary parts of its inverse transform
+        noise = rng.standard_normal((2, (count + 1) // 2) + self.shape)
+
+        fields = np.fft.ifft2(
+            (noise[0] + 1j * noise[1]) * self.filter
+        ).reshape(-1, self.filter.size)
+
+        fields = np.concatenate([fields.real, fields.imag])[:count]
+
+        return fields[:, self.index]
+
+
+def spawn_fading_streams(environment, iterations, simulation_parameters):
+    """
+
+    Derive one independent random stream per Monte Carlo iteration from
+    the seed values in the simulation parameters.
+
+    Parameters
+    ----------
+    environment : string
+        Either urban, suburban or rural.
+    iterations : int
+        Number of Monte Carlo iterations.
+    simulation_parameters : dict
+        A dict containing all simulation parameters necessary.
+
+    Returns
+    -------
+    streams : list
+        One numpy SeedSequence per iteration.
+
+    """
+    entropy = [
+        simulation_parameters['seed_value'],
+        simulation_parameters['seed_value2_{}'.format(environment)],
+    ]
+
+    return np.random.SeedSequence(entropy).spawn(iterations)
+
+
 def pairwise(iterable):
     """
 
@@ -1,3 +1,4 @@
+import math
 from pytest import fixture
 
 
@@ -181,3 +182,131 @@ def setup_emissions_lut():
                 }
             }
         }
+
+
+@fixture(scope='function')
+def setup_simulation_parameters():
+    return {
+        'seed_value': 42,
+        'seed_value2_urban': 1,
+        'seed_value2_suburban': 2,
+        'seed_value2_rural': 3,
+        'seed_value2_4G': 4,
+        'seed_value2_5G': 6,
+        'seed_value2_free-space': 14,
+        'los_breakpoint_m': 500,
+        'tx_macro_baseline_height': 30,
+        'tx_macro_power': 40,
+        'tx_macro_gain': 16,
+        'tx_macro_losses': 1,
+        'rx_gain': 0,
+        'rx_losses': 4,
+        'rx_misc_losses': 4,
+        'rx_height': 1.5,
+        'network_load': 100,
+        'sectorization': 3,
+        'iterations': 100,
+    }
+
+
+@fixture(scope='function')
+def setup_modulation_and_coding_lut():
+    return {
+        '4G': [
+            ('4G', '2x2', 1, 'QPSK', 78, 0.3, -6.7),
+            ('4G', '2x2', 2, 'QPSK', 120, 0.46, -4.7),
+            ('4G', '2x2', 3, 'QPSK', 193, 0.74, -2.3),
+            ('4G', '2x2', 4, 'QPSK', 308, 1.2, 0.2),
+            ('4G', '2x2', 5, 'QPSK', 449, 1.6, 2.4),
+            ('4G', '2x2', 6, 'QPSK', 602, 2.2, 4.3),
+            ('4G', '2x2', 7, '16QAM', 378, 2.8, 5.9),
+            ('4G', '2x2', 8, '16QAM', 490, 3.8, 8.1),
+            ('4G', '2x2', 9, '16QAM', 616, 4.8, 10.3),
+            ('4G', '2x2', 10, '64QAM', 466, 5.4, 11.7),
+            ('4G', '2x2', 11, '64QAM', 567, 6.6, 14.1),
+            ('4G', '2x2', 12, '64QAM', 666, 7.8, 16.3),
+            ('4G', '2x2', 13, '64QAM', 772, 9, 18.7),
+            ('4G', '2x2', 14, '64QAM', 973, 10.2, 21),
+            ('4G', '2x2', 15, '64QAM', 948, 11.4, 22.7),
+        ],
+        '5G': [
+            ('5G', '4x4', 1, 'QPSK', 78, 0.15, -6.7),
+            ('5G', '4x4', 2, 'QPSK', 193, 1.02, -4.7),
+            ('5G', '4x4', 3, 'QPSK', 449, 2.21, -2.3),
+            ('5G', '4x4', 4, '16QAM', 378, 3.20, 0.2),
+            ('5G', '4x4', 5, '16QAM', 490, 4.00, 2.4),
+            ('5G', '4x4', 6, '16QAM', 616, 5.41, 4.3),
+            ('5G', '4x4', 7, '64QAM', 466, 6.20, 5.9),
+            ('5G', '4x4', 8, '64QAM', 567, 8.00, 8.1),
+            ('5G', '4x4', 9, '64QAM', 666, 9.50, 10.3),
+            ('5G', '4x4', 10, '64QAM', 772, 11.00, 11.7),
+            ('5G', '4x4', 11, '64QAM', 873, 14.00, 14.1),
+            ('5G', '4x4', 12, '256QAM', 711, 16.00, 16.3),
+            ('5G', '4x4', 13, '256QAM', 797, 19.00, 18.7),
+            ('5G', '4x4', 14, '256QAM', 885, 22.00, 21),
+            ('5G', '4x4', 15, '256QAM', 948, 25.00, 22.7),
+        ]
+    }
+
+
+@fixture(scope='function')
+def setup_sites():
+    """
+    A single 1 km radius hexagonal site area, its six neighbours and
+    a handful of receivers between the transmitter and the cell edge.
+
+    """
+    radius = 1000
+    side = 2 * radius / 3**0.5
+
+    hexagon = [
+        (-radius, -side / 2), (-radius, side / 2), (0, side),
+        (radius, side / 2), (radius, -side / 2), (0, -side),
+        (-radius, -side / 2),
+    ]
+
+    transmitter = [{
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': (0, 0)},
+        'properties': {'site_id': 'transmitter'}
+    }]
+
+    interfering_transmitters = []
+    for idx, angle in enumerate(range(0, 360, 60)):
+        interfering_transmitters.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': (
+                    2 * radius * math.cos(math.radians(angle)),
+                    2 * radius * math.sin(math.radians(angle))
+                )
+            },
+            'properties': {'site_id': idx}
+        })
+
+    site_area = [{
+        'type': 'Feature',
+        'geometry': {'type': 'Polygon', 'coordinates': [hexagon]},
+        'properties': {'site_id': 'transmitter'}
+    }]
+
+    receivers = []
+    for idx, distance in enumerate([5, 50, 100, 250, 500, 750, 900, 990]):
+        receivers.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [distance * 0.8, distance * 0.3],
+            },
+            'properties': {
+                'ue_id': 'id_{}'.format(idx),
+                'misc_losses': 4,
+                'gain': 0,
+                'losses': 4,
+                'ue_height': 1.5,
+                'indoor': bool(idx % 2),
+            }
+        })
+
+    return transmitter, interfering_transmitters, site_area, receivers
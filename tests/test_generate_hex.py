@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+from pytest import approx
+from shapely.geometry import Point, Polygon
+
+from cucumber.generate_hex import (produce_sites_and_site_areas,
+    produce_unit_sites_and_site_areas, calculate_hexagon,
+    points_in_convex_polygon, calculate_hexagon_symmetry_domain)
+
+
+def test_produce_unit_sites_and_site_areas():
+    """
+    Unit test for the analytic site layout, checked against the
+    hex lattice produced by produce_sites_and_site_areas.
+
+    """
+    site_radius = 1000
+
+    transmitter, interfering_transmitters, site_area, int_site_areas = \
+        produce_unit_sites_and_site_areas(site_radius)
+
+    legacy_transmitter, legacy_interferers, legacy_site_area, _ = \
+        produce_sites_and_site_areas((0, 0), site_radius,
+            'epsg:4326', 'epsg:3857')
+
+    assert transmitter[0]['properties']['site_id'] == 'transmitter'
+    assert len(interfering_transmitters) == 6
+    assert len(int_site_areas) == 6
+
+    assert Polygon(site_area[0]['geometry']['coordinates'][0]).area == approx(
+        Polygon(legacy_site_area[0]['geometry']['coordinates'][0]).area)
+
+    offset = legacy_transmitter[0]['geometry']['coordinates']
+    legacy = sorted(
+        (round(site['geometry']['coordinates'][0] - offset[0], 6),
+         round(site['geometry']['coordinates'][1] - offset[1], 6))
+        for site in legacy_interferers
+    )
+    analytic = sorted(
+        (round(site['geometry']['coordinates'][0], 6),
+         round(site['geometry']['coordinates'][1], 6))
+        for site in interfering_transmitters
+    )
+    assert analytic == legacy
+
+
+def test_calculate_hexagon():
+    """
+    Unit test for calculating a single hexagon.
+
+    """
+    polygon = Polygon(calculate_hexagon(10, 20, 1))
+
+    assert polygon.centroid.x == approx(10)
+    assert polygon.centroid.y == approx(20)
+    assert polygon.area == approx(2 * 3 ** 0.5)
+
+
+@pytest.mark.parametrize('rings, count', [(1, 6), (2, 18), (3, 36)])
+def test_interfering_site_rings(rings, count):
+    """
+    Unit test for multiple rings of interfering sites.
+
+    """
+    transmitter, interfering_transmitters, site_area, int_site_areas = \
+        produce_unit_sites_and_site_areas(1000, rings)
+
+    assert len(interfering_transmitters) == count
+
+    legacy_transmitter, legacy_interferers, _, _ = \
+        produce_sites_and_site_areas((0, 0), 1000,
+            'epsg:4326', 'epsg:3857', rings)
+
+    offset = legacy_transmitter[0]['geometry']['coordinates']
+    legacy = sorted(
+        (round(site['geometry']['coordinates'][0] - offset[0], 3),
+         round(site['geometry']['coordinates'][1] - offset[1], 3))
+        for site in legacy_interferers
+    )
+    analytic = sorted(
+        (round(site['geometry']['coordinates'][0], 3),
+         round(site['geometry']['coordinates'][1], 3))
+        for site in interfering_transmitters
+    )
+    assert analytic == legacy
+
+
+def test_points_in_convex_polygon():
+    """
+    Unit test for vectorized containment, checked against shapely.
+
+    """
+    hexagon = calculate_hexagon(0, 0, 1000)
+    geom = Polygon(hexagon)
+
+    x_axis = np.linspace(-1155, 1155, num=60)
+    xv, yv = np.meshgrid(x_axis, x_axis, indexing='ij')
+
+    answer = points_in_convex_polygon(hexagon, xv, yv)
+
+    assert answer.shape == xv.shape
+    assert answer.tolist() == [
+        [geom.contains(Point(x, y)) for x, y in zip(row_x, row_y)]
+        for row_x, row_y in zip(xv, yv)
+    ]
+
+    #boundary points are outside, as with shapely contains
+    assert not points_in_convex_polygon(hexagon, [hexagon[0][0]], [0])[0]
+    assert points_in_convex_polygon(hexagon[:-1], [0], [0])[0]
+
+
+def test_calculate_hexagon_symmetry_domain():
+    """
+    Unit test for the symmetry domain of a hexagon.
+
+    """
+    hexagon = calculate_hexagon(100, 200, 1000)
+
+    triangle = Polygon(calculate_hexagon_symmetry_domain(hexagon))
+
+    assert triangle.area == approx(Polygon(hexagon).area / 12)
+    assert triangle.within(Polygon(hexagon).buffer(1e-6))
+    assert Point(100, 200).distance(triangle) == approx(0)
@@ -0,0 +1,252 @@
+import numpy as np
+import pytest
+from cucumber.path_loss import (path_loss_calculator, etsi_tr_138_901,
+    uma_nlos_optional, path_loss_calculator_vectorized,
+    etsi_tr_138_901_vectorized, uma_nlos_optional_vectorized,
+    PathLossModel, get_path_loss_model, PathLossTable,
+    building_penetration_loss, outdoor_to_indoor_path_loss,
+    outdoor_to_indoor_path_loss_vectorized)
+
+
+DISTANCES = np.concatenate([
+    np.arange(20, 1000, 7.3),
+    np.arange(1000, 60000, 211.7),
+    [133, 4999.9, 5000, 5000.1, 9999.9, 10000, 10000.1],
+])
+
+
+@pytest.mark.parametrize('environment', ['urban', 'suburban', 'rural'])
+@pytest.mark.parametrize('frequency', [0.7, 0.8, 1.8, 2.6, 3.5, 26])
+def test_path_loss_calculator_vectorized(setup_simulation_parameters,
+    environment, frequency):
+    """
+    The array kernel must match the scalar calculator exactly.
+
+    """
+    expected = [
+        path_loss_calculator(distance, frequency, environment,
+            setup_simulation_parameters, 0)[0]
+        for distance in DISTANCES
+    ]
+
+    path_loss, model = path_loss_calculator_vectorized(DISTANCES,
+        frequency, environment, setup_simulation_parameters)
+
+    assert model == 'etsi_tr_138_901'
+    assert np.array_equal(np.array(expected, dtype=float), path_loss)
+
+    grid = DISTANCES[:len(DISTANCES) // 2 * 2].reshape(-1, 2)
+    path_loss, model = path_loss_calculator_vectorized(grid, frequency,
+        environment, setup_simulation_parameters)
+
+    assert path_loss.shape == grid.shape
+
+
+@pytest.mark.parametrize('ant_type, environment', [
+    ('macro', 'urban'), ('macro', 'suburban'), ('macro', 'rural'),
+    ('micro', 'urban'),
+])
+@pytest.mark.parametrize('type_of_sight', ['los', 'nlos'])
+def test_etsi_tr_138_901_vectorized(ant_type, environment, type_of_sight):
+    """
+    Each regime must match the scalar model where it is defined.
+
+    """
+    frequency = 3.5
+    distances = DISTANCES[DISTANCES <= 5000] if ant_type == 'micro' \
+        else DISTANCES
+
+    expected = np.array([
+        etsi_tr_138_901(frequency, distance, 30, ant_type, 8, 20,
+            environment, type_of_sight, 1.5, 0, 1, 30, 42)
+        for distance in distances
+    ], dtype=object)
+
+    defined = np.array([not isinstance(value, str) for value in expected])
+
+    path_loss = etsi_tr_138_901_vectorized(frequency, distances, 30,
+        ant_type, 8, 20, environment, type_of_sight, 1.5, 0,
+        np.ones(distances.shape), 30, 42)
+
+    assert np.array_equal(expected[defined].astype(float), path_loss[defined])
+    assert np.isnan(path_loss[~defined]).all()
+
+
+def test_uma_nlos_optional_vectorized():
+
+    expected = [
+        uma_nlos_optional(0.8, distance, 30, 1.5, 30, 42)
+        for distance in DISTANCES
+    ]
+
+    assert np.array_equal(np.array(expected, dtype=float),
+        uma_nlos_optional_vectorized(0.8, DISTANCES, 30, 1.5, 30, 42))
+
+
+def test_path_loss_calculator_vectorized_frequency(setup_simulation_parameters):
+
+    with pytest.raises(ValueError):
+        path_loss_calculator_vectorized(DISTANCES, 0.01, 'urban',
+            setup_simulation_parameters)
+
+
+@pytest.mark.parametrize('ant_type, environment', [
+    ('macro', 'urban'), ('macro', 'suburban'), ('macro', 'rural'),
+    ('micro', 'urban'),
+])
+@pytest.mark.parametrize('type_of_sight', ['los', 'nlos'])
+def test_path_loss_model(ant_type, environment, type_of_sight):
+    """
+    The precomputed model must match the array kernel, including the
+    regimes which are undefined (nan).
+
+    """
+    frequency = np.array([[0.8], [3.5], [26]])
+
+    model = PathLossModel(frequency, environment, 30, 1.5, 8, 20,
+        ant_type, type_of_sight)
+
+    expected = etsi_tr_138_901_vectorized(frequency, DISTANCES, 30,
+        ant_type, 8, 20, environment, type_of_sight, 1.5, 0,
+        np.ones(DISTANCES.shape), 30, 42)
+
+    path_loss = model(DISTANCES)
+
+    assert path_loss.shape == (3, len(DISTANCES))
+    assert np.array_equal(expected, path_loss, equal_nan=True)
+
+
+def test_get_path_loss_model(setup_simulation_parameters):
+
+    model = get_path_loss_model(3.5, 'urban', setup_simulation_parameters)
+
+    assert get_path_loss_model(3.5, 'urban',
+        setup_simulation_parameters) is model
+    assert get_path_loss_model(0.8, 'urban',
+        setup_simulation_parameters) is not model
+
+    with pytest.raises(ValueError):
+        PathLossModel(200, 'urban', 30, 1.5)
+
+    with pytest.raises(ValueError):
+        PathLossModel(3.5, 'urban', 30, 1.5, ant_type='femto')
+
+
+@pytest.mark.parametrize('ant_type, environment', [
+    ('macro', 'urban'), ('macro', 'rural'), ('micro', 'urban'),
+])
+@pytest.mark.parametrize('type_of_sight', ['los', 'nlos'])
+@pytest.mark.parametrize('max_error', [0.5, 0.01])
+def test_path_loss_table(ant_type, environment, type_of_sight, max_error):
+    """
+    The table must stay within its error bound of the continuous model,
+    which rounds to the exact path loss.
+
+    """
+    frequency = np.array([[0.8], [3.5], [26]])
+    distances = np.concatenate([DISTANCES, [5, 133, 200000]])
+
+    model = PathLossModel(frequency, environment, 30, 1.5,
+        ant_type=ant_type, type_of_sight=type_of_sight, rounded=False)
+
+    table = PathLossTable(frequency, environment, 30, 1.5, max_error,
+        ant_type=ant_type, type_of_sight=type_of_sight)
+
+    expected = model(distances)
+    path_loss = table(distances)
+
+    assert np.array_equal(np.round(expected), PathLossModel(frequency,
+        environment, 30, 1.5, ant_type=ant_type,
+        type_of_sight=type_of_sight)(distances), equal_nan=True)
+
+    assert np.array_equal(np.isnan(expected), np.isnan(path_loss))
+    assert np.nanmax(np.abs(path_loss - expected)) <= max_error
+
+    single = PathLossTable(3.5, environment, 30, 1.5, max_error,
+        ant_type=ant_type, type_of_sight=type_of_sight)
+
+    assert np.allclose([single(distance) for distance in distances],
+        single(distances), equal_nan=True)
+
+
+def test_path_loss_calculator_tabulated(setup_simulation_parameters):
+    """
+    With an error bound set, both calculators use the table.
+
+    """
+    setup_simulation_parameters['path_loss_max_error_dB'] = 0.1
+
+    path_loss, model = path_loss_calculator_vectorized(DISTANCES, 3.5,
+        'urban', setup_simulation_parameters)
+
+    assert model == 'etsi_tr_138_901_tabulated'
+    assert np.allclose(path_loss, [
+        path_loss_calculator(distance, 3.5, 'urban',
+            setup_simulation_parameters, 0)[0]
+        for distance in DISTANCES
+    ])
+
+    del setup_simulation_parameters['path_loss_max_error_dB']
+
+    exact, model = path_loss_calculator_vectorized(DISTANCES, 3.5,
+        'urban', setup_simulation_parameters)
+
+    assert np.abs(path_loss - exact).max() <= 0.6
+
+
+def test_building_penetration_loss(setup_simulation_parameters):
+    """
+    Penetration loss applies to indoor users only, with a mean and
+    spread interpolated in frequency.
+
+    """
+    mean, std = building_penetration_loss([0.8, 3.5],
+        setup_simulation_parameters)
+
+    assert mean.tolist() == [0, 0]
+    assert std.tolist() == [0, 0]
+
+    parameters = dict(setup_simulation_parameters,
+        building_penetration_loss=[(3.5, 16, 6), (0.7, 10, 4)])
+
+    mean, std = building_penetration_loss(
+        np.array([[0.5], [2.1], [26]]), parameters)
+
+    assert mean.ravel().tolist() == pytest.approx([10, 13, 16])
+    assert std.ravel().tolist() == pytest.approx([4, 5, 6])
+
+    indoor = np.array([True, False, True])
+
+    loss = outdoor_to_indoor_path_loss_vectorized(
+        np.array([[0.7], [3.5]]), indoor, None, parameters)
+
+    assert loss.tolist() == [[10, 0, 10], [16, 0, 16]]
+    assert outdoor_to_indoor_path_loss(3.5, True, None, parameters) == 16
+    assert outdoor_to_indoor_path_loss(3.5, False, None, parameters) == 0
+
+
+@pytest.mark.parametrize('max_error', [None, 0.1])
+def test_path_loss_calculator_indoor(setup_simulation_parameters,
+    max_error):
+    """
+    Both calculators add the penetration loss of indoor users only.
+
+    """
+    parameters = dict(setup_simulation_parameters,
+        building_penetration_loss=12, path_loss_max_error_dB=max_error)
+
+    indoor = np.arange(len(DISTANCES)) % 3 == 0
+
+    outdoor, model = path_loss_calculator_vectorized(DISTANCES, 3.5,
+        'urban', parameters, indoor=False)
+
+    path_loss, model = path_loss_calculator_vectorized(DISTANCES, 3.5,
+        'urban', parameters, indoor=indoor)
+
+    assert np.allclose(path_loss - outdoor, np.where(indoor, 12, 0))
+
+    assert np.allclose(path_loss, [
+        path_loss_calculator(distance, 3.5, 'urban', parameters, 0,
+            is_indoor)[0]
+        for distance, is_indoor in zip(DISTANCES, indoor)
+    ])
@@ -0,0 +1,552 @@
+import os
+import sys
+import csv
+import math
+import pytest
+import numpy as np
+from shapely.geometry import shape, Point
+from cucumber.generate_hex import (produce_unit_sites_and_site_areas,
+    calculate_hexagon_symmetry_domain)
+from cucumber.system_simulator import SimulationManager, select_carrier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from sim import (generate_receiver_grid, run_adaptive_sampling,
+    run_quasi_random_sampling,
+    PercentileAccumulator, obtain_percentile_values, generate_site_template,
+    scale_site_template, FullResultsDataset, FULL_RESULTS_CONSTANTS,
+    FULL_RESULTS_METRICS, run_radius_sweep, generate_sweep_tasks,
+    run_parallel_sweep, SweepManifest, open_sweep_manifest, LookupTableSink)
+
+
+class SweepInterrupted(Exception):
+    pass
+
+
+@pytest.mark.parametrize('site_radius', [800, 900])
+def test_generate_receiver_grid(site_radius, setup_simulation_parameters):
+
+    _, _, site_area, _ = produce_unit_sites_and_site_areas(site_radius, 1)
+
+    #the original per point loop, which has 49 points per axis at 900m
+    geom = shape(site_area[0]['geometry'])
+    minx, miny, maxx, maxy = geom.bounds
+    size = int(math.sqrt(geom.area) / (math.sqrt(geom.area) / 50))
+
+    np.random.seed(1)
+
+    coordinates = []
+    indoor = []
+    for x in np.linspace(minx, maxx, num=size):
+        for y in np.linspace(miny, maxy, num=size):
+            indoor_outdoor_probability = np.random.rand(1, 1)[0][0]
+            if geom.contains(Point((x, y))):
+                coordinates.append((x, y))
+                indoor.append(indoor_outdoor_probability < 0.5)
+
+    expected_state = np.random.rand()
+
+    np.random.seed(1)
+
+    receivers = generate_receiver_grid(site_area, setup_simulation_parameters)
+
+    assert np.array_equal(receivers.coordinates, coordinates)
+    assert np.array_equal(receivers.indoor, indoor)
+    assert np.random.rand() == expected_state
+
+
+def test_percentile_accumulator_exact():
+
+    random_state = np.random.default_rng(1)
+    values = random_state.normal(size=1001)
+    weights = random_state.integers(1, 4, size=values.size)
+
+    unweighted = PercentileAccumulator(metrics=['sinr'])
+    weighted = PercentileAccumulator(metrics=['sinr'])
+
+    for chunk in np.array_split(np.arange(values.size), 7):
+        unweighted.push({'sinr': values[chunk]})
+        weighted.push({'sinr': values[chunk]}, weights[chunk])
+
+    for percentile in [0, 1, 5, 10, 33, 50, 90, 95, 99, 100]:
+
+        assert unweighted.percentile('sinr', percentile) == np.percentile(
+            values, percentile, method='closest_observation')
+
+        #integer weights give the percentile of values repeated by weight
+        assert weighted.percentile('sinr', percentile) == np.percentile(
+            np.repeat(values, weights), percentile,
+            method='closest_observation')
+
+
+@pytest.mark.parametrize('order', ['sorted', 'shuffled'])
+def test_percentile_accumulator_sketch(order):
+
+    size = 200000
+    values = np.arange(size, dtype=float)
+    if order == 'shuffled':
+        values = np.random.default_rng(2).permutation(values)
+
+    accumulator = PercentileAccumulator(metrics=['sinr'], mode='sketch')
+
+    for chunk in np.array_split(values, 400):
+        accumulator.push({'sinr': chunk})
+
+    assert sum(len(level) for level in accumulator.values['sinr']) <= 2000
+
+    #values are their own rank, so the rank error is read off directly
+    for percentile in range(1, 100):
+        estimate = accumulator.percentile('sinr', percentile)
+        assert abs(estimate / size * 100 - percentile) <= 0.5
+
+
+@pytest.fixture(scope='function')
+def setup_site(request, setup_simulation_parameters,
+    setup_modulation_and_coding_lut):
+
+    #sinr percentiles of a dense grid, to compare the sampling methods with
+    environment, site_radius = getattr(request, 'param', ('urban', 1000))
+    parameters = setup_simulation_parameters
+    carriers = [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')]
+
+    template = generate_site_template(dict(parameters, grid_resolution=150))
+    transmitter, interfering_transmitters, receivers, site_area = \
+        scale_site_template(template, site_radius, 'macro', parameters)
+
+    manager = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, parameters)
+    results = manager.estimate_link_budget_carriers(carriers, 'macro',
+        environment, setup_modulation_and_coding_lut, parameters)
+
+    grid_percentiles = {
+        (idx, confidence_interval): obtain_percentile_values(
+            select_carrier(results, idx), carrier[3], parameters,
+            [confidence_interval])[0]['sinr']
+        for idx, carrier in enumerate(carriers)
+        for confidence_interval in [10, 50, 90]
+    }
+
+    return {
+        'arguments': (transmitter, interfering_transmitters, 'macro',
+            site_area, carriers, environment,
+            setup_modulation_and_coding_lut, parameters),
+        'site_area': site_area,
+        'carriers': carriers,
+        'parameters': parameters,
+        'grid_percentiles': grid_percentiles,
+    }
+
+
+@pytest.mark.parametrize('setup_site', [('urban', 1000), ('rural', 5000)],
+    indirect=True)
+def test_run_adaptive_sampling(setup_site):
+
+    polygon = setup_site['site_area'][0]['geometry']['coordinates'][0]
+    area = shape(setup_site['site_area'][0]['geometry']).area
+    domain_area = shape({'type': 'Polygon',
+        'coordinates': [calculate_hexagon_symmetry_domain(polygon)]}).area
+
+    assert domain_area == pytest.approx(area / 12)
+
+    #cells are weighted by their area within the sampled region
+    results, weights, evaluations = run_adaptive_sampling(
+        *setup_site['arguments'], 50)
+
+    assert weights.sum() == pytest.approx(area)
+    assert evaluations >= len(weights)
+
+    for confidence_interval in [10, 50, 90]:
+
+        np.random.seed(1)
+        results, weights, evaluations = run_adaptive_sampling(
+            *setup_site['arguments'], confidence_interval, symmetric=True)
+
+        assert weights.sum() == pytest.approx(domain_area)
+        assert results['sinr'].shape == (2, len(weights))
+
+        for idx, carrier in enumerate(setup_site['carriers']):
+            estimate = obtain_percentile_values(select_carrier(results, idx),
+                carrier[3], setup_site['parameters'], [confidence_interval],
+                weights=weights)[0]['sinr']
+            assert abs(estimate - setup_site['grid_percentiles'][
+                idx, confidence_interval]) <= 0.1
+
+        #repeat runs refine the same cells
+        np.random.seed(1)
+        repeat, repeat_weights, repeat_evaluations = run_adaptive_sampling(
+            *setup_site['arguments'], confidence_interval, symmetric=True)
+
+        assert repeat_evaluations == evaluations
+        assert np.array_equal(repeat_weights, weights)
+        assert np.array_equal(repeat['sinr'], results['sinr'])
+
+
+@pytest.mark.parametrize('setup_site', [('urban', 1000), ('rural', 5000)],
+    indirect=True)
+@pytest.mark.parametrize('method', ['sobol', 'halton'])
+def test_run_quasi_random_sampling(setup_site, method):
+
+    #with the full sample budget, percentiles are within the default
+    #tolerance of the dense grid
+    percentile_results, samples = run_quasi_random_sampling(
+        *setup_site['arguments'], [10, 50, 90], method=method, tolerance=-1)
+
+    assert samples == 16384
+
+    for idx, carrier_results in enumerate(percentile_results):
+        for result in carrier_results:
+            assert abs(result['sinr'] - setup_site['grid_percentiles'][
+                idx, result['confidence_interval']]) <= 0.1
+
+    #sampling stops at max_samples, with the same points for a seed
+    first = run_quasi_random_sampling(*setup_site['arguments'], [50],
+        method=method, tolerance=-1, max_samples=300)
+    second = run_quasi_random_sampling(*setup_site['arguments'], [50],
+        method=method, tolerance=-1, max_samples=300)
+
+    assert first[1] == 300
+    assert first == second
+
+
+def test_run_quasi_random_sampling_errors(setup_site):
+
+    with pytest.raises(ValueError):
+        run_quasi_random_sampling(*setup_site['arguments'], [50],
+            method='random')
+
+    #a site area without an interior gives no sample points
+    arguments = list(setup_site['arguments'])
+    arguments[3] = [{'geometry': {'type': 'Polygon',
+        'coordinates': [[(0, 0), (1, 1), (2, 2), (0, 0)]]}}]
+
+    with pytest.raises(ValueError):
+        run_quasi_random_sampling(*arguments, [50], max_empty_batches=4)
+
+
+def test_sweep_manifest(tmpdir):
+
+    path = os.path.join(str(tmpdir), 'lut_manifest.jsonl')
+    task = ('urban', 'macro', 500, (0.8, 10, '4G', '2x2'))
+    rows = [{
+        'environment': 'urban',
+        'ant_type': 'macro',
+        'inter_site_distance_m': 1000,
+        'frequency_GHz': 0.8,
+        'bandwidth_MHz': 10,
+        'generation': '4G',
+        'transmission_type': '2x2',
+        'confidence_interval': confidence_interval,
+    } for confidence_interval in [10, 50]]
+
+    manifest = SweepManifest(path, 'hash')
+
+    assert manifest.stale
+
+    manifest.reset()
+    manifest.record(rows[:1])
+
+    assert not manifest.is_complete(task, [10, 50])
+
+    manifest.record(rows[1:])
+
+    assert manifest.is_complete(task, [10, 50])
+
+    #other bandwidths of the same frequency are separate tasks
+    wider = ('urban', 'macro', 500, (0.8, 20, '4G', '2x2'))
+
+    assert not manifest.is_complete(wider, [10, 50])
+
+    #a partly written last line is ignored
+    with open(path, 'a') as manifest_file:
+        manifest_file.write('["urban", "macro", 30')
+
+    manifest = SweepManifest(path, 'hash')
+
+    assert not manifest.stale
+    assert manifest.is_complete(task, [10, 50])
+    assert len(manifest.completed) == 2
+
+
+def test_open_sweep_manifest(tmpdir):
+
+    directory = str(tmpdir)
+    lut_path = os.path.join(directory, 'lut.csv')
+    dataset_directory = os.path.join(directory, 'full_results')
+    task = ('urban', 'macro', 500, (0.8, 10, '4G', '2x2'))
+    row = {
+        'environment': 'urban',
+        'ant_type': 'macro',
+        'inter_site_distance_m': 1000,
+        'frequency_GHz': 0.8,
+        'bandwidth_MHz': 10,
+        'generation': '4G',
+        'transmission_type': '2x2',
+        'confidence_interval': 50,
+    }
+
+    def write_results():
+        with open(lut_path, 'w') as lut_file:
+            lut_file.write('rows')
+        os.makedirs(dataset_directory)
+        with open(os.path.join(dataset_directory, 'part.parquet'), 'w') as f:
+            f.write('rows')
+
+    #results without a manifest are removed
+    write_results()
+    manifest = open_sweep_manifest(directory, 'lut.csv', 'hash',
+        dataset_directory)
+
+    assert not os.path.exists(lut_path)
+    assert not os.path.exists(dataset_directory)
+    assert os.path.exists(os.path.join(directory, 'lut_manifest.jsonl'))
+
+    #results of the same parameters are kept
+    manifest.record([row])
+    write_results()
+    manifest = open_sweep_manifest(directory, 'lut.csv', 'hash',
+        dataset_directory)
+
+    assert manifest.is_complete(task, [50])
+    assert os.path.exists(lut_path)
+    assert os.path.exists(dataset_directory)
+
+    #results of other parameters are removed with the completed keys
+    manifest = open_sweep_manifest(directory, 'lut.csv', 'other',
+        dataset_directory)
+
+    assert not manifest.is_complete(task, [50])
+    assert not os.path.exists(lut_path)
+    assert not os.path.exists(dataset_directory)
+
+    manifest = open_sweep_manifest(directory, 'lut.csv', 'other',
+        dataset_directory)
+
+    assert not manifest.stale
+    assert manifest.completed == set()
+
+
+@pytest.fixture(scope='function')
+def setup_sweep(setup_simulation_parameters, setup_modulation_and_coding_lut):
+
+    parameters = dict(setup_simulation_parameters, grid_resolution=10)
+
+    tasks = generate_sweep_tasks(
+        {'urban': [500, 1000], 'rural': [2000]},
+        ['macro'],
+        [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')],
+    )
+
+    return {
+        'tasks': tasks,
+        'modulation_and_coding_lut': setup_modulation_and_coding_lut,
+        'parameters': parameters,
+        'template': generate_site_template(parameters),
+    }
+
+
+def test_resume_interrupted_sweep(tmpdir, setup_sweep):
+
+    directory = str(tmpdir)
+    tasks = setup_sweep['tasks']
+    completed = 2
+
+    def run(tasks, checkpoint):
+        return run_parallel_sweep(
+            tasks,
+            setup_sweep['modulation_and_coding_lut'],
+            setup_sweep['parameters'],
+            [50],
+            template=setup_sweep['template'],
+            workers=1,
+            checkpoint=checkpoint,
+        )
+
+    manifest = open_sweep_manifest(directory, 'lut.csv', 'hash')
+
+    #rows are buffered (no flush is due) when the sweep stops
+    with pytest.raises(SweepInterrupted):
+        with LookupTableSink(directory, 'lut.csv', manifest=manifest,
+            flush_interval=3600) as sink:
+
+            def checkpoint(rows):
+                sink.write(rows)
+                if len(sink.rows) == completed:
+                    raise SweepInterrupted()
+
+            run(tasks, checkpoint)
+
+    manifest = open_sweep_manifest(directory, 'lut.csv', 'hash')
+
+    remaining = [
+        task for task in tasks if not manifest.is_complete(task, [50])
+    ]
+
+    assert remaining == tasks[completed:]
+
+    with LookupTableSink(directory, 'lut.csv', manifest=manifest) as sink:
+        run(remaining, sink.write)
+
+    with open(os.path.join(directory, 'lut.csv'), 'r') as lut_file:
+        resumed = list(csv.DictReader(lut_file))
+
+    expected = run(tasks, None)
+
+    assert len(resumed) == len(tasks)
+    assert [float(row['capacity_mbps']) for row in resumed] == \
+        [float(row['capacity_mbps']) for row in expected]
+
+    manifest = open_sweep_manifest(directory, 'lut.csv', 'hash')
+
+    assert all(manifest.is_complete(task, [50]) for task in tasks)
+
+
+def test_lookup_table_sink_flush_interval(tmpdir, setup_sweep):
+
+    directory = str(tmpdir)
+    manifest = open_sweep_manifest(directory, 'lut.csv', 'hash')
+    task = setup_sweep['tasks'][0]
+
+    rows = run_parallel_sweep(
+        [task],
+        setup_sweep['modulation_and_coding_lut'],
+        setup_sweep['parameters'],
+        [50],
+        template=setup_sweep['template'],
+        workers=1,
+    )
+
+    sink = LookupTableSink(directory, 'lut.csv', manifest=manifest,
+        flush_interval=3600)
+    sink.write(rows)
+
+    assert not manifest.is_complete(task, [50])
+
+    #with no interval each write is flushed and recorded
+    sink.flush_interval = 0
+    sink.write(rows)
+
+    assert manifest.is_complete(task, [50])
+    assert os.path.exists(os.path.join(directory, 'lut.csv'))
+
+
+def test_run_parallel_sweep_workers(setup_sweep):
+
+    #receivers are drawn indoors or outdoors with the random state of a
+    #task, which changes results once indoor receivers have a loss
+    parameters = dict(setup_sweep['parameters'], building_penetration_loss=20)
+
+    def run(tasks, workers):
+        return run_parallel_sweep(
+            tasks,
+            setup_sweep['modulation_and_coding_lut'],
+            parameters,
+            [10, 50],
+            template=setup_sweep['template'],
+            workers=workers,
+            sampling='sobol',
+        )
+
+    tasks = setup_sweep['tasks'][:3]
+
+    serial = run(tasks, 1)
+
+    assert len(serial) == 6
+
+    #rows depend only on each task's seed, not the worker or task order
+    assert run(tasks, 2) == serial
+    assert run(tasks[::-1], 1) == serial
+
+
+def test_full_results_dataset(tmpdir, setup_sweep):
+
+    pyarrow = pytest.importorskip('pyarrow')
+    pd = pytest.importorskip('pandas')
+    import pyarrow.parquet
+
+    directory = os.path.join(str(tmpdir), 'full_results')
+
+    tables = []
+    run_radius_sweep([500], 'urban', 'macro',
+        [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')],
+        setup_sweep['modulation_and_coding_lut'], setup_sweep['parameters'],
+        [50], template=setup_sweep['template'], full_results_tables=tables)
+
+    receivers = len(tables[0]['columns']['receiver_x'])
+
+    dataset = FullResultsDataset(directory)
+    for table in tables:
+        dataset.append(table)
+    dataset.flush()
+
+    #a second flush adds parts rather than replacing them
+    dataset.append(tables[0])
+    dataset.close()
+
+    folder = os.path.join(directory, 'environment=urban', 'generation=4G')
+
+    assert sorted(os.listdir(folder)) == [
+        'part-00000.parquet', 'part-00001.parquet']
+    assert os.listdir(os.path.join(directory, 'environment=urban',
+        'generation=5G')) == ['part-00000.parquet']
+
+    part = pyarrow.parquet.ParquetFile(
+        os.path.join(folder, 'part-00000.parquet'))
+    schema = part.schema_arrow
+    row_group = part.metadata.row_group(0)
+
+    #constants are dictionary encoded, partition values are folder names
+    for idx in range(row_group.num_columns):
+        column = row_group.column(idx)
+        if column.path_in_schema in FULL_RESULTS_CONSTANTS:
+            assert column.has_dictionary_page
+    for name in ['ant_type', 'transmittion_type', 'r_model', 'i_model']:
+        assert pyarrow.types.is_dictionary(schema.field(name).type)
+    for name in FULL_RESULTS_METRICS:
+        assert schema.field(name).type == pyarrow.float32()
+    assert 'environment' not in schema.names
+    assert 'generation' not in schema.names
+
+    data = pd.read_parquet(directory)
+
+    assert len(data) == 3 * receivers
+    assert data['receiver_x'].dtype == np.float32
+    assert data['generation'].astype(str).value_counts().to_dict() == {
+        '4G': 2 * receivers, '5G': receivers}
+    assert set(data['environment'].astype(str)) == {'urban'}
+    assert set(data['frequency_GHz'].astype(float)) == {0.8, 3.5}
+    assert set(data['inter_site_distance_m'].astype(int)) == {1000}
+    assert data['ant_type'].dtype.name == 'category'
+
+
+def test_run_radius_sweep_sampling(setup_sweep):
+
+    arguments = (
+        [500],
+        'urban',
+        'macro',
+        [(0.8, 10, '4G', '2x2')],
+        setup_sweep['modulation_and_coding_lut'],
+        setup_sweep['parameters'],
+        [50],
+    )
+    template = setup_sweep['template']
+
+    with pytest.raises(ValueError):
+        run_radius_sweep(*arguments, template=template, sampling='random')
+
+    #Monte Carlo and full results are only produced by grid sampling
+    with pytest.raises(ValueError):
+        run_radius_sweep(*arguments, template=template, sampling='sobol',
+            monte_carlo=True)
+    with pytest.raises(ValueError):
+        run_radius_sweep(*arguments, template=template,
+            sampling='adaptive', full_results_tables=[])
+
+    symmetric = run_radius_sweep(*arguments, template=template,
+        sampling='adaptive')
+    whole = run_radius_sweep(*arguments, template=template,
+        sampling='adaptive', symmetric=False)
+
+    #the whole site area takes more receivers
+    assert len(symmetric) == len(whole) == 1
+    assert whole[0]['samples'] > symmetric[0]['samples']
@@ -1,8 +1,11 @@
+import os
 import math 
 import pytest
 from cucumber.demand import estimate_demand
 from cucumber.supply import (estimate_supply, find_site_density,
-    estimate_site_upgrades, estimate_backhaul_upgrades)
+    estimate_site_upgrades, estimate_backhaul_upgrades, index_capacity_lut,
+    compile_capacity_lut, read_capacity_lut_source, load_capacity_lut,
+    lookup_capacity, CapacityOracle, LockFile)
 
 def test_find_site_density(
     setup_country,
@@ -259,3 +262,172 @@ def test_estimate_backhaul_upgrades(
 
 
  
+
+
+def test_index_capacity_lut():
+    """
+    Unit test for indexing lookup table rows, read from file or not.
+
+    """
+    rows = [
+        {'ant_type': 'macro', 'frequency_GHz': '0.8', 'generation': '4G',
+         'confidence_interval': '50', 'sites_per_km2': '0.2',
+         'capacity_mbps_km2': '20'},
+        {'ant_type': 'macro', 'frequency_GHz': 0.8, 'generation': '4G',
+         'confidence_interval': 50, 'sites_per_km2': 0.1,
+         'capacity_mbps_km2': 10},
+        {'ant_type': 'macro', 'frequency_GHz': 3.5, 'generation': '5G',
+         'confidence_interval': 50, 'sites_per_km2': 0.1,
+         'capacity_mbps_km2': 0},
+    ]
+
+    answer = index_capacity_lut(rows)
+
+    assert answer == {
+        ('macro', '800', '4G', '50'): [(0.1, 10), (0.2, 20)]
+    }
+
+
+def test_compile_capacity_lut(tmp_path, setup_capacity_lut):
+    """
+    Unit test for the binary lookup table.
+
+    """
+    path = str(tmp_path / 'capacity_lut.json')
+
+    compile_capacity_lut(setup_capacity_lut, path, [1, 2])
+
+    assert read_capacity_lut_source(path) == [1, 2]
+    assert read_capacity_lut_source(str(tmp_path / 'missing.json')) is None
+
+    answer = load_capacity_lut(path)
+
+    assert set(answer) == set(setup_capacity_lut)
+    for key, value in setup_capacity_lut.items():
+        assert answer[key].tolist() == [list(item) for item in value]
+        assert lookup_capacity(answer, 'urban', *key) is answer[key]
+
+    #recompiling replaces the previous array
+    compile_capacity_lut({('macro', '800', '4G', '50'): [(0.1, 1)]}, path)
+
+    assert len(list(tmp_path.glob('*.npy'))) == 1
+    assert load_capacity_lut(path)[('macro', '800', '4G', '50')].tolist() == [
+        [0.1, 1]]
+
+    compile_capacity_lut({}, path)
+    assert load_capacity_lut(path) == {}
+
+
+def test_capacity_oracle(tmp_path):
+    """
+    Unit test for lazily simulating missing lookup table points.
+
+    """
+    calls = []
+
+    def simulate(site_radii, ant_type, carrier, confidence_interval):
+        calls.append((ant_type, carrier, confidence_interval))
+        return [
+            {'ant_type': ant_type, 'frequency_GHz': carrier[0],
+             'generation': carrier[2],
+             'confidence_interval': confidence_interval,
+             'sites_per_km2': 1 / radius, 'capacity_mbps_km2': 1e4 / radius}
+            for radii in site_radii.values() for radius in radii
+        ]
+
+    carriers = [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')]
+    site_radii = {'urban': [100, 200], 'rural': [1000]}
+    precomputed = {('macro', '700', '5G', '50'): [(0.01, 1)]}
+
+    oracle = CapacityOracle(str(tmp_path), simulate, carriers, site_radii,
+        capacity_lut=precomputed, cache_size=1)
+
+    key = ('macro', '800', '4G', '50')
+
+    assert key in oracle
+    assert ('macro', '700', '5G', '50') in oracle
+    assert ('macro', '900', '4G', '50') not in oracle
+    assert lookup_capacity(oracle, 'urban', 'macro', '700', '5G', '50') == [
+        (0.01, 1)]
+    assert len(calls) == 0
+
+    answer = lookup_capacity(oracle, 'urban', *key)
+
+    assert answer.tolist() == [[0.001, 10], [0.005, 50], [0.01, 100]]
+    assert calls == [('macro', (0.8, 10, '4G', '2x2'), 50)]
+
+    #served from memory, then from disk by a new oracle
+    oracle[key]
+    other = CapacityOracle(str(tmp_path), simulate, carriers, site_radii)
+    assert other[key].tolist() == answer.tolist()
+    assert len(calls) == 1
+
+    oracle[('macro', '3500', '5G', '90')]
+    assert len(calls) == 2
+    assert list(oracle.cache) == [('macro', '3500', '5G', '90')]
+
+    with pytest.raises(KeyError):
+        oracle[('macro', '900', '4G', '50')]
+
+
+def test_capacity_oracle_missing_keys(tmp_path):
+    """
+    Unit test for simulated keys with float confidence intervals, or
+    without rows.
+
+    """
+    calls = []
+
+    def simulate(site_radii, ant_type, carrier, confidence_interval):
+        calls.append(confidence_interval)
+        capacity = 0 if carrier[2] == '5G' else 1e4
+        return [
+            {'ant_type': ant_type, 'frequency_GHz': carrier[0],
+             'generation': carrier[2],
+             'confidence_interval': confidence_interval,
+             'sites_per_km2': 1 / radius,
+             'capacity_mbps_km2': capacity / radius}
+            for radii in site_radii.values() for radius in radii
+        ]
+
+    carriers = [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')]
+    site_radii = {'urban': [100, 200]}
+
+    oracle = CapacityOracle(str(tmp_path), simulate, carriers, site_radii)
+
+    answer = oracle[('macro', '800', '4G', '50.0')]
+
+    assert answer.tolist() == [[0.005, 50], [0.01, 100]]
+    assert calls == [50]
+    assert isinstance(calls[0], int)
+
+    oracle[('macro', '800', '4G', '2.5')]
+    assert calls[-1] == 2.5
+
+    #no site radius has capacity, so nothing is cached
+    key = ('macro', '3500', '5G', '50')
+
+    with pytest.raises(KeyError):
+        oracle[key]
+    assert not os.path.exists(oracle.path(key))
+    assert not os.path.exists(oracle.path(key) + '.lock')
+
+
+def test_lock_file(tmp_path):
+    """
+    Unit test for the lock shared between processes.
+
+    """
+    path = str(tmp_path / 'key.lock')
+
+    with LockFile(path):
+        assert os.path.exists(path)
+    assert not os.path.exists(path)
+
+    #a lock left by a process which died is replaced after the timeout
+    open(path, 'w').close()
+    os.utime(path, (0, 0))
+
+    with LockFile(path, timeout=1):
+        assert os.path.exists(path)
+    assert not os.path.exists(path)
@@ -0,0 +1,508 @@
+import json
+import numpy as np
+import pytest
+from cucumber.system_simulator import (SimulationManager,
+    ReceiverSet, TransmitterSet, compile_spectral_efficiency_lookups,
+    select_carrier, enable_instrumentation, get_instrumentation,
+    ShadowFadingField)
+
+
+@pytest.mark.parametrize('environment', ['urban', 'suburban', 'rural'])
+def test_estimate_link_budget_vectorized(
+        setup_sites,
+        setup_simulation_parameters,
+        setup_modulation_and_coding_lut,
+        environment
+    ):
+    """
+    The array engine must reproduce the scalar reference.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    manager = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, setup_simulation_parameters)
+
+    for frequency, bandwidth, generation in [(0.7, 10, '5G'), (2.6, 10, '4G')]:
+
+        scalar = manager.estimate_link_budget(frequency, bandwidth,
+            generation, 'macro', '4x4', environment,
+            setup_modulation_and_coding_lut, setup_simulation_parameters)
+
+        vectorized = manager.estimate_link_budget_vectorized(frequency,
+            bandwidth, generation, 'macro', '4x4', environment,
+            setup_modulation_and_coding_lut, setup_simulation_parameters)
+
+        for key in ['path_loss', 'received_power', 'interference',
+            'distance', 'ave_distance', 'ave_inf_pl', 'noise', 'i_plus_n',
+            'sinr', 'spectral_efficiency', 'capacity_mbps',
+            'capacity_mbps_km2', 'receiver_x', 'receiver_y']:
+
+            expected = np.array([result[key] for result in scalar])
+            assert np.array_equal(expected, vectorized[key]), key
+
+        assert list(vectorized['id']) == [result['id'] for result in scalar]
+
+
+def test_spectral_efficiency_lookup(setup_modulation_and_coding_lut):
+    """
+    Unit test.
+
+    """
+    lookups = compile_spectral_efficiency_lookups(
+        setup_modulation_and_coding_lut)
+
+    lookup = lookups['4G']
+
+    sinr = np.array([-20, -6.71, -6.7, -5, -4.7, 0, 0.2, 11.7, 22.69,
+        22.7, 40])
+    answer = lookup(sinr)
+
+    assert list(answer) == [0, 0, 0.3, 0.3, 0.46, 0.74, 1.2, 5.4, 10.2,
+        11.4, 11.4]
+
+    assert lookups['5G'](np.array([[-7, 1], [15, 30]])).tolist() == [
+        [0, 3.2], [14, 25]]
+
+    assert np.isnan(lookup(np.nan))
+
+    #scalar path and raw tables give the same answers
+    manager = SimulationManager.__new__(SimulationManager)
+    for value in sinr:
+        assert manager.estimate_spectral_efficiency(value, '4G',
+            setup_modulation_and_coding_lut) == lookup(value)
+        assert manager.estimate_spectral_efficiency(value, '4G',
+            lookups) == lookup(value)
+
+
+def test_site_geometry(setup_sites, setup_simulation_parameters):
+    """
+    Geometry is computed once and can be shared between managers.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    manager = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, setup_simulation_parameters)
+
+    geometry = manager.geometry
+
+    assert manager.geometry is geometry
+    assert geometry.interferer_distance.shape == (8, 6)
+    assert geometry.serving_distance[0] == 20
+    assert round(geometry.serving_distance[-1], 3) == round(
+        990 * (0.8**2 + 0.3**2)**0.5, 3)
+    assert round(geometry.interferer_distance[0, 0], 3) == round(
+        ((2000 - 4)**2 + 1.5**2)**0.5, 3)
+
+    other = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, setup_simulation_parameters,
+        geometry=geometry)
+
+    assert other.geometry is geometry
+
+
+def test_receiver_and_transmitter_sets(
+        setup_sites,
+        setup_simulation_parameters,
+        setup_modulation_and_coding_lut
+    ):
+    """
+    Managers built from array containers match those built from geojson.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    receiver_set = ReceiverSet.from_geojson(receivers)
+
+    assert len(receiver_set) == 8
+    assert receiver_set.indoor.tolist() == [bool(idx % 2) for idx in range(8)]
+    assert receiver_set.to_geojson()[3] == {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [200.0, 75.0]},
+        'properties': {'ue_id': 'id_3', 'misc_losses': 4.0, 'gain': 0.0,
+            'losses': 4.0, 'ue_height': 1.5, 'indoor': True}
+    }
+
+    from_parameters = ReceiverSet.from_parameters(
+        receiver_set.coordinates, receiver_set.indoor,
+        setup_simulation_parameters)
+
+    assert from_parameters.ids.tolist() == receiver_set.ids.tolist()
+    assert from_parameters.losses.tolist() == [4] * 8
+
+    transmitter_set = TransmitterSet.from_geojson(transmitter, 'macro',
+        setup_simulation_parameters)
+    interferer_set = TransmitterSet(
+        [site['geometry']['coordinates'] for site in interfering_transmitters],
+        'macro', setup_simulation_parameters)
+
+    assert transmitter_set.eirp == 55
+    assert interferer_set.ids == [0, 1, 2, 3, 4, 5]
+
+    from_geojson = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, setup_simulation_parameters)
+    from_sets = SimulationManager(transmitter_set, interferer_set,
+        'macro', from_parameters, site_area, setup_simulation_parameters)
+
+    expected = from_geojson.estimate_link_budget_vectorized(3.5, 40, '5G',
+        'macro', '4x4', 'urban', setup_modulation_and_coding_lut,
+        setup_simulation_parameters)
+    answer = from_sets.estimate_link_budget_vectorized(3.5, 40, '5G',
+        'macro', '4x4', 'urban', setup_modulation_and_coding_lut,
+        setup_simulation_parameters)
+
+    for key in ['sinr', 'capacity_mbps', 'interference', 'path_loss']:
+        assert np.array_equal(expected[key], answer[key])
+
+    assert len(from_sets.receivers) == 8
+
+
+def test_estimate_link_budget_carriers(
+        setup_sites,
+        setup_simulation_parameters,
+        setup_modulation_and_coding_lut
+    ):
+    """
+    Each carrier of a broadcast evaluation matches a single carrier run.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    manager = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, setup_simulation_parameters)
+
+    carriers = [
+        (0.7, 10, '5G', '4x4'),
+        (0.8, 10, '4G', '2x2'),
+        (1.8, 10, '4G', '2x2'),
+        (2.6, 10, '4G', '2x2'),
+        (3.5, 40, '5G', '4x4'),
+    ]
+
+    np.random.seed(42)
+    results = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'suburban', setup_modulation_and_coding_lut,
+        setup_simulation_parameters)
+
+    assert results['sinr'].shape == (5, 8)
+    assert results['distance'].shape == (8,)
+    assert list(results['generation']) == ['5G', '4G', '4G', '4G', '5G']
+
+    for idx, (frequency, bandwidth, generation, transmission_type) in \
+        enumerate(carriers):
+
+        np.random.seed(42)
+        expected = manager.estimate_link_budget(frequency, bandwidth,
+            generation, 'macro', transmission_type, 'suburban',
+            setup_modulation_and_coding_lut, setup_simulation_parameters)
+
+        answer = select_carrier(results, idx)
+
+        assert answer['tranmission_type'] == transmission_type
+
+        for key in ['path_loss', 'received_power', 'interference',
+            'noise', 'i_plus_n', 'sinr', 'spectral_efficiency',
+            'capacity_mbps', 'capacity_mbps_km2', 'ave_inf_pl']:
+
+            assert np.array_equal(
+                np.array([result[key] for result in expected]),
+                answer[key]
+            ), key
+
+
+def test_estimate_link_budget_monte_carlo(
+        setup_sites,
+        setup_simulation_parameters,
+        setup_modulation_and_coding_lut
+    ):
+    """
+    Monte Carlo results are independent of the chunk size, and reduce
+    to the deterministic link budget without fading.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    manager = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, setup_simulation_parameters)
+
+    carriers = [
+        (0.8, 10, '4G', '2x2'),
+        (3.5, 40, '5G', '4x4'),
+    ]
+
+    results = manager.estimate_link_budget_monte_carlo(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut,
+        setup_simulation_parameters, iterations=20, chunk_size=20)
+
+    chunked = manager.estimate_link_budget_monte_carlo(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut,
+        setup_simulation_parameters, iterations=20, chunk_size=3)
+
+    assert results['sinr'].shape == (2, 8)
+    for key in ['sinr', 'received_power', 'interference', 'capacity_mbps']:
+        assert np.allclose(results[key], chunked[key]), key
+
+    parameters = dict(setup_simulation_parameters, shadow_fading_std_urban=0)
+
+    no_fading = manager.estimate_link_budget_monte_carlo(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, parameters, iterations=2)
+
+    expected = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, parameters)
+
+    for key in ['path_loss', 'received_power', 'interference', 'i_plus_n',
+        'sinr', 'spectral_efficiency', 'capacity_mbps']:
+        assert np.allclose(no_fading[key], expected[key]), key
+
+
+def test_shadow_fading_field():
+    """
+    Fields have the requested spread and exponential correlation, and
+    are reproducible from the same stream.
+
+    """
+    x_axis = np.arange(0, 2000, 5.0)
+    coordinates = np.column_stack((x_axis, np.zeros(x_axis.shape)))
+
+    field = ShadowFadingField(coordinates, 8, 50)
+
+    fading = field(np.random.default_rng(42), 1001)
+
+    assert fading.shape == (1001, len(x_axis))
+    assert fading.std() == pytest.approx(8, rel=0.02)
+
+    for lag in [10, 20]:
+        correlation = np.mean(fading[:, :-lag] * fading[:, lag:]) / 64
+        assert correlation == pytest.approx(np.exp(-lag * 5 / 50), abs=0.02)
+
+    assert np.array_equal(field(np.random.default_rng(1), 3),
+        field(np.random.default_rng(1), 3))
+
+
+def test_estimate_link_budget_monte_carlo_correlated(
+        setup_sites,
+        setup_simulation_parameters,
+        setup_modulation_and_coding_lut
+    ):
+    """
+    Correlated fading is independent of the chunk size, and reduces to
+    the deterministic link budget without fading.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    manager = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, setup_simulation_parameters)
+
+    carriers = [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')]
+
+    parameters = dict(setup_simulation_parameters,
+        shadow_fading_correlated=True)
+
+    results = manager.estimate_link_budget_monte_carlo(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, parameters,
+        iterations=10, chunk_size=10)
+
+    chunked = manager.estimate_link_budget_monte_carlo(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, parameters,
+        iterations=10, chunk_size=4)
+
+    independent = manager.estimate_link_budget_monte_carlo(carriers,
+        'macro', 'urban', setup_modulation_and_coding_lut,
+        setup_simulation_parameters, iterations=10)
+
+    assert results['sinr'].shape == (2, 8)
+    assert np.allclose(results['sinr'], chunked['sinr'])
+    assert not np.allclose(results['sinr'], independent['sinr'])
+
+    parameters['shadow_fading_std_urban'] = 0
+
+    no_fading = manager.estimate_link_budget_monte_carlo(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, parameters, iterations=2)
+
+    expected = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, parameters)
+
+    for key in ['received_power', 'interference', 'sinr']:
+        assert np.allclose(no_fading[key], expected[key]), key
+
+
+def test_building_penetration_loss(
+        setup_sites,
+        setup_simulation_parameters,
+        setup_modulation_and_coding_lut
+    ):
+    """
+    Penetration loss follows each receiver's indoor flag, on both the
+    scalar and array paths, and the indoor mask can be overridden.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    parameters = dict(setup_simulation_parameters,
+        building_penetration_loss=[(0.7, 10, 0), (3.5, 16, 0)])
+
+    manager = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, parameters)
+
+    indoor = np.array([receiver['properties']['indoor']
+        for receiver in receivers])
+
+    carriers = [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')]
+
+    results = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, parameters)
+
+    outdoor = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, parameters,
+        indoor=np.zeros(len(receivers), dtype=bool))
+
+    no_loss = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut,
+        setup_simulation_parameters)
+
+    assert np.array_equal(outdoor['path_loss'], no_loss['path_loss'])
+    assert np.array_equal(results['path_loss'] - no_loss['path_loss'],
+        np.where(indoor, [[10], [16]], 0))
+
+    for idx, (frequency, bandwidth, generation, transmission_type) in \
+        enumerate(carriers):
+
+        expected = manager.estimate_link_budget(frequency, bandwidth,
+            generation, 'macro', transmission_type, 'urban',
+            setup_modulation_and_coding_lut, parameters)
+
+        answer = select_carrier(results, idx)
+
+        for key in ['path_loss', 'received_power', 'interference', 'sinr']:
+            assert np.array_equal(
+                np.array([result[key] for result in expected]),
+                answer[key]
+            ), key
+
+    parameters['building_penetration_loss'] = [(0.7, 10, 4), (3.5, 16, 6)]
+
+    varied = manager.estimate_link_budget_monte_carlo(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut,
+        dict(parameters, shadow_fading_std_urban=0), iterations=20)
+
+    assert np.allclose(varied['path_loss'][:, ~indoor],
+        results['path_loss'][:, ~indoor])
+    assert not np.allclose(varied['path_loss'][:, indoor],
+        results['path_loss'][:, indoor])
+
+
+def test_select_interferers(
+        setup_sites,
+        setup_simulation_parameters,
+        setup_modulation_and_coding_lut
+    ):
+    """
+    Interferers below the noise-relative threshold are pruned without
+    changing the results.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    manager = SimulationManager(transmitter, interfering_transmitters,
+        'macro', receivers, site_area, setup_simulation_parameters)
+
+    frequency = np.array([0.8, 3.5])
+    noise = manager.estimate_noise(np.array([10, 40]))[:, np.newaxis]
+
+    assert manager.select_interferers(frequency, noise, 'urban',
+        setup_simulation_parameters).tolist() == [0, 1, 2, 3, 4, 5]
+
+    parameters = dict(setup_simulation_parameters,
+        interference_pruning_dB=100)
+
+    assert manager.select_interferers(frequency, noise, 'urban',
+        parameters).tolist() == [0]
+
+    carriers = [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')]
+
+    parameters = dict(setup_simulation_parameters,
+        interference_pruning_dB=-10, interference_max_sites=None)
+
+    pruned = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'rural', setup_modulation_and_coding_lut, parameters)
+
+    expected = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'rural', setup_modulation_and_coding_lut,
+        dict(parameters, interference_pruning_dB=None))
+
+    for key in ['interference', 'sinr', 'capacity_mbps']:
+        assert np.allclose(pruned[key], expected[key]), key
+
+
+def test_instrumentation(
+        tmp_path,
+        setup_sites,
+        setup_simulation_parameters,
+        setup_modulation_and_coding_lut
+    ):
+    """
+    Stage timings are collected only when instrumentation is enabled,
+    without changing the results.
+
+    """
+    transmitter, interfering_transmitters, site_area, receivers = setup_sites
+
+    previous = get_instrumentation()
+    try:
+        enable_instrumentation(False)
+        manager = SimulationManager(transmitter, interfering_transmitters,
+            'macro', receivers, site_area, setup_simulation_parameters)
+        assert manager.instrumentation is None
+
+        instrumentation = enable_instrumentation()
+        assert get_instrumentation() is instrumentation
+        instrumented = SimulationManager(transmitter,
+            interfering_transmitters, 'macro', receivers, site_area,
+            setup_simulation_parameters)
+        assert instrumented.instrumentation is instrumentation
+    finally:
+        enable_instrumentation(False)
+        if previous is not None:
+            enable_instrumentation().merge(previous)
+
+    carriers = [(0.8, 10, '4G', '2x2'), (3.5, 40, '5G', '4x4')]
+
+    expected = manager.estimate_link_budget_carriers(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, setup_simulation_parameters)
+    answer = instrumented.estimate_link_budget_carriers(carriers, 'macro',
+        'urban', setup_modulation_and_coding_lut, setup_simulation_parameters)
+
+    for key in ['sinr', 'capacity_mbps']:
+        assert np.array_equal(expected[key], answer[key])
+
+    summary = instrumentation.summary()
+
+    assert list(summary) == ['geometry', 'path_loss', 'interference',
+        'sinr', 'spectral_efficiency', 'results', 'link_budget']
+    assert summary['link_budget']['calls'] == 1
+    assert summary['link_budget']['items'] == 2 * 8
+    assert summary['path_loss']['calls'] == 2
+    assert summary['path_loss']['items'] == 2 * 8 + 2 * 8 * 6
+    assert summary['interference']['items'] == 2 * 8 * 6
+
+    instrumentation.reset()
+    instrumented.estimate_link_budget(0.8, 10, '4G', 'macro', '2x2',
+        'urban', setup_modulation_and_coding_lut, setup_simulation_parameters)
+
+    summary = instrumentation.summary()
+
+    assert summary['link_budget']['calls'] == 1
+    assert summary['sinr']['calls'] == 8
+    assert summary['interference']['calls'] == 8
+    assert summary['path_loss']['calls'] == 8
+
+    path = str(tmp_path / 'instrumentation.json')
+    instrumentation.write_json(path, environment='urban')
+
+    with open(path) as json_file:
+        data = json.load(json_file)
+
+    assert data['metadata'] == {'environment': 'urban'}
+    assert data['stages']['spectral_efficiency']['calls'] == 8